@@ -0,0 +1,241 @@
+'''
+Asynchronous scraping engine. Keeps hundreds of requests in flight per process
+over a pool of keep-alive connections instead of blocking on every issue.
+'''
+
+import asyncio
+import time
+
+import aiohttp
+
+import metrics
+from throttle import (AsyncGate, TransientError, backoff_delay, host, host_limit, retry_after,
+                      MAX_RETRIES, RETRY_STATUSES)
+from scraper import system_config, reject, pop_rejection, log, parse_page, early_abort_enabled, mirror_url, response_cache, REQUEST_TIMEOUT, REJECT_HTTP_ERROR, REJECT_EXCEPTION
+
+DEFAULT_CONCURRENCY = 100 # number of in-flight requests per process
+
+async def fetch_issue(session, url_prefix, _id, parse, attributes, gate=None):
+    """Download an issue page and parse it
+
+    Transient failures (429, 5xx, connection errors, timeouts) are retried with
+    backoff, the id is rejected once retries are exhausted.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        Session holding the connection pool
+
+    url_prefix : string
+        Issue tracking system URL prefix
+
+    _id : integer
+        Issue id
+
+    parse : function
+        Page parser, either scraper.parse_issue or scraper.parse_lucene
+
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+
+    gate : throttle.AsyncGate
+        Admission of the requests to the tracker host, its adaptive limit is
+        fed with the outcome of every attempt. No limit when None
+
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected or can't be downloaded
+    """
+    url = url_prefix + str(_id)
+    log('Scraping url: %s' % url)
+
+    # same cache entries as scraper.fetch, keyed by the URL actually requested
+    cache = response_cache()
+    entry = None
+    if cache is not None:
+        target = mirror_url(url)
+        entry = cache.lookup(target)
+        if entry is not None and (cache.offline or cache.is_fresh(entry)):
+            return parse_page(parse, url_prefix, _id, cache.hit(target, entry).content, attributes)
+        if cache.offline:
+            cache.misses += 1
+            log('[{0}] Not in the cache!'.format(_id))
+            reject(_id, REJECT_HTTP_ERROR)
+            return None
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            content = await fetch_page(session, url, _id, url_prefix, attributes, gate, entry)
+            break
+        except TransientError as err:
+            if gate is not None:
+                err.notify(gate.limit)
+            if attempt == MAX_RETRIES:
+                log('[{0}] Giving up after {1} attempts! {2}\n'.format(_id, attempt + 1, err.reason))
+                reject(_id, REJECT_HTTP_ERROR if err.reason.isdigit() else REJECT_EXCEPTION)
+                return None
+            metrics.inc('scraper_retries_total', reason=err.reason)
+            await asyncio.sleep(backoff_delay(attempt, err.retry_after))
+
+    if content is None:
+        return None
+    return parse_page(parse, url_prefix, _id, content, attributes)
+
+async def fetch_page(session, url, _id, url_prefix, attributes, gate=None, entry=None):
+    """One attempt at downloading an issue page
+
+    When the response cache is enabled, the cached entry of the page is
+    revalidated with a conditional GET and 200 responses are stored.
+
+    Parameters
+    ----------
+    entry : tuple
+        Cached entry of the page, see http_cache.ResponseCache.lookup
+
+    Returns
+    -------
+    content : bytes of the page, None if the issue was rejected
+
+    Raises
+    ------
+    throttle.TransientError
+        on a response or failure worth retrying
+    """
+    if gate is not None:
+        await gate.acquire()
+    cache = response_cache()
+    target = mirror_url(url)
+    headers = cache.conditional_headers(entry) if cache is not None else {}
+    start = time.perf_counter()
+    try:
+        async with session.get(target, headers=headers) as response:
+            metrics.inc('scraper_responses_total', status=response.status)
+            if response.status == 304 and entry is not None:
+                cache.revalidated += 1
+                content = cache.hit(target, entry).content
+            elif response.status in RETRY_STATUSES:
+                raise TransientError(str(response.status), retry_after(response.headers.get('Retry-After')))
+            elif response.status != 200:
+                log('[{0}] Can\'t access url! HTTP {1}'.format(_id, response.status))
+                reject(_id, REJECT_HTTP_ERROR)
+                return None
+            elif early_abort_enabled(): # never with the cache
+                content = await read_unless_rejected(response, _id, url_prefix, attributes)
+            else:
+                content = await response.read()
+                metrics.inc('scraper_fetch_bytes_total', len(content))
+                if cache is not None:
+                    cache.misses += 1
+                    cache.store(target, response.headers, content)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        raise TransientError(type(err).__name__)
+    finally:
+        # wall time of the request, including waits for the other in-flight requests
+        latency = time.perf_counter() - start
+        metrics.observe('scraper_fetch_seconds', latency)
+        if gate is not None:
+            await gate.release()
+    if gate is not None:
+        gate.limit.success(latency)
+    return content
+
+async def read_unless_rejected(response, _id, url_prefix, attributes):
+    """Read a page incrementally, closing the connection as soon as its header rejects the issue
+
+    Returns
+    -------
+    content : bytes of the whole page, None if the issue was rejected
+    """
+    from early_abort import HeaderCheck, CHUNK_BYTES
+    check = HeaderCheck(_id, url_prefix, attributes)
+    body = []
+    verdict = None
+    async for chunk in response.content.iter_chunked(CHUNK_BYTES):
+        body.append(chunk)
+        metrics.inc('scraper_fetch_bytes_total', len(chunk))
+        if verdict is None:
+            verdict = check.feed(chunk)
+            if verdict is False:
+                response.close()
+                metrics.inc('scraper_early_aborts_total')
+                return None
+    return b''.join(body)
+
+async def async_scrape(system, ids, concurrency=DEFAULT_CONCURRENCY, callback=None):
+    """Scrape a list of issues with many concurrent requests
+
+    A fixed number of workers pull ids from a bounded queue fed lazily from
+    ids, so memory grows with the scraped issues only, however long the id
+    range is.
+
+    Parameters
+    ----------
+    system : string
+        Firefox, Mylyn or Lucene
+
+    ids : iterable of integer
+        Issue ids to scrape
+
+    concurrency : integer
+        Maximum number of in-flight requests, the actual number adapts to the
+        latency and errors of the tracker, see throttle
+
+    callback : function
+        Called with (id, issue) as soon as each id is done, issue is None when
+        the id was rejected
+
+    Returns
+    -------
+    issues : list of Issue
+        Scraped issues, in the same order as ids
+    """
+    if concurrency <= 0:
+        raise RuntimeError('Concurrency should be positive - {0}\n'.format(concurrency))
+
+    url_prefix, parse, attributes = system_config(system)
+    results = {} # position in ids to scraped issue, rejected ids leave no trace
+    queue = asyncio.Queue(maxsize=concurrency)
+
+    async def feed():
+        for index, _id in enumerate(ids):
+            await queue.put((index, _id))
+        for _ in range(concurrency): # one end marker per worker
+            await queue.put(None)
+
+    async def worker(session):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, _id = item
+            issue = await fetch_issue(session, url_prefix, _id, parse, attributes, gate)
+            if issue is not None:
+                results[index] = issue
+            if callback is not None:
+                callback(_id, issue)
+            pop_rejection(_id) # the reason is only kept for the callback, forget it once the id is done
+
+    # concurrency is the ceiling, the requests in flight follow the adaptive limit of the host
+    gate = AsyncGate(host_limit(host(url_prefix), concurrency))
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(feed(), *[worker(session) for _ in range(concurrency)])
+    log('Concurrency limit of {0}: {1} (max {2})'.format(host(url_prefix), gate.limit.current(), concurrency))
+
+    return [results[index] for index in sorted(results)]
+
+def scrape_concurrently(system, ids, concurrency=DEFAULT_CONCURRENCY, callback=None):
+    """Blocking wrapper around async_scrape, usable as a process pool target
+
+    Args:
+        system (str): Firefox, Mylyn or Lucene
+        ids (list): id range
+        concurrency (int): maximum number of in-flight requests
+        callback (function): called with (id, issue) as soon as each id is done
+
+    Return:
+        issues: A list of scraped issues
+    """
+    return asyncio.run(async_scrape(system, ids, concurrency, callback))
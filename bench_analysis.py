@@ -0,0 +1,342 @@
+'''
+Benchmark of the analysis pipeline on synthetic corpora scaled from the data files.
+
+The generator fits the statistics of the issues of data/*.xml files (number of
+comments and commenters, title and description lengths, word frequencies) and
+writes XML corpora of 10x-1000x as many issues drawn from them. Each stage of
+the pipeline is then run on every corpus and measured separately:
+    xml_to_issues, filter_issues, issues_to_corpus, build_corpus_matrix,
+    topic_modeling_lda, topic_modeling_nmf, topic_modeling_tfidf, assign_nfr_category
+with its wall time, CPU time, peak of the Python allocations (tracemalloc, in a
+second run of the stage) and peak RSS of the process. The per-issue topic
+models run on the first --model-issues issues only, assign_nfr_category runs
+on the tf-idf topics of every issue.
+
+Results are written as JSON along with the commit they were measured at, and a
+previous results file can be given to --compare to print the change per stage.
+Between consecutive scales the growth exponent log(t2/t1)/log(n2/n1) of each
+stage is printed, 1 being linear.
+
+    python bench_analysis.py data/mylyn-enhancement-issues.xml --scales 1 10 100 --output bench.json
+    python bench_analysis.py data/mylyn-enhancement-issues.xml --scales 1 10 100 --compare bench.json
+'''
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import sklearn
+
+from issue import Issue
+from scraper import to_xml
+import topic_modeling
+
+STAGES = ['xml_to_issues', 'filter_issues', 'issues_to_corpus', 'build_corpus_matrix',
+          'topic_modeling_lda', 'topic_modeling_nmf', 'topic_modeling_tfidf', 'assign_nfr_category']
+GENERATION_CHUNK = 10000 # issues drawn at once by the generator
+MAX_VOCABULARY = 50000 # most frequent words of the source the generator draws from
+
+def corpus_statistics(paths):
+    """Statistics of the issues of XML files, what the generator draws synthetic issues from
+
+    Parameters
+    ----------
+    paths : list of string
+        XML files written by scraper.py
+
+    Returns
+    -------
+    stats : dictionary
+        'records': issues x [comments, commenters, title words, description words],
+        'title_words'/'description_words': (words, probabilities) of the texts,
+        'system': system of the first file
+    """
+    records = []
+    frequencies = {'title': {}, 'description': {}}
+    for path in paths:
+        for issue in topic_modeling.iter_xml_issues(path):
+            lengths = []
+            for field, text in (('title', issue.get_title()), ('description', issue.get_description())):
+                words = (text or '').split()
+                lengths.append(len(words))
+                counts = frequencies[field]
+                for word in words:
+                    counts[word] = counts.get(word, 0) + 1
+            records.append([issue.get_comments(), issue.get_commenters()] + lengths)
+    if not records:
+        raise RuntimeError('No issues in ' + ', '.join(paths))
+
+    stats = {'records': np.array(records, dtype=np.int64), 'system': system_name(paths[0])}
+    for field, counts in frequencies.items():
+        words = sorted(counts, key=counts.get, reverse=True)[:MAX_VOCABULARY]
+        weights = np.array([counts[w] for w in words], dtype=np.float64)
+        stats[field + '_words'] = (np.array(words, dtype=object), weights / weights.sum() if len(words) else weights)
+    return stats
+
+def system_name(path):
+    for _, system_e in topic_modeling.etree.iterparse(path, events=('end',), tag='system'):
+        return system_e.text
+    return 'Synthetic'
+
+def draw_texts(rng, words, lengths):
+    """Texts of the given numbers of words drawn from a word distribution
+    """
+    vocabulary, p = words
+    total = int(lengths.sum())
+    if total == 0 or len(vocabulary) == 0:
+        return [''] * len(lengths)
+    drawn = vocabulary[rng.choice(len(vocabulary), size=total, p=p)]
+    ends = np.cumsum(lengths)
+    return [' '.join(drawn[end - n:end]) for n, end in zip(lengths, ends)]
+
+def synthetic_issues(stats, n_issues, seed=0):
+    """Issues drawn from corpus statistics
+
+    The comments, commenters and text lengths of an issue are those of a random
+    issue of the source (so their correlations are kept), its words are drawn
+    from the word frequencies of the source titles and descriptions.
+
+    Returns
+    -------
+    issues : generator of Issue
+    """
+    rng = np.random.default_rng(seed)
+    records = stats['records']
+    for start in range(0, n_issues, GENERATION_CHUNK):
+        size = min(GENERATION_CHUNK, n_issues - start)
+        chunk = records[rng.integers(0, len(records), size=size)]
+        titles = draw_texts(rng, stats['title_words'], chunk[:, 2])
+        descriptions = draw_texts(rng, stats['description_words'], chunk[:, 3])
+        for i in range(size):
+            yield Issue(str(start + i + 1), titles[i], descriptions[i], [], int(chunk[i, 0]), int(chunk[i, 1]))
+
+def write_synthetic(path, stats, n_issues, seed=0):
+    """Write a synthetic corpus as an XML file, like scraper.py does
+
+    Returns
+    -------
+    count : number of issues written
+    """
+    with open(path, 'wb') as f:
+        return to_xml(f, stats['system'], synthetic_issues(stats, n_issues, seed))
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def measure(stage, fn, items, memory=True):
+    """Run a stage and measure it
+
+    Parameters
+    ----------
+    stage : string
+        Stage name
+
+    fn : function
+        Runs the stage, called without arguments. Its output is discarded
+
+    items : integer
+        Size of the stage input, issues or topics
+
+    memory : boolean
+        Run the stage a second time under tracemalloc for its peak allocations,
+        tracing slows it down too much to time the same run
+
+    Returns
+    -------
+    (value, result) : return value of fn and the measures of the stage
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        cpu = cpu_time()
+        start = time.perf_counter()
+        value = fn()
+        wall = time.perf_counter() - start
+        cpu = cpu_time() - cpu
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return value, {
+        'stage': stage, 'items': items, 'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+        'us_per_item': round(wall * 1e6 / items, 2) if items else None,
+        'peak_alloc_mb': round(peak / 2.**20, 2) if peak is not None else None,
+        'peak_rss_mb': round(peak_rss() / 2.**20, 1),
+    }
+
+def run_pipeline(path, comment_std_dev=0, commenter_std_dev=3, n_topics=1, n_top_words=2,
+                 model_issues=500, memory=True):
+    """Run and measure every stage of the analysis pipeline on an XML corpus
+
+    Returns
+    -------
+    results : list of dictionary
+        Measures of each stage, in STAGES order
+    """
+    results = []
+
+    def run(stage, fn, items):
+        value, result = measure(stage, fn, items, memory)
+        results.append(result)
+        return value
+
+    size = os.path.getsize(path)
+    issues = run('xml_to_issues', lambda: topic_modeling.xml_to_issues(path), None)
+    results[-1]['items'] = len(issues)
+    results[-1]['us_per_item'] = round(results[-1]['wall_s'] * 1e6 / len(issues), 2) if issues else None
+    results[-1]['mb_per_s'] = round(size / 2.**20 / results[-1]['wall_s'], 2)
+
+    filtered = run('filter_issues', lambda: topic_modeling.filter_issues(issues, comment_std_dev, commenter_std_dev), len(issues))
+    corpus = run('issues_to_corpus', lambda: topic_modeling.issues_to_corpus(filtered), len(filtered))
+    matrix = run('build_corpus_matrix', lambda: topic_modeling.build_corpus_matrix(corpus), len(corpus))
+
+    model_corpus = dict(list(corpus.items())[:model_issues]) if model_issues else corpus
+    run('topic_modeling_lda', lambda: topic_modeling.topic_modeling_lda(model_corpus, n_topics, n_top_words, matrix=matrix), len(model_corpus))
+    run('topic_modeling_nmf', lambda: topic_modeling.topic_modeling_nmf(model_corpus, n_topics, n_top_words, matrix=matrix), len(model_corpus))
+    topics = run('topic_modeling_tfidf', lambda: topic_modeling.topic_modeling_tfidf(corpus, n_topics, n_top_words, matrix=matrix), len(corpus))
+    run('assign_nfr_category', lambda: topic_modeling.assign_nfr_category(topics), len(topics))
+    return results
+
+def git_commit():
+    """Commit of the working tree and whether it has uncommitted changes, None outside of a git checkout
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=here, stderr=subprocess.DEVNULL).decode().strip()
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+                                         stderr=subprocess.DEVNULL).decode()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+def environment():
+    commit, dirty = git_commit()
+    return {
+        'commit': commit, 'dirty': dirty, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(), 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+        'platform': platform.platform(), 'cpus': os.cpu_count(),
+    }
+
+def growth(results):
+    """Growth exponent of each stage between consecutive scales of a source
+
+    Returns
+    -------
+    growth : dictionary
+        Mapping from (source, scale, stage) to log(t2/t1)/log(n2/n1) against the previous scale
+    """
+    exponents = {}
+    previous = {}
+    for r in sorted(results, key=lambda r: (r['source'], r['scale'])):
+        key = (r['source'], r['stage'])
+        if key in previous:
+            p = previous[key]
+            if r['items'] and p['items'] and r['items'] != p['items'] and r['wall_s'] > 0 and p['wall_s'] > 0:
+                exponents[(r['source'], r['scale'], r['stage'])] = round(
+                    math.log(r['wall_s'] / p['wall_s']) / math.log(float(r['items']) / p['items']), 2)
+        previous[key] = r
+    return exponents
+
+def compare(results, baseline):
+    """Ratio of the wall time of each stage to the same source, scale and stage of a previous run
+    """
+    before = dict(((r['source'], r['scale'], r['stage']), r) for r in baseline['results'])
+    ratios = {}
+    for r in results:
+        b = before.get((r['source'], r['scale'], r['stage']))
+        if b is not None and b['wall_s'] > 0:
+            ratios[(r['source'], r['scale'], r['stage'])] = round(r['wall_s'] / b['wall_s'], 2)
+    return ratios
+
+def print_results(results, ratios=None):
+    exponents = growth(results)
+    print('{0:>28} {1:>6} {2:>20} {3:>8} {4:>9} {5:>9} {6:>10} {7:>9} {8:>8} {9:>6}'.format(
+        'source', 'scale', 'stage', 'items', 'wall s', 'cpu s', 'us/item', 'alloc MB', 'rss MB', 'growth')
+        + (' {0:>7}'.format('vs base') if ratios is not None else ''))
+    for r in results:
+        key = (r['source'], r['scale'], r['stage'])
+        line = '{0:>28.28} {1:>6} {2:>20} {3:>8} {4:>9} {5:>9} {6:>10} {7:>9} {8:>8} {9:>6}'.format(
+            r['source'], r['scale'], r['stage'], r['items'], r['wall_s'], r['cpu_s'], str(r['us_per_item']),
+            str(r['peak_alloc_mb']), r['peak_rss_mb'], str(exponents.get(key, '')))
+        if ratios is not None:
+            line += ' {0:>7}'.format(str(ratios.get(key, '')))
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser('python bench_analysis.py <xml files>', description='Benchmark the analysis pipeline on synthetic scaled corpora.')
+    parser.add_argument('sources', type=str, nargs='+', help='XML files the synthetic corpora are drawn from, one benchmark each')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='Corpus sizes in multiples of the source issues')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the generator')
+    parser.add_argument('--comment-std-dev', type=float, default=0, help='Comment threshold above average')
+    parser.add_argument('--commenter-std-dev', type=float, default=3, help='Commenter threshold above average')
+    parser.add_argument('--topics', type=int, default=1, help='Number of topics per issue')
+    parser.add_argument('--top-words', type=int, default=2, help='Number of words per topic')
+    parser.add_argument('--model-issues', type=int, default=500, help='Issues given to the per-issue LDA and NMF, 0 for all')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run of every stage')
+    parser.add_argument('--work-dir', type=str, default=None, help='Directory keeping the synthetic corpora for later runs')
+    parser.add_argument('--output', type=str, default=None, help='JSON file to write the results to')
+    parser.add_argument('--compare', type=str, default=None, help='JSON results of a previous run to compare with')
+    _args = vars(parser.parse_args())
+
+    baseline = None
+    if _args['compare'] is not None:
+        with open(_args['compare']) as f:
+            baseline = json.load(f)
+
+    work_dir = _args['work_dir'] or tempfile.mkdtemp(prefix='bench_analysis_')
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    # word list compiled before the first run, not timed in the assign_nfr_category stage of the smallest scale
+    topic_modeling.category_index()
+    results = []
+    try:
+        for source in _args['sources']:
+            stats = corpus_statistics([source])
+            name = os.path.splitext(os.path.basename(source))[0]
+            for scale in _args['scales']:
+                path = os.path.join(work_dir, '{0}-x{1}-seed{2}.xml'.format(name, scale, _args['seed']))
+                if not os.path.exists(path):
+                    start = time.time()
+                    count = write_synthetic(path + '.tmp', stats, len(stats['records']) * scale, _args['seed'])
+                    os.replace(path + '.tmp', path)
+                    print('Generated {0} issues in {1:.1f}s: {2}'.format(count, time.time() - start, path), file=sys.stderr)
+                for result in run_pipeline(path, _args['comment_std_dev'], _args['commenter_std_dev'], _args['topics'],
+                                           _args['top_words'], _args['model_issues'], not _args['no_memory']):
+                    result.update({'source': name, 'scale': scale})
+                    results.append(result)
+                print('{0} x{1} done'.format(name, scale), file=sys.stderr)
+    finally:
+        if _args['work_dir'] is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results, compare(results, baseline) if baseline is not None else None)
+    if baseline is not None:
+        print('Compared with {0} ({1})'.format(baseline['environment']['commit'], baseline['environment']['date']))
+    if _args['output'] is not None:
+        run = {'environment': environment(), 'parameters': dict((k, v) for k, v in _args.items() if k not in ('output', 'compare')),
+               'results': results}
+        with open(_args['output'], 'w') as f:
+            json.dump(run, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+'''
+Scraping throughput benchmark against a local mock_tracker.
+
+Every engine scrapes the same ids from a MockTracker running in a child
+process, and is reported with:
+    ids/s, issues/s     ids processed and issues kept per second of wall time
+    cpu ms/id           user + system CPU of the scraping processes per id
+    p50/p99 ms          time per issue (from the completion times of each
+                        worker process, engines fetching one issue at a time only)
+    server p50/p99 ms   time to answer a request at the mock, injected latency included
+
+    python bench_scraper.py --system Mylyn --ids 500 --engines scrape async multiprocess --latency 0.02
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+import scraper
+import mock_tracker
+
+ENGINES = ['scrape', 'async', 'multiprocess', 'multiprocess-async', 'api']
+SEQUENTIAL_ENGINES = ['scrape', 'multiprocess'] # one request at a time per process, per-issue times are meaningful
+
+class CompletionLog(object):
+    """Scrape callback appending 'pid id time kept' lines to a file, from any worker process
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __call__(self, _id, issue):
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        os.write(self._fd, '{0} {1} {2!r} {3}\n'.format(os.getpid(), _id, time.time(), int(issue is not None)).encode())
+
+def read_completions(path):
+    completions = []
+    with open(path) as f:
+        for line in f:
+            pid, _id, t, kept = line.split()
+            completions.append((int(pid), _id, float(t), kept == '1'))
+    return completions
+
+def issue_times(completions, start):
+    """Time spent on each issue by the workers, the gaps between their consecutive completions
+    """
+    times = []
+    last = {}
+    for pid, _id, t, kept in sorted(completions, key=lambda c: c[2]):
+        times.append(t - last.get(pid, start))
+        last[pid] = t
+    return times
+
+def percentiles_ms(values):
+    if len(values) == 0:
+        return None, None
+    p50, p99 = np.percentile(values, [50, 99])
+    return round(p50 * 1000, 2), round(p99 * 1000, 2)
+
+def cpu_time():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN) # pool workers, once joined
+    return self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+
+def run_engine(engine, system, ids, processes, concurrency, callback):
+    if engine == 'scrape':
+        return scraper.scrape(system, ids, callback)
+    elif engine == 'async':
+        from async_scraper import scrape_concurrently
+        return scrape_concurrently(system, ids, concurrency, callback)
+    elif engine == 'multiprocess':
+        return scraper.multiprocess_scrape(system, ids, processes, callback=callback)
+    elif engine == 'multiprocess-async':
+        return scraper.multiprocess_scrape(system, ids, processes, concurrency, callback=callback)
+    elif engine == 'api':
+        from tracker_api import api_scrape
+        return api_scrape(system, ids, callback=callback)
+    raise RuntimeError('Engine is unsupported: ' + engine)
+
+def benchmark(engine, system, ids, url, processes=2, concurrency=20):
+    """Scrape ids with an engine and measure it
+
+    Returns
+    -------
+    result : dictionary
+    """
+    requests.get(url + '/_stats', params={'reset': 1})
+    fd, path = tempfile.mkstemp(suffix='.log')
+    os.close(fd)
+    try:
+        cpu = cpu_time()
+        start = time.time()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            issues = run_engine(engine, system, ids, processes, concurrency, CompletionLog(path))
+        wall = time.time() - start
+        cpu = cpu_time() - cpu
+        completions = read_completions(path)
+    finally:
+        os.remove(path)
+    server = requests.get(url + '/_stats').json()
+
+    p50, p99 = percentiles_ms(issue_times(completions, start)) if engine in SEQUENTIAL_ENGINES else (None, None)
+    server_p50, server_p99 = percentiles_ms(server['latencies'])
+    return {
+        'engine': engine, 'system': system, 'ids': len(ids), 'completed': len(completions), 'issues': len(issues),
+        'wall_s': round(wall, 3), 'ids_per_s': round(len(ids) / wall, 2), 'issues_per_s': round(len(issues) / wall, 2),
+        'cpu_s': round(cpu, 3), 'cpu_ms_per_id': round(cpu * 1000 / len(ids), 3),
+        'p50_ms': p50, 'p99_ms': p99, 'server_p50_ms': server_p50, 'server_p99_ms': server_p99,
+        'requests': server['requests'], 'statuses': server['statuses'],
+    }
+
+def print_results(results):
+    print('{0:>18} {1:>5} {2:>5} {3:>6} {4:>8} {5:>8} {6:>9} {7:>8} {8:>8} {9:>8} {10:>8}'.format(
+        'engine', 'ext', 'abort', 'issues', 'ids/s', 'issues/s', 'cpu ms/id', 'p50 ms', 'p99 ms', 'srv p50', 'srv p99'))
+    for r in results:
+        print('{0:>18} {1:>5} {2:>5} {3:>6} {4:>8} {5:>8} {6:>9} {7:>8} {8:>8} {9:>8} {10:>8}'.format(
+            r['engine'], r['extractor'], 'yes' if r['early_abort'] else 'no', r['issues'], r['ids_per_s'],
+            r['issues_per_s'], r['cpu_ms_per_id'], str(r['p50_ms']), str(r['p99_ms']),
+            str(r['server_p50_ms']), str(r['server_p99_ms'])))
+
+def main():
+    parser = argparse.ArgumentParser('python bench_scraper.py', description='Benchmark the scraping engines against a local mock tracker.')
+    parser.add_argument('--system', type=str, default='Mylyn', help='Firefox, Mylyn or Lucene')
+    parser.add_argument('--ids', type=int, default=200, help='Number of ids to scrape, from 1')
+    parser.add_argument('--engines', type=str, nargs='+', default=ENGINES, choices=ENGINES, help='Engines to benchmark')
+    parser.add_argument('--extractors', type=str, nargs='+', default=['bs4'], choices=['bs4', 'lxml'], help='HTML extraction backends')
+    parser.add_argument('--early-abort', action='store_true', help='Also run every engine with early abort')
+    parser.add_argument('--processes', type=int, default=2, help='Worker processes of the multiprocess engines')
+    parser.add_argument('--concurrency', type=int, default=20, help='In-flight requests of the async engines')
+    parser.add_argument('--latency', type=float, default=0., help='Mock tracker latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0., help='Mock tracker random extra latency')
+    parser.add_argument('--error-rate', type=float, default=0., help='Mock tracker probability of a 500 response')
+    parser.add_argument('--rate', type=float, default=None, help='Mock tracker requests per second before 429')
+    parser.add_argument('--padding', type=int, default=mock_tracker.DEFAULT_PADDING, help='Bytes of boilerplate in every page')
+    parser.add_argument('--output', type=str, default=None, help='JSON file to write the results to')
+    _args = vars(parser.parse_args())
+
+    process, url = mock_tracker.start_process(latency=_args['latency'], jitter=_args['jitter'], error_rate=_args['error_rate'],
+                                              rate=_args['rate'], padding=_args['padding'])
+    scraper.use_mirror(mock_tracker.mirrors(url))
+    ids = list(range(1, _args['ids'] + 1))
+    results = []
+    try:
+        for extractor in _args['extractors']:
+            scraper.use_extractor(extractor)
+            for early_abort in ([False, True] if _args['early_abort'] else [False]):
+                scraper.use_early_abort(early_abort)
+                for engine in _args['engines']:
+                    if engine == 'api' and (extractor != _args['extractors'][0] or early_abort):
+                        continue # no HTML involved
+                    result = benchmark(engine, _args['system'], ids, url, _args['processes'], _args['concurrency'])
+                    result.update({'extractor': extractor, 'early_abort': early_abort})
+                    results.append(result)
+                    print('{0} done in {1}s'.format(engine, result['wall_s']), file=sys.stderr)
+    finally:
+        process.terminate()
+        process.join()
+
+    print_results(results)
+    if _args['output'] is not None:
+        with open(_args['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+'''
+Candidate discovery: find the ids in a range that are worth scraping, so
+duplicates and non-enhancement issues are never downloaded.
+'''
+
+from scraper import fetch
+from tracker_api import FIREFOX_API_URL, MYLYN_API_URL, LUCENE_API_URL, LUCENE_TYPES
+
+PAGE_SIZE = 1000 # number of ids requested per search page
+
+def load_candidate_ids(f, from_id=None, to_id=None):
+    """Load candidate ids from a file with one id per line, like data/firefox-enhancement-ids.csv
+
+    Parameters
+    ----------
+    f : string
+        Path to the id file. Blank lines and lines that are not numbers (e.g. a header) are skipped
+
+    from_id, to_id : integer
+        Keep only ids in [from_id, to_id] when given
+
+    Returns
+    -------
+    ids : list of integer
+        Sorted, unique candidate ids
+    """
+    ids = set()
+    with open(f) as lines:
+        for line in lines:
+            line = line.strip().split(',')[0]
+            if not line.isdigit():
+                continue
+            _id = int(line)
+            if (from_id is None or _id >= from_id) and (to_id is None or _id <= to_id):
+                ids.add(_id)
+    return sorted(ids)
+
+def get_json(url, params):
+    result = fetch(url, params)
+    if result.status_code != 200:
+        raise RuntimeError('Candidate query failed! HTTP {0} - {1}'.format(result.status_code, result.url))
+    return result.json()
+
+def query_bugzilla_candidates(api_url, from_id, to_id, bug_type=False):
+    """Ask Bugzilla for non-duplicated enhancements with id in [from_id, to_id]
+
+    Parameters
+    ----------
+    bug_type : boolean
+        Also match bugs whose type is enhancement. bugzilla.mozilla.org moved
+        enhancements from the severity to the type field (like
+        tracker_api.is_bugzilla_candidate checks), older Bugzillas have no
+        type field
+
+    Returns
+    -------
+    ids : list of integer
+    """
+    params = {
+        'include_fields': 'id',
+        'f1': 'bug_id', 'o1': 'greaterthaneq', 'v1': from_id,
+        'f2': 'bug_id', 'o2': 'lessthaneq', 'v2': to_id,
+        'f3': 'resolution', 'o3': 'notequals', 'v3': 'DUPLICATE',
+        'order': 'bug_id',
+        'limit': PAGE_SIZE,
+    }
+    if bug_type: # boolean chart: (severity = enhancement OR type = enhancement)
+        params.update({
+            'f4': 'OP', 'j4': 'OR',
+            'f5': 'bug_severity', 'o5': 'equals', 'v5': 'enhancement',
+            'f6': 'bug_type', 'o6': 'equals', 'v6': 'enhancement',
+            'f7': 'CP',
+        })
+    else:
+        params['bug_severity'] = 'enhancement'
+    ids = []
+    while True:
+        params['offset'] = len(ids)
+        bugs = get_json(api_url + '/bug', params).get('bugs', [])
+        ids.extend(bug['id'] for bug in bugs)
+        if len(bugs) < PAGE_SIZE:
+            break
+    return sorted(ids)
+
+def query_jira_candidates(api_url, project, from_id, to_id):
+    """Ask Jira for New Feature and Improvement issues with number in [from_id, to_id]
+
+    Returns
+    -------
+    ids : list of integer
+    """
+    params = {
+        'jql': 'project = {0} AND issuetype in ({1}) AND key >= {0}-{2} AND key <= {0}-{3} ORDER BY key ASC'.format(
+            project, ', '.join('"%s"' % t for t in LUCENE_TYPES), from_id, to_id),
+        'fields': 'key',
+        'maxResults': PAGE_SIZE,
+    }
+    ids = []
+    while True:
+        params['startAt'] = len(ids)
+        issues = get_json(api_url + '/search', params).get('issues', [])
+        ids.extend(int(issue['key'].split('-')[-1]) for issue in issues)
+        if len(issues) < PAGE_SIZE:
+            break
+    return sorted(ids)
+
+def discover_candidates(system, from_id, to_id, id_file=None):
+    """Build the list of ids to scrape in [from_id, to_id]
+
+    Args:
+        system (str): Firefox, Mylyn or Lucene
+        from_id (int): starting id
+        to_id (int): ending id
+        id_file (str): file of known candidate ids. The tracker is queried when it's not given
+
+    Return:
+        ids: sorted list of candidate ids
+    """
+    if id_file is not None:
+        ids = load_candidate_ids(id_file, from_id, to_id)
+    else:
+        system = system.upper()
+        if system == 'FIREFOX':
+            ids = query_bugzilla_candidates(FIREFOX_API_URL, from_id, to_id, bug_type=True)
+        elif system == 'MYLYN':
+            ids = query_bugzilla_candidates(MYLYN_API_URL, from_id, to_id)
+        elif system == 'LUCENE':
+            ids = query_jira_candidates(LUCENE_API_URL, 'LUCENE', from_id, to_id)
+        else:
+            raise RuntimeError('System is unsupported: ' + system)
+
+    print('Found {0} candidates out of {1} ids'.format(len(ids), to_id - from_id + 1))
+    return ids
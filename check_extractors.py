@@ -0,0 +1,103 @@
+'''
+Check that the lxml extraction backend (extractors.py) reads the same issues
+as the BeautifulSoup parsers of the scraper, and that early_abort.HeaderCheck
+rejects the same issues from the top of the page.
+
+Parses every saved page of data/pages/<system>/<id>.html with both backends
+and compares the Issue fields, or the rejection reason when the page is
+rejected. HeaderCheck must reject a page with the parser's reason, or let it
+through when the parser doesn't reject it as a duplicate or non-enhancement.
+The pages cover duplicates, non-enhancements, issues with too few comments and
+kept issues with and without attachments, for Firefox, Mylyn and LUCENE, and
+Firefox pages with and without the bug type field. The directory is also
+usable as mock_tracker.py --pages-dir.
+
+    python check_extractors.py
+'''
+
+import argparse
+import os
+import sys
+
+import scraper
+import extractors
+from early_abort import HeaderCheck, CHUNK_BYTES
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pages')
+
+# directory of the saved pages to (url_prefix, BeautifulSoup parser, lxml parser, attributes)
+SYSTEMS = {
+    'firefox': (scraper.FIREFOX_URL_PREFIX, scraper.parse_issue, extractors.parse_issue_lxml, scraper.firefox_attributes),
+    'mylyn': (scraper.MYLYN_URL_PREFIX, scraper.parse_issue, extractors.parse_issue_lxml, scraper.mylyn_attributes),
+    'lucene': (scraper.LUCENE_URL_PREFIX, scraper.parse_lucene, extractors.parse_lucene_lxml, scraper.lucene_attributes),
+}
+
+def issue_fields(issue):
+    if issue is None:
+        return None
+    return (issue.get_id(), issue.get_title(), issue.get_description(), issue.get_attachments(),
+            issue.get_comments(), issue.get_commenters())
+
+def parse(parse_page, url_prefix, _id, c, attributes):
+    """Issue fields and rejection reason of a page parsed by parse_page
+    """
+    fields = issue_fields(parse_page(url_prefix, _id, c, attributes))
+    return fields, scraper.pop_rejection(_id)
+
+def header_verdict(url_prefix, _id, c, attributes):
+    """Rejection reason HeaderCheck gives reading the page chunk by chunk, None if it lets the page through
+    """
+    check = HeaderCheck(_id, url_prefix, attributes)
+    for start in range(0, len(c), CHUNK_BYTES):
+        if check.feed(c[start:start + CHUNK_BYTES]) is not None:
+            break
+    return scraper.pop_rejection(_id)
+
+def check_pages(pages_dir=PAGES_DIR):
+    """Parse the saved pages with both backends
+
+    Returns
+    -------
+    checked, kept, mismatches : number of pages, number of pages both backends
+        kept and list of (path, BeautifulSoup result, lxml or HeaderCheck result) that differ
+    """
+    checked = 0
+    kept = 0
+    mismatches = []
+    for system in sorted(SYSTEMS):
+        url_prefix, parse_bs4, parse_lxml, attributes = SYSTEMS[system]
+        directory = os.path.join(pages_dir, system)
+        names = sorted(os.listdir(directory), key=lambda name: int(name.split('.')[0]))
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                c = f.read()
+            _id = name.split('.')[0]
+            expected = parse(parse_bs4, url_prefix, _id, c, attributes)
+            actual = parse(parse_lxml, url_prefix, _id, c, attributes)
+            header = header_verdict(url_prefix, _id, c, attributes)
+            checked += 1
+            if expected != actual:
+                mismatches.append((path, expected, actual))
+            elif header is not None and header != expected[1] or \
+                 header is None and expected[1] in (scraper.REJECT_DUPLICATE, scraper.REJECT_NOT_ENHANCEMENT):
+                mismatches.append((path, expected, 'HeaderCheck {0}'.format(header)))
+            elif expected[0] is not None:
+                kept += 1
+    return checked, kept, mismatches
+
+def main():
+    parser = argparse.ArgumentParser('python check_extractors.py', description='Compare the BeautifulSoup and lxml page parsers on saved pages.')
+    parser.add_argument('--pages-dir', type=str, default=PAGES_DIR, help='Saved pages, <pages-dir>/<system>/<id>.html')
+    _args = vars(parser.parse_args())
+
+    scraper.use_verbose(False)
+    checked, kept, mismatches = check_pages(_args['pages_dir'])
+    for path, expected, actual in mismatches:
+        print('{0}: bs4 {1} != lxml {2}'.format(path, expected, actual))
+    print('{0} pages, {1} issues kept, {2} mismatches'.format(checked, kept, len(mismatches)))
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
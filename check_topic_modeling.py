@@ -0,0 +1,79 @@
+'''
+Check that the parallel and pre-tokenized topic modeling paths find the same
+topics as a serial run on the text.
+
+Runs the per-issue models of topic_modeling.py on a bundled corpus four ways,
+serially and with a process pool, vectorizing the text of each issue or
+slicing it out of a shared vocabulary.CorpusMatrix, and compares the topic
+words and the printed output of every issue with the serial text run.
+
+    python check_topic_modeling.py --input data/mylyn-enhancement-issues.xml --n-jobs 4
+'''
+
+import argparse
+import sys
+import warnings
+
+import topic_modeling
+from topic_modeling import filter_issues, xml_to_issues, issues_to_corpus, model_issues, lda_issue_topics, nmf_issue_topics
+from vocabulary import build_corpus_matrix
+
+FITS = {'lda': lda_issue_topics, 'nmf': nmf_issue_topics}
+
+def run(fit, corpus, n_topics, n_top_words, n_jobs, matrix):
+    """Topic words and printed output of every issue, in the order they came
+    """
+    results = []
+    def collect(k, topic_words, output):
+        results.append((k, topic_words, output))
+    model_issues(fit, corpus, n_topics, n_top_words, n_jobs, matrix=matrix, callback=collect, echo=False)
+    return results
+
+def check_paths(corpus, engine, n_topics, n_top_words, n_jobs):
+    """Run an engine on every path
+
+    Returns
+    -------
+    mismatches : list of (path, issue id) whose topic words or output differ
+        from the serial text run, or (path, None) when the issues differ
+    """
+    fit = FITS[engine]
+    matrix = build_corpus_matrix(corpus)
+    expected = run(fit, corpus, n_topics, n_top_words, 1, None)
+    paths = [('n_jobs={0}'.format(n_jobs), n_jobs, None),
+             ('matrix', 1, matrix),
+             ('matrix n_jobs={0}'.format(n_jobs), n_jobs, matrix)]
+    mismatches = []
+    for name, jobs, m in paths:
+        actual = run(fit, corpus, n_topics, n_top_words, jobs, m)
+        if [r[0] for r in actual] != [r[0] for r in expected]:
+            mismatches.append((name, None))
+            continue
+        mismatches.extend((name, a[0]) for a, e in zip(actual, expected) if a != e)
+    return len(expected), mismatches
+
+def main():
+    parser = argparse.ArgumentParser('python check_topic_modeling.py', description='Compare the serial, parallel and shared matrix topic modeling paths.')
+    parser.add_argument('--input', type=str, default='data/mylyn-enhancement-issues.xml', help='Issues XML file')
+    parser.add_argument('--commenter-std-dev', type=int, default=3, help='Keep issues with that many standard deviations of commenters')
+    parser.add_argument('--engines', type=str, nargs='+', default=['lda', 'nmf'], choices=sorted(FITS), help='Topic engines to check')
+    parser.add_argument('--n-topics', type=int, default=1, help='Number of topics of an issue')
+    parser.add_argument('--n-top-words', type=int, default=2, help='Number of words of a topic')
+    parser.add_argument('--n-jobs', type=int, default=4, help='Worker processes of the parallel paths')
+    _args = vars(parser.parse_args())
+
+    warnings.simplefilter('ignore') # convergence warnings of the per-issue models
+    issues = filter_issues(xml_to_issues(_args['input']), commenter_std_dev=_args['commenter_std_dev'])
+    corpus = issues_to_corpus(issues)
+    failed = False
+    for engine in _args['engines']:
+        n, mismatches = check_paths(corpus, engine, _args['n_topics'], _args['n_top_words'], _args['n_jobs'])
+        for name, _id in mismatches:
+            print('{0} {1}: {2}'.format(engine, name, 'different issues' if _id is None else 'issue {0} differs'.format(_id)))
+        print('{0}: {1} issues, {2} mismatches'.format(engine, n, len(mismatches)))
+        failed = failed or bool(mismatches)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+'''
+Compact columnar store for issue corpora, memory-mapped on load.
+
+A store is a directory holding:
+    text.bin            UTF-8 blob with every string of every issue
+    string_offsets.npy  byte offset of each string in text.bin (one extra end offset)
+    string_nulls.npy    1 for the strings that are None, stored as empty strings
+    issue_strings.npy   index of the first string of each issue (one extra end index).
+                        The strings of an issue are [id, title, description, attach_1, ..., attach_n]
+    comments.npy        number of comments of each issue
+    commenters.npy      number of commenters of each issue
+    meta.json           number of issues, format version and source file
+'''
+
+import argparse
+import json
+import mmap
+import os
+
+import numpy as np
+
+from issue import Issue
+
+STORE_VERSION = 2
+FIELDS_PER_ISSUE = 3 # id, title and description come before the attachments
+
+def issues_to_store(issues, path, source=None):
+    """Write issues to a columnar store
+
+    The text blob is written as issues come, so issues can be a generator
+    (e.g. topic_modeling.iter_xml_issues) of any size.
+
+    Parameters
+    ----------
+    issues : iterable of Issue
+
+    path : string
+        Store directory, created when missing
+
+    source : string
+        Where the issues come from, recorded in meta.json
+
+    Returns
+    -------
+    count : integer
+        Number of issues written
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    string_offsets = [0]
+    string_nulls = []
+    issue_strings = [0]
+    comments = []
+    commenters = []
+    with open(os.path.join(path, 'text.bin'), 'wb') as blob:
+        for issue in issues:
+            strings = [issue.get_id(), issue.get_title(), issue.get_description()] + list(issue.get_attachments())
+            for s in strings:
+                data = (s or '').encode('utf-8')
+                blob.write(data)
+                string_offsets.append(string_offsets[-1] + len(data))
+                string_nulls.append(s is None)
+            issue_strings.append(issue_strings[-1] + len(strings))
+            comments.append(issue.get_comments())
+            commenters.append(issue.get_commenters())
+
+    np.save(os.path.join(path, 'string_offsets.npy'), np.array(string_offsets, dtype=np.int64))
+    np.save(os.path.join(path, 'string_nulls.npy'), np.array(string_nulls, dtype=np.uint8))
+    np.save(os.path.join(path, 'issue_strings.npy'), np.array(issue_strings, dtype=np.int64))
+    np.save(os.path.join(path, 'comments.npy'), np.array(comments, dtype=np.int32))
+    np.save(os.path.join(path, 'commenters.npy'), np.array(commenters, dtype=np.int32))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'version': STORE_VERSION, 'count': len(comments), 'source': source}, f)
+    return len(comments)
+
+def xml_to_store(f, path):
+    """Convert an issue xml file (as written by scraper.to_xml) into a columnar store
+
+    Parameters
+    ----------
+    f : string
+        XML file path
+
+    path : string
+        Store directory
+
+    Returns
+    -------
+    count : integer
+        Number of issues converted
+    """
+    from topic_modeling import iter_xml_issues
+    return issues_to_store(iter_xml_issues(f), path, source=f)
+
+class CorpusStore(object):
+    """Read-only, memory-mapped view of a columnar store
+
+    Numeric columns are NumPy arrays backed by the files, and strings are only
+    decoded when asked for, so opening a store costs a few milliseconds and
+    processes opening the same store share its pages.
+
+    Strings come back as they were written, None (e.g. the empty elements
+    topic_modeling.xml_to_issues reads as None) and empty strings included.
+
+    Parameters
+    ----------
+    path : string
+        Store directory
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != STORE_VERSION:
+            raise RuntimeError('Unsupported store version: {0}'.format(self.meta['version']))
+
+        self.path = path
+        self.string_offsets = np.load(os.path.join(path, 'string_offsets.npy'), mmap_mode='r')
+        self.string_nulls = np.load(os.path.join(path, 'string_nulls.npy'), mmap_mode='r')
+        self.issue_strings = np.load(os.path.join(path, 'issue_strings.npy'), mmap_mode='r')
+        self.comments = np.load(os.path.join(path, 'comments.npy'), mmap_mode='r')
+        self.commenters = np.load(os.path.join(path, 'commenters.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'text.bin'), 'rb') as f:
+            # mmap can't map an empty file
+            self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+    def __len__(self):
+        return len(self.comments)
+
+    def string(self, k):
+        """Decode the k-th string of the store, None if None was written
+        """
+        if self.string_nulls[k]:
+            return None
+        return self.text[self.string_offsets[k]:self.string_offsets[k+1]].decode('utf-8')
+
+    def get_id(self, i):
+        return self.string(self.issue_strings[i])
+
+    def get_title(self, i):
+        return self.string(self.issue_strings[i] + 1)
+
+    def get_description(self, i):
+        return self.string(self.issue_strings[i] + 2)
+
+    def get_attachments(self, i):
+        return [self.string(k) for k in range(self.issue_strings[i] + FIELDS_PER_ISSUE, self.issue_strings[i+1])]
+
+    def ids(self):
+        """Column of issue ids
+        """
+        return [self.get_id(i) for i in range(len(self))]
+
+    def issue(self, i):
+        """Materialize the i-th issue
+        """
+        return Issue(self.get_id(i), self.get_title(i), self.get_description(i), self.get_attachments(i),
+                     int(self.comments[i]), int(self.commenters[i]))
+
+    def __getitem__(self, i):
+        return self.issue(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.issue(i)
+
+def load_store(path):
+    """Open a columnar store
+
+    Parameters
+    ----------
+    path : string
+        Store directory
+
+    Returns
+    -------
+    store : CorpusStore
+    """
+    return CorpusStore(path)
+
+def store_to_issues(path):
+    """Load every issue of a store, the store counterpart of topic_modeling.xml_to_issues
+
+    Returns
+    -------
+    issues : list of Issue
+    """
+    return list(load_store(path))
+
+def main():
+    parser = argparse.ArgumentParser('python corpus_store.py <xml-file> <store-dir>', description='Convert an issue xml file into a columnar store.')
+    parser.add_argument('xml-file', type=str, help='XML file written by scraper.py')
+    parser.add_argument('store-dir', type=str, help='Directory of the store to write')
+    _args = vars(parser.parse_args())
+
+    count = xml_to_store(_args['xml-file'], _args['store-dir'])
+    print('Converted {0} issues to {1}'.format(count, _args['store-dir']))
+
+if __name__ == '__main__':
+    main()
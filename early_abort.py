@@ -0,0 +1,159 @@
+'''
+Header-first fetching. The status and importance (or issue type) of an issue
+sit near the top of its page, so the body is read incrementally and fed to an
+incremental HTML parser; the connection is closed as soon as those fields
+reject the issue, without downloading its comment thread.
+'''
+
+import re
+from contextlib import closing
+
+from lxml import etree
+
+import metrics
+from throttle import retry_request
+from scraper import (get_session, mirror_url, reject, log, DUPLICATED_ISSUES, REQUEST_TIMEOUT, REJECT_DUPLICATE,
+                     REJECT_NOT_ENHANCEMENT, REJECT_HTTP_ERROR, REJECT_EXCEPTION)
+from tracker_api import LUCENE_TYPES
+
+CHUNK_BYTES = 16 * 1024 # bytes read from the connection at a time
+
+def element_text(element):
+    return ' '.join(''.join(element.itertext()).split())
+
+class HeaderCheck(object):
+    """Decide from the top of a page whether an issue is rejected, with the same rules as the parsers
+
+    Parameters
+    ----------
+    _id : string
+        Issue id
+
+    url_prefix : string
+        Issue tracking system URL prefix, used to find the importance field
+
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+    """
+    def __init__(self, _id, url_prefix, attributes):
+        self._id = _id
+        self.parser = etree.HTMLPullParser(events=('end',))
+        self.status_id = attributes['status-id']
+        self.lucene = 'description-id' in attributes
+        self.comment_regex = re.compile(attributes['comment-regex'])
+        self.importance_id = None
+        self.type_id = None
+        if 'bugzilla.mozilla.org' in url_prefix:
+            self.importance_id = 'field-value-bug_severity'
+            self.type_id = 'field-value-bug_type' # bugzilla.mozilla.org moved enhancements from the severity to the type field
+        elif 'https://bugs.eclipse.org' in url_prefix:
+            self.importance_id = 'bz_show_bug_column_1'
+        self.status = None
+        self.importance = None
+        self.bug_type = None
+        self.header_read = False # past the first comment, fields missing by then aren't on the page
+
+    def feed(self, chunk):
+        """Parse the next chunk of the page
+
+        Returns
+        -------
+        verdict : None while undecided, True to download the rest of the page,
+            False if the issue is rejected (the reason is recorded with scraper.reject)
+        """
+        self.parser.feed(chunk)
+        for _, element in self.parser.read_events():
+            element_id = element.get('id')
+            if element_id is None:
+                continue
+            if element_id == self.status_id and self.status is None:
+                self.status = element_text(element)
+            elif element_id == self.importance_id and self.importance is None:
+                self.importance = self.read_importance(element)
+            elif element_id == self.type_id and self.bug_type is None:
+                self.bug_type = element_text(element)
+            elif self.comment_regex.search(element_id):
+                self.header_read = True
+        return self.verdict()
+
+    def read_importance(self, element):
+        if self.importance_id == 'bz_show_bug_column_1': # Mylyn: 9th row of the first table
+            rows = element.xpath('(.//table)[1]//tr')
+            return element_text(rows[8]) if len(rows) > 8 else ''
+        return element_text(element)
+
+    def verdict(self):
+        if self.status is None:
+            return None
+        if self.lucene:
+            if self.status not in LUCENE_TYPES: # not a requirement
+                log('[{0}] Not requirement - {1}\n'.format(self._id, self.status))
+                reject(self._id, REJECT_NOT_ENHANCEMENT)
+                return False
+            return True
+
+        if self.status in DUPLICATED_ISSUES:
+            log('[{0}] Duplicated issue!'.format(self._id))
+            reject(self._id, REJECT_DUPLICATE)
+            return False
+        if self.importance_id is None: # unknown tracker, let the parser decide
+            return True
+        if self.importance is None:
+            return None
+        importance = self.importance
+        if self.type_id is not None and 'enhancement' not in importance:
+            if self.bug_type is None and not self.header_read: # the type may still say enhancement
+                return None
+            importance = ' '.join([importance, self.bug_type or ''])
+        if 'enhancement' not in importance: # only retrieve requirements (with enhancement)
+            log('[{0}] Not requirement - {1}\n'.format(self._id, importance))
+            reject(self._id, REJECT_NOT_ENHANCEMENT)
+            return False
+        return True
+
+def fetch_unless_rejected(url, _id, url_prefix, attributes):
+    """Download an issue page, giving up as soon as its header rejects the issue
+
+    Parameters
+    ----------
+    url : string
+        URL of the issue page
+
+    _id : string
+        Issue id
+
+    url_prefix : string
+        Issue tracking system URL prefix
+
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+
+    Returns
+    -------
+    content : bytes of the whole page, None if the issue was rejected or couldn't be downloaded
+    """
+    check = HeaderCheck(_id, url_prefix, attributes)
+    body = []
+    verdict = None
+    try:
+        send = lambda: get_session().get(mirror_url(url), stream=True, timeout=REQUEST_TIMEOUT)
+        with metrics.timer('scraper_fetch_seconds'), closing(retry_request(send, url)) as result:
+            metrics.inc('scraper_responses_total', status=result.status_code)
+            if result.status_code != 200:
+                log('Can\'t access url!')
+                reject(_id, REJECT_HTTP_ERROR)
+                return None
+            for chunk in result.iter_content(CHUNK_BYTES):
+                body.append(chunk)
+                metrics.inc('scraper_fetch_bytes_total', len(chunk))
+                if verdict is None:
+                    verdict = check.feed(chunk)
+                    if verdict is False: # closing the response drops the connection with the rest of the page
+                        log('[{0}] Stopped after {1} bytes'.format(_id, sum(len(b) for b in body)))
+                        metrics.inc('scraper_early_aborts_total')
+                        return None
+    except Exception as err:
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
+        return None
+    return b''.join(body)
@@ -0,0 +1,225 @@
+'''
+Fast HTML extraction backend. Compiles the attribute dictionaries of the
+scraper (firefox_attributes, mylyn_attributes, lucene_attributes) into XPath
+selectors once, and runs them on the native lxml.html tree instead of walking
+a BeautifulSoup tree in Python.
+'''
+
+import re
+
+import lxml.html
+from lxml import etree
+
+from issue import Issue
+from scraper import (reject, log, DUPLICATED_ISSUES, MINIMUM_COMMENTS, MINIMUM_COMMENTERS, REJECT_DUPLICATE,
+                     REJECT_NOT_ENHANCEMENT, REJECT_FEW_COMMENTS, REJECT_FEW_COMMENTERS, REJECT_EXCEPTION)
+
+REGEX_NS = {'re': 'http://exslt.org/regular-expressions'}
+
+_compiled = {} # cache of compiled selectors, keyed by the attribute dictionary items
+
+def has_class(name):
+    """XPath predicate matching elements with name as one of their classes, like BeautifulSoup class_=name
+    """
+    return "contains(concat(' ', normalize-space(@class), ' '), ' %s ')" % name
+
+def class_matches(element, regex):
+    """Check the class attribute the way BeautifulSoup matches class_=re.compile(...):
+    against every single class and against the whole attribute
+    """
+    classes = element.get('class', '')
+    return any(regex.search(c) for c in classes.split()) or regex.search(' '.join(classes.split())) is not None
+
+def compile_attributes(attributes):
+    """Compile the HTML attributes of a system into XPath selectors
+
+    Parameters
+    ----------
+    attributes : dictionary
+        firefox_attributes, mylyn_attributes or lucene_attributes
+
+    Returns
+    -------
+    selectors : dictionary
+        Mapping from attribute name to compiled etree.XPath. Compiled selectors
+        are cached, so this is cheap to call for every page
+    """
+    key = tuple(sorted(attributes.items()))
+    selectors = _compiled.get(key)
+    if selectors is not None:
+        return selectors
+
+    by_id = lambda name: etree.XPath("//*[@id='%s']" % attributes[name])
+    selectors = {
+        'status': by_id('status-id'),
+        'title': by_id('title-id'),
+        'comments': etree.XPath("//*[re:test(@id, '%s')]" % attributes['comment-regex'], namespaces=REGEX_NS),
+    }
+    if 'description-id' in attributes: # LUCENE
+        selectors['description'] = by_id('description-id')
+        selectors['commenter'] = etree.XPath(".//a[normalize-space(@class)='user-hover user-avatar']")
+    else: # Firefox and Mylyn
+        selectors['attachments'] = by_id('attachment-id')
+        selectors['attachment-regex'] = re.compile(attributes['attachment-regex'])
+        selectors['reporter'] = etree.XPath("//*[@id='%s']//*[%s]" % (attributes['reporter-id'], has_class(attributes['reporter-class'])))
+        selectors['commenter'] = etree.XPath(".//span[%s]" % has_class(attributes['commenter-class']))
+        selectors['first-commenter'] = etree.XPath(".//*[%s]" % has_class(attributes['commenter-class']))
+        selectors['comment-text'] = etree.XPath(".//*[%s]" % has_class(attributes['comment-text-class']))
+        selectors['firefox-importance'] = etree.XPath("//*[@id='field-value-bug_severity']")
+        selectors['firefox-type'] = etree.XPath("//*[@id='field-value-bug_type']")
+        selectors['mylyn-importance'] = etree.XPath("(//*[@id='bz_show_bug_column_1']//table)[1]//tr")
+    _compiled[key] = selectors
+    return selectors
+
+def first_text(selector, element):
+    """Text of the first element matched by selector, like BeautifulSoup find(...).text
+
+    Raises IndexError when nothing matches, as BeautifulSoup raises AttributeError
+    """
+    return selector(element)[0].text_content()
+
+def count_commenters(_id, comments, selector):
+    # Count number of commenters participating in the discussion
+    commenters = dict()
+    for comment in comments:
+        c = first_text(selector, comment)
+        commenters[c] = commenters.get(c, 0) + 1
+
+    if (len(commenters) < MINIMUM_COMMENTERS):
+        log('[{0}] Issue has only {1} comments!\n'.format(_id, len(commenters)))
+        reject(_id, REJECT_FEW_COMMENTERS)
+        return None
+    else:
+        log('[{0}] Issue has {1} commenters!\n'.format(_id, len(commenters)))
+
+    return commenters
+
+def parse_issue_lxml(url_prefix, _id, c, attributes):
+    """Parse a downloaded Mylyn or Firefox issue page, same result as scraper.parse_issue
+
+    Parameters
+    ----------
+    url_prefix : string
+        Issue tracking system URL prefix, used to tell Firefox and Mylyn apart
+
+    _id : string
+        Issue id
+
+    c : bytes
+        Content of the issue page
+
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected
+    """
+    selectors = compile_attributes(attributes)
+    try:
+        root = lxml.html.document_fromstring(c)
+        # check if the issue is duplicate
+        status = ' '.join(first_text(selectors['status'], root).split())
+        if status in DUPLICATED_ISSUES:
+            log('[{0}] Duplicated issue!'.format(_id))
+            reject(_id, REJECT_DUPLICATE)
+            return None
+
+        if 'bugzilla.mozilla.org' in url_prefix:
+            importance = first_text(selectors['firefox-importance'], root)
+            bug_type = selectors['firefox-type'](root) # bugzilla.mozilla.org moved enhancements from the severity to the type field
+            if bug_type:
+                importance += ' ' + bug_type[0].text_content()
+        elif 'https://bugs.eclipse.org' in url_prefix:
+            importance = selectors['mylyn-importance'](root)[8].text_content()
+        else: # invalid url
+            reject(_id, REJECT_EXCEPTION)
+            return None
+
+        importance = ' '.join(importance.split())
+        if 'enhancement' not in importance: # only retrieve requirements (with enhancement)
+            log('[{0}] Not requirement - {1}\n'.format(_id, importance))
+            reject(_id, REJECT_NOT_ENHANCEMENT)
+            return None
+
+        title = first_text(selectors['title'], root)
+        description = ""
+        # Consider the first comment as a part of description if the reporter is also the first commenter
+        comments = selectors['comments'](root)
+        if len(comments) > MINIMUM_COMMENTS: # the scraped issue should have a certain number of comments to be considered active
+            commenters = count_commenters(_id, comments, selectors['commenter'])
+            if commenters is None:
+                return None
+
+            reporter = first_text(selectors['reporter'], root).replace('\n', '').strip()
+            first_commenter = first_text(selectors['first-commenter'], comments[0]).replace('\n', '').strip()
+            if first_commenter == reporter: # get issue description if the first commenter is also reporter
+                description = ' '.join(first_text(selectors['comment-text'], comments[0]).split())
+        else:
+            log('[{0}] Issue has only {1} comments\n'.format(_id, len(comments)))
+            reject(_id, REJECT_FEW_COMMENTS)
+            return None
+
+        # Attachments description might reveal some important information about the issue
+        # Include all obsolete attachments
+        attachments_content = []
+        attachments = selectors['attachments'](root)
+        if attachments: # if there is attachment
+            regex = selectors['attachment-regex']
+            attachments = [e for e in attachments[0].iterdescendants() if isinstance(e.tag, str) and class_matches(e, regex)]
+            if len(attachments) > 1:
+                for attach in attachments[1:]:
+                    if 'bugzilla.mozilla.org' in url_prefix:
+                        attachments_content.append(' '.join(attach.find('.//a').text_content().split()))
+                    elif 'https://bugs.eclipse.org' in url_prefix:
+                        attachments_content.append(' '.join(attach.find('.//b').text_content().split()))
+
+    except Exception as err: # an unexpected exception happened. sometimes due to invalid authority access
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
+        return None
+
+    log('[{0}] Completed!\n'.format(_id))
+    return Issue(str(_id), title, description, attachments_content, len(comments), len(commenters))
+
+def parse_lucene_lxml(url_prefix, _id, c, attributes):
+    """Parse a downloaded LUCENE issue page, same result as scraper.parse_lucene
+
+    Parameters
+    ----------
+    see parse_issue_lxml
+
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected
+    """
+    selectors = compile_attributes(attributes)
+    try:
+        root = lxml.html.document_fromstring(c)
+        status = ' '.join(first_text(selectors['status'], root).split())
+        if status != 'New Feature' and status != 'Improvement': # not a requirement
+            log('[{0}] Not requirement - {1}\n'.format(_id, status))
+            reject(_id, REJECT_NOT_ENHANCEMENT)
+            return None
+
+        # Only accept issue that contains a certain number of comments
+        comments = selectors['comments'](root)
+        if len(comments) < MINIMUM_COMMENTS:
+            log('[{0}] Issue has only {1} comments!\n'.format(_id, len(comments)))
+            reject(_id, REJECT_FEW_COMMENTS)
+            return None
+        else:
+            log('[{0}] Issue has {1} comments!\n'.format(_id, len(comments)))
+        commenters = count_commenters(_id, comments, selectors['commenter'])
+        if commenters is None:
+            return None
+
+        title = ' '.join(first_text(selectors['title'], root).split())
+        description = ' '.join(first_text(selectors['description'], root).split())
+    except Exception as err:
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
+        return None
+
+    log('[{0}] Completed!\n'.format(_id))
+    return Issue(str(_id), title, description, [], len(comments), len(commenters))
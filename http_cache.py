@@ -0,0 +1,169 @@
+'''
+Persistent on-disk cache of HTTP responses. Bodies are stored compressed
+together with their ETag/Last-Modified validators so reruns can revalidate
+with conditional GETs, or skip the network entirely in offline mode.
+'''
+
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024 # 1 GB of compressed bodies
+EVICT_INTERVAL = 100 # check the cache size every this many stores
+EVICT_RATIO = 0.9 # evict down to this fraction of max_size
+
+class CachedResponse(object):
+    """A response served from the cache, with the attributes of requests.Response that the scrapers use
+    """
+    def __init__(self, url, status_code, content, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = True
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+class ResponseCache(object):
+    """URL keyed response cache backed by a SQLite file
+
+    Parameters
+    ----------
+    directory : string
+        Directory holding the cache file, created when missing
+
+    max_size : integer
+        Maximum total size in bytes of the compressed bodies. Least recently
+        used entries are evicted when the cache grows beyond it
+
+    offline : boolean
+        Cache-only mode. Never touch the network, missing urls are answered with 504
+
+    max_age : integer
+        Entries stored less than max_age seconds ago are served without
+        revalidation. None to always revalidate
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, offline=False, max_age=None):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, 'responses.sqlite')
+        self.max_size = max_size
+        self.offline = offline
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._db = None
+        self._pid = None
+        self._stores = 0
+
+    def connection(self):
+        # SQLite connections must not cross fork, open one per process
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, '
+                             'last_modified TEXT, body BLOB, size INTEGER, stored REAL, accessed REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self._pid = os.getpid()
+        return self._db
+
+    def lookup(self, url):
+        """Find a cached entry
+
+        Returns
+        -------
+        entry : tuple (etag, last_modified, compressed body, stored time), None if not cached
+        """
+        return self.connection().execute('SELECT etag, last_modified, body, stored FROM responses WHERE url = ?',
+                                         (url,)).fetchone()
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match/If-Modified-Since headers to revalidate an entry
+        """
+        headers = {}
+        if entry is not None:
+            if entry[0]:
+                headers['If-None-Match'] = entry[0]
+            if entry[1]:
+                headers['If-Modified-Since'] = entry[1]
+        return headers
+
+    def is_fresh(self, entry):
+        return self.max_age is not None and time.time() - entry[3] < self.max_age
+
+    def hit(self, url, entry):
+        """Serve an entry and mark it as recently used
+        """
+        self.hits += 1
+        self.connection().execute('UPDATE responses SET accessed = ? WHERE url = ?', (time.time(), url))
+        return CachedResponse(url, 200, zlib.decompress(entry[2]))
+
+    def store(self, url, headers, content):
+        """Save a 200 response
+        """
+        body = zlib.compress(content)
+        now = time.time()
+        self.connection().execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (url, headers.get('ETag'), headers.get('Last-Modified'), body, len(body), now, now))
+        self._stores += 1
+        if self._stores % EVICT_INTERVAL == 0:
+            self.evict()
+
+    def size(self):
+        return self.connection().execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in EVICT_RATIO of max_size
+        """
+        total = self.size()
+        if total <= self.max_size:
+            return 0
+
+        db = self.connection()
+        evicted = 0
+        target = self.max_size * EVICT_RATIO
+        for url, size in db.execute('SELECT url, size FROM responses ORDER BY accessed').fetchall():
+            if total <= target:
+                break
+            db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total -= size
+            evicted += 1
+        print('Evicted {0} responses from cache'.format(evicted))
+        return evicted
+
+    def get(self, session, url, **kwargs):
+        """GET a url through the cache
+
+        Parameters
+        ----------
+        session : requests.Session
+            Session used when the network is needed
+
+        url : string
+            Full url, including the query string
+
+        Returns
+        -------
+        response : a requests.Response or a CachedResponse
+        """
+        entry = self.lookup(url)
+        if entry is not None and (self.offline or self.is_fresh(entry)):
+            return self.hit(url, entry)
+        if self.offline:
+            self.misses += 1
+            return CachedResponse(url, 504, b'')
+
+        headers = self.conditional_headers(entry)
+        response = session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            return self.hit(url, entry)
+
+        self.misses += 1
+        if response.status_code == 200:
+            self.store(url, response.headers, response.content)
+        return response
@@ -6,16 +6,19 @@ class Issue(object):
     """
     
     """
-    def __init__(self, _id, title='', description='', attachments=[], comments = 0, commenters=0):
+    # no per-instance __dict__, corpora hold millions of issues
+    __slots__ = ('_id', 'title', 'description', 'attachments', 'comments', 'commenters')
+
+    def __init__(self, _id, title='', description='', attachments=None, comments = 0, commenters=0):
         self._id = _id
         self.title = title
         self.description = description
-        self.attachments = attachments
+        self.attachments = [] if attachments is None else attachments
         self.comments = comments
         self.commenters = commenters
     
     def __str__(self):
-        representation = ['id: ' + self._id, 'title: ' + self.title, 'description: ' + self.description, 'attachments: ' + self.attachments]
+        representation = ['id: ' + self._id, 'title: ' + str(self.title), 'description: ' + str(self.description), 'attachments: ' + ', '.join(str(a) for a in self.attachments)]
         return '\n'.join(representation)
     
     def get_id(self):
@@ -0,0 +1,136 @@
+'''
+Struct-of-arrays table of issues. Ids and the comment/commenter counts are
+NumPy columns so filtering and statistics are single vectorized operations;
+the text of an issue is only materialized when its row is asked for.
+'''
+
+import numpy as np
+
+def id_column(ids):
+    """Make the id column, int64 when every id is a number
+    """
+    ids = list(ids)
+    if all(isinstance(_id, str) and _id.isdigit() for _id in ids):
+        return np.array([int(_id) for _id in ids], dtype=np.int64)
+    return np.array(ids, dtype=object)
+
+class IssueTable(object):
+    """Columns of a list of issues
+
+    Parameters
+    ----------
+    ids : array-like
+        Issue ids
+
+    comments, commenters : array-like of integer
+        Number of comments and commenters of each issue
+
+    source : sequence of Issue
+        Where rows are materialized from, e.g. a list of Issue or a
+        corpus_store.CorpusStore. source[rows[i]] is the i-th issue of the table
+
+    rows : array of integer
+        Positions of the table rows in source, all of them when None
+    """
+    def __init__(self, ids, comments, commenters, source, rows=None):
+        self.ids = np.asarray(ids)
+        self.comments = np.asarray(comments, dtype=np.int64)
+        self.commenters = np.asarray(commenters, dtype=np.int64)
+        self.source = source
+        self.rows = np.arange(len(self.ids)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    @classmethod
+    def from_issues(cls, issues):
+        """Build a table from Issue objects, rows are the issues themselves
+        """
+        issues = list(issues)
+        return cls(id_column(issue.get_id() for issue in issues),
+                   [issue.get_comments() for issue in issues],
+                   [issue.get_commenters() for issue in issues],
+                   issues)
+
+    @classmethod
+    def from_store(cls, store):
+        """Build a table on top of a corpus_store.CorpusStore without decoding any text but the ids
+        """
+        return cls(id_column(store.ids()), store.comments, store.commenters, store)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        """Row view of the table: the i-th Issue
+        """
+        return self.source[int(self.rows[i])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def issues(self):
+        return list(self)
+
+    def take(self, indices):
+        """Sub-table of the given row positions (or boolean mask)
+        """
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return IssueTable(self.ids[indices], self.comments[indices], self.commenters[indices],
+                          self.source, self.rows[indices])
+
+    def stats(self):
+        """Mean and (population) standard deviation of the comments and commenters columns
+
+        Returns
+        -------
+        stats : dictionary
+        """
+        return {
+            'comments_mean': self.comments.sum() / len(self),
+            'comments_std': self.comments.std(),
+            'commenters_mean': self.commenters.sum() / len(self),
+            'commenters_std': self.commenters.std(),
+        }
+
+    def threshold_mask(self, comment_std_dev=0, commenter_std_dev=0, std_units=False):
+        """Rows with at least average + offset comments and commenters
+
+        Parameters
+        ----------
+        comment_std_dev, commenter_std_dev : number
+            Offsets added to the averages
+
+        std_units : boolean
+            Offsets are counted in standard deviations (mean + k * std) instead
+            of absolute numbers of comments/commenters (mean + k)
+
+        Returns
+        -------
+        mask : boolean array
+        """
+        stats = self.stats()
+        comment_step = stats['comments_std'] if std_units else 1
+        commenter_step = stats['commenters_std'] if std_units else 1
+        return ((self.comments >= stats['comments_mean'] + comment_std_dev * comment_step) &
+                (self.commenters >= stats['commenters_mean'] + commenter_std_dev * commenter_step))
+
+    def filter(self, comment_std_dev=0, commenter_std_dev=0, std_units=False, predicate=None):
+        """Keep rows above the thresholds of threshold_mask and matching predicate
+
+        Parameters
+        ----------
+        predicate : function
+            Takes the table and returns a boolean array over its rows,
+            e.g. lambda t: t.comments > 10
+
+        Returns
+        -------
+        table : IssueTable
+        """
+        if len(self) == 0:
+            return self
+        mask = self.threshold_mask(comment_std_dev, commenter_std_dev, std_units)
+        if predicate is not None:
+            mask &= np.asarray(predicate(self), dtype=bool)
+        return self.take(mask)
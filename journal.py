@@ -0,0 +1,127 @@
+'''
+Checkpoint journal for crash-safe, resumable scraping. Every finished id is
+appended to the journal as one JSON line, kept issues with their content and
+rejected ids with the reason.
+'''
+
+import json
+import os
+
+from issue import Issue
+from scraper import pop_rejection, REJECT_HTTP_ERROR, REJECT_EXCEPTION
+
+KEPT = 'kept'
+REJECTED = 'rejected'
+
+RETRYABLE_REASONS = [REJECT_HTTP_ERROR, REJECT_EXCEPTION] # rejections retried on resume
+
+class Journal(object):
+    """Append-only journal of scraped ids, usable as the callback of the scrape engines
+
+    Every record is written with a single write() on a file opened with
+    O_APPEND, so worker processes can share one journal without interleaving
+    their lines.
+
+    Parameters
+    ----------
+    path : string
+        Path to the journal file
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def __getstate__(self):
+        # file descriptors don't cross process boundaries, reopen in every worker
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __call__(self, _id, issue):
+        if issue is None:
+            self.record_rejection(_id, pop_rejection(_id))
+        else:
+            self.record_issue(issue)
+
+    def write(self, record):
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        os.write(self._fd, (json.dumps(record) + '\n').encode('utf-8'))
+
+    def record_issue(self, issue):
+        self.write({
+            'id': issue.get_id(),
+            'status': KEPT,
+            'title': issue.get_title(),
+            'description': issue.get_description(),
+            'attachments': issue.get_attachments(),
+            'comments': issue.get_comments(),
+            'commenters': issue.get_commenters(),
+        })
+
+    def record_rejection(self, _id, reason):
+        self.write({'id': str(_id), 'status': REJECTED, 'reason': reason})
+
+def read_journal(path):
+    """Read the records of a journal, the last record of an id wins
+
+    A truncated last line (the process died while writing it) is ignored.
+
+    Returns
+    -------
+    records : dictionary
+        Mapping from issue id (string) to its latest record
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print('Skipping corrupted journal line: {0}'.format(line.strip()))
+                continue
+            records[record['id']] = record
+    return records
+
+def completed_ids(path, retry_failed=True):
+    """Ids that don't need to be scraped again
+
+    Parameters
+    ----------
+    path : string
+        Path to the journal file
+
+    retry_failed : boolean
+        Don't count ids rejected because of HTTP errors or exceptions as completed
+
+    Returns
+    -------
+    ids : set of string
+    """
+    ids = set()
+    for _id, record in read_journal(path).items():
+        if retry_failed and record['status'] == REJECTED and record.get('reason') in RETRYABLE_REASONS:
+            continue
+        ids.add(_id)
+    return ids
+
+def journal_to_issues(path):
+    """Build the list of kept issues from a journal, sorted by id
+
+    Returns
+    -------
+    issues : list of Issue
+    """
+    issues = []
+    for _id, record in read_journal(path).items():
+        if record['status'] == KEPT:
+            issues.append(Issue(_id, record['title'], record['description'], record['attachments'],
+                                record['comments'], record['commenters']))
+    issues.sort(key=lambda issue: (len(issue.get_id()), issue.get_id())) # numeric order of the ids
+    return issues
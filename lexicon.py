@@ -0,0 +1,154 @@
+'''
+Lexicon-only NFR classification: word list matching on the raw issue text.
+
+All entries of the word lists of a classification (single words and phrases
+like "time behaviour" or "fault_tolerance") are compiled into one Aho-Corasick
+automaton over words. Each issue's title, description and attachments are then
+scanned once, counting the word list hits of every category, without any topic
+model. Labels follow the rules of topic_modeling.determine_nfr_category: the
+category with most hits, the first one on ties, None without any hit.
+'''
+
+import re
+from collections import deque
+
+import numpy as np
+
+from nfr_index import normalize_lines
+
+TOKEN = re.compile(r'[^\W_]+') # runs of letters and digits, '_' separates the words of an entry
+
+def tokenize(text):
+    """Lowercase words of a text
+    """
+    return TOKEN.findall(text.lower())
+
+class Lexicon(object):
+    """Aho-Corasick automaton over the words of the word list entries
+
+    States are integers. goto[s] maps a word to the next state, fail[s] is the
+    state of the longest proper suffix of s that is also a prefix of an entry,
+    and out[s] lists the categories of every entry ending at s (through fail
+    links too), once per entry.
+
+    Parameters
+    ----------
+    word_list : dictionary
+        Mapping from category to its word list file, e.g. topic_modeling.WORD_LIST
+    """
+    def __init__(self, word_list):
+        self.categories = list(word_list.keys())
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.entries = 0
+        for c, category in enumerate(self.categories):
+            with open(word_list[category]) as f:
+                for entry in normalize_lines(f):
+                    self.add(tokenize(entry), c)
+        self.link()
+
+    def add(self, words, c):
+        if not words:
+            return
+        s = 0
+        for word in words:
+            if word not in self.goto[s]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[s][word] = len(self.goto) - 1
+            s = self.goto[s][word]
+        if c not in self.out[s]: # same entry in a category twice (e.g. "fault tolerance" and "fault_tolerance")
+            self.out[s].append(c)
+            self.entries += 1
+
+    def link(self):
+        """Compute the fail links breadth first and merge the outputs along them
+        """
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for word, t in self.goto[s].items():
+                f = self.fail[s]
+                while f and word not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[t] = self.goto[f].get(word, 0) if self.goto[f].get(word) != t else 0
+                self.out[t] = self.out[t] + self.out[self.fail[t]]
+                queue.append(t)
+
+    def scan(self, words, hits):
+        """Add the category hits of a sequence of words to hits
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        s = 0
+        for word in words:
+            while s and word not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(word, 0)
+            for c in out[s]:
+                hits[c] += 1
+        return hits
+
+    def hits(self, texts):
+        """Hits of each category in some texts, entries never match across two texts
+
+        Parameters
+        ----------
+        texts : list of string
+
+        Returns
+        -------
+        hits : list of integer
+            Hits of each category, in the order of self.categories
+        """
+        hits = [0] * len(self.categories)
+        for text in texts:
+            if text:
+                self.scan(tokenize(text), hits)
+        return hits
+
+    def label(self, hits):
+        """Category of some hit counts, None without any hit
+        """
+        best = int(np.argmax(hits)) if hits else 0
+        return self.categories[best] if hits and hits[best] > 0 else None
+
+    def issue_texts(self, issue):
+        return [issue.get_title(), issue.get_description()] + list(issue.get_attachments())
+
+    def classify_issue(self, issue):
+        """Label and hit counts of an Issue
+
+        Returns
+        -------
+        (label, hits) : string (or None) and dictionary from category to hits
+        """
+        hits = self.hits(self.issue_texts(issue))
+        return self.label(hits), dict(zip(self.categories, hits))
+
+    def classify(self, corpus):
+        """Labels of a corpus, in the form assign_nfr_category returns
+
+        Parameters
+        ----------
+        corpus : dictionary
+            Mapping from issue id to its texts, see topic_modeling.issues_to_corpus
+
+        Returns
+        -------
+        issue_nfr_category : dictionary
+            Mapping from issue id to its category (None if no word list entry occurs in it)
+        """
+        return dict((_id, self.label(self.hits(texts))) for _id, texts in corpus.items())
+
+    def classify_stream(self, issues):
+        """Label issues as they come, e.g. from scraper.iter_multiprocess_scrape
+
+        Yields
+        ------
+        (id, label, hits) : issue id, its category and its hits by category
+        """
+        for issue in issues:
+            label, hits = self.classify_issue(issue)
+            yield issue.get_id(), label, hits
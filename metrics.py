@@ -0,0 +1,218 @@
+'''
+Counters and latency histograms of the scraper and the analysis pipeline.
+
+Instrumented code calls inc(), observe() or timer() on the registry of its
+process: a dictionary update, cheap enough for every issue. Pool workers send
+what they recorded back to the parent with take() and the parent adds it to
+its own registry with merge(), so a run ends with one registry whichever
+process did the work. It is exported as a JSON summary or as a Prometheus
+textfile (node_exporter textfile collector format).
+
+    metrics.inc('scraper_rejected_total', reason='duplicate')
+    with metrics.timer('scraper_fetch_seconds'):
+        ...
+    metrics.write_json('metrics.json')
+'''
+
+import bisect
+import json
+import os
+import time
+
+# upper bounds in seconds of the histogram buckets, +Inf is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 300.)
+QUANTILES = (0.5, 0.9, 0.99) # estimated from the buckets in the JSON summary
+
+HELP = {
+    'scraper_fetch_seconds': 'Time to download an issue page or API batch',
+    'scraper_fetch_bytes_total': 'Bytes of the downloaded responses',
+    'scraper_responses_total': 'Responses by HTTP status',
+    'scraper_parse_seconds': 'Time to parse an issue page',
+    'scraper_issues_total': 'Issues scraped and kept',
+    'scraper_rejected_total': 'Ids rejected, by reason',
+    'scraper_early_aborts_total': 'Downloads stopped once the page header rejected the issue',
+    'pipeline_stage_seconds': 'Time of a stage of the analysis pipeline',
+    'pipeline_issues_total': 'Issues entering a stage of the analysis pipeline',
+    'model_issue_seconds': 'Time to fit the topic model of an issue',
+    'nfr_category_total': 'Issues assigned to each category, None for non-nfr issues',
+}
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metrics(object):
+    """Registry of counters and histograms, each identified by a name and labels
+    """
+    def __init__(self):
+        self.counters = {} # (name, labels) to value
+        self.histograms = {} # (name, labels) to [bucket counts, sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0., 0]
+        histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    def timer(self, name, **labels):
+        """Context manager observing the time spent in its block
+        """
+        return Timer(self, name, labels)
+
+    def merge(self, snapshot):
+        """Add the counters and histograms of another registry, e.g. from take() in a worker
+        """
+        counters, histograms = snapshot
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, (buckets, total, count) in histograms.items():
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.histograms[key] = [list(buckets), total, count]
+            else:
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def take(self):
+        """Return everything recorded so far, picklable, and start over
+        """
+        snapshot = (self.counters, self.histograms)
+        self.counters = {}
+        self.histograms = {}
+        return snapshot
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, label_key(labels)), 0)
+
+    def counts(self, name):
+        """Values of a counter by labels, e.g. counts('scraper_rejected_total')
+        """
+        return dict((labels, value) for (n, labels), value in self.counters.items() if n == name)
+
+    def summary(self):
+        """JSON-serializable summary: counter values and histogram count/sum/mean/quantiles
+
+        Returns
+        -------
+        summary : dictionary
+            {'counters': {name: [{'labels': ..., 'value': ...}]},
+             'histograms': {name: [{'labels': ..., 'count': ..., 'sum': ..., 'mean': ..., 'p50': ...}]}}
+        """
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        histograms = {}
+        for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+            entry = {'labels': dict(labels), 'count': count, 'sum': round(total, 6),
+                     'mean': round(total / count, 6) if count else None}
+            for q in QUANTILES:
+                entry['p{0:g}'.format(q * 100)] = quantile(buckets, count, q)
+            entry['buckets'] = dict(zip([str(b) for b in BUCKETS] + ['+Inf'], buckets))
+            histograms.setdefault(name, []).append(entry)
+        return {'counters': counters, 'histograms': histograms}
+
+    def prometheus(self):
+        """Prometheus text exposition of the registry
+        """
+        lines = []
+        typed = set()
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append('# HELP {0} {1}'.format(name, HELP[name]))
+                lines.append('# TYPE {0} {1}'.format(name, kind))
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, 'counter')
+            lines.append('{0}{1} {2}'.format(name, format_labels(labels), value))
+        for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip([repr(b) for b in BUCKETS] + ['+Inf'], buckets):
+                cumulative += n
+                lines.append('{0}_bucket{1} {2}'.format(name, format_labels(labels + (('le', bound),)), cumulative))
+            lines.append('{0}_sum{1} {2!r}'.format(name, format_labels(labels), total))
+            lines.append('{0}_count{1} {2}'.format(name, format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+class Timer(object):
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+def quantile(buckets, count, q):
+    """Upper bound of the bucket holding the q quantile, None past the last bound
+    """
+    if count == 0:
+        return None
+    rank = q * count
+    cumulative = 0
+    for bound, n in zip(BUCKETS, buckets):
+        cumulative += n
+        if cumulative >= rank:
+            return bound
+    return None
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = ('{0}="{1}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+def write_atomic(path, data):
+    # the textfile collector may read at any time, never let it see a partial file
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+_metrics = Metrics() # registry of the current process
+
+def registry():
+    return _metrics
+
+def inc(name, value=1, **labels):
+    _metrics.inc(name, value, **labels)
+
+def observe(name, seconds, **labels):
+    _metrics.observe(name, seconds, **labels)
+
+def timer(name, **labels):
+    return _metrics.timer(name, **labels)
+
+def take():
+    return _metrics.take()
+
+def merge(snapshot):
+    _metrics.merge(snapshot)
+
+def reset():
+    _metrics.take()
+
+def write_json(path):
+    """Write the JSON summary of the registry of this process
+    """
+    write_atomic(path, json.dumps(_metrics.summary(), indent=2))
+
+def write_textfile(path):
+    """Write the registry of this process as a Prometheus textfile
+    """
+    write_atomic(path, _metrics.prometheus())
@@ -0,0 +1,455 @@
+'''
+Local stand-in for the issue trackers, to measure and regression-test the
+scrapers offline.
+
+Serves the issue pages and REST endpoints the scrapers use, for Firefox
+(bugzilla.mozilla.org), Mylyn (bugs.eclipse.org) and LUCENE (issues.apache.org),
+under /firefox, /mylyn and /lucene. Issues are synthetic and deterministic for
+a seed, or recorded pages read from <pages-dir>/<system>/<id>.html. Latency,
+error rate and throttling (429 with Retry-After) are configurable.
+
+    tracker = MockTracker(latency=0.05, error_rate=0.01).start()
+    scraper.use_mirror(tracker.mirrors())
+    scraper.scrape('Mylyn', range(1, 101))
+
+or, as a separate process: python mock_tracker.py --port 8765 --latency 0.05
+'''
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_MAX_ID = 100000 # ids above don't exist (404)
+DEFAULT_PADDING = 30000 # bytes of boilerplate after the issue, real pages weigh 50-200KB
+DUPLICATE_RATIO = 0.1
+ENHANCEMENT_RATIO = 0.5
+
+# tracker origin to the path serving it, see MockTracker.mirrors()
+ORIGINS = {
+    'https://bugzilla.mozilla.org': '/firefox',
+    'https://bugs.eclipse.org': '/mylyn',
+    'https://issues.apache.org': '/lucene',
+}
+
+USERS = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank', 'grace', 'heidi']
+WORDS = ('the editor should support faster startup and lower memory usage when opening large projects '
+         'add an option to configure the proxy so synchronization works offline improve error '
+         'messages of the task list usability of the wizard is poor portability on mac and linux '
+         'refactor the connector api for maintainability reliability of the repository query '
+         'security of stored credentials performance of search dialog interface layout').split()
+
+def synthetic_issue(system, _id, seed=0, enhancement_ratio=ENHANCEMENT_RATIO):
+    """Deterministic fake issue
+
+    Returns
+    -------
+    issue : dictionary
+        duplicate, enhancement, title, reporter, comments (list of (author, text))
+        and attachments (list of string)
+    """
+    rnd = random.Random('{0}-{1}-{2}'.format(system, _id, seed))
+    users = rnd.sample(USERS, rnd.randint(1, 4))
+    reporter = users[0] if rnd.random() < 0.7 else rnd.choice(USERS)
+    comments = [(rnd.choice(users), ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(10, 80))))
+                for _ in range(rnd.randint(0, 12))]
+    return {
+        'duplicate': rnd.random() < DUPLICATE_RATIO,
+        'enhancement': rnd.random() < enhancement_ratio,
+        'title': '{0} {1}'.format(' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(3, 9))), _id),
+        'reporter': reporter,
+        'comments': comments,
+        'attachments': ['patch {0} v{1}'.format(rnd.choice(WORDS), k) for k in range(rnd.randint(0, 3))],
+    }
+
+def firefox_page(issue, padding=0):
+    status = 'RESOLVED DUPLICATE' if issue['duplicate'] else 'NEW'
+    severity = 'enhancement' if issue['enhancement'] else 'normal'
+    comments = ''.join(
+        '<div id="c{0}" class="comment"><span class="vcard"><span class="fna">{1}</span></span>'
+        '<pre class="comment-text">{2}</pre></div>'.format(k, escape(author), escape(text))
+        for k, (author, text) in enumerate(issue['comments']))
+    attachments = ''.join('<tr class="attach-desc"><td><a href="#">{0}</a></td></tr>'.format(escape(a))
+                          for a in issue['attachments'])
+    return ('<html><head><meta charset="utf-8"><title>Bug</title></head><body>'
+            '<span id="field-value-status_summary">{0}</span>'
+            '<span id="field-value-bug_severity">{1}</span>'
+            '<span id="field-value-bug_type">{7}</span>'
+            '<h1 id="field-value-short_desc">{2}</h1>'
+            '<div id="field-reporter"><span class="vcard"><span class="fna">{3}</span></span></div>{4}'
+            '<table id="attachments"><tr class="attach-desc"><th>Attachments</th></tr>{5}</table>'
+            '<div id="footer">{6}</div></body></html>').format(
+                status, severity, escape(issue['title']), escape(issue['reporter']), comments, attachments, 'x' * padding,
+                'enhancement' if issue['enhancement'] else 'defect')
+
+def mylyn_page(issue, padding=0):
+    status = 'VERIFIED DUPLICATE' if issue['duplicate'] else 'NEW'
+    importance = 'P3 enhancement' if issue['enhancement'] else 'P3 major'
+    rows = ''.join('<tr><td>field {0}</td></tr>'.format(k) for k in range(8)) + '<tr><td>{0}</td></tr>'.format(importance)
+    comments = ''.join(
+        '<div id="c{0}"><span class="vcard"><span class="fn">{1}</span></span>'
+        '<pre class="bz_comment_text">{2}</pre></div>'.format(k, escape(author), escape(text))
+        for k, (author, text) in enumerate(issue['comments']))
+    attachments = ''.join('<tr class="bz_contenttype"><td><b>{0}</b></td></tr>'.format(escape(a))
+                          for a in issue['attachments'])
+    return ('<html><head><meta charset="utf-8"><title>Bug</title></head><body>'
+            '<span id="bz_field_status">{0}</span><div id="bz_show_bug_column_1"><table>{1}</table></div>'
+            '<span id="short_desc_nonedit_display">{2}</span>'
+            '<div id="bz_show_bug_column_2"><span class="vcard">{3}</span></div>{4}'
+            '<table id="attachment_table"><tr class="bz_contenttype"><th>Attachments</th></tr>{5}</table>'
+            '<div id="footer">{6}</div></body></html>').format(
+                status, rows, escape(issue['title']), escape(issue['reporter']), comments, attachments, 'x' * padding)
+
+def lucene_type(issue):
+    return 'Improvement' if issue['enhancement'] else 'Bug'
+
+def lucene_page(issue, padding=0):
+    comments = ''.join(
+        '<div id="comment-{0}"><a class="user-hover user-avatar" href="#">{1}</a><p>{2}</p></div>'.format(
+            k, escape(author), escape(text))
+        for k, (author, text) in enumerate(issue['comments'][1:]))
+    description = issue['comments'][0][1] if issue['comments'] else ''
+    return ('<html><head><meta charset="utf-8"><title>Issue</title></head><body>'
+            '<span id="type-val">{0}</span><h1 id="summary-val">{1}</h1>'
+            '<div id="description-val"><p>{2}</p></div>{3}<div id="footer">{4}</div></body></html>').format(
+                lucene_type(issue), escape(issue['title']), escape(description), comments, 'x' * padding)
+
+PAGES = {'firefox': firefox_page, 'mylyn': mylyn_page, 'lucene': lucene_page}
+
+def bugzilla_bug(_id, issue):
+    return {
+        'id': _id, 'summary': issue['title'], 'creator': issue['reporter'],
+        'status': 'RESOLVED' if issue['duplicate'] else 'NEW',
+        'resolution': 'DUPLICATE' if issue['duplicate'] else '',
+        'severity': 'enhancement' if issue['enhancement'] else 'normal',
+        'type': 'enhancement' if issue['enhancement'] else 'defect',
+    }
+
+def jira_issue(_id, issue):
+    return {'key': 'LUCENE-{0}'.format(_id), 'fields': {
+        'issuetype': {'name': lucene_type(issue)}, 'summary': issue['title'],
+        'description': issue['comments'][0][1] if issue['comments'] else '',
+        'comment': {'comments': [{'author': {'name': author}, 'body': text} for author, text in issue['comments'][1:]]},
+    }}
+
+def mirrors(url):
+    """Mapping to pass to scraper.use_mirror to scrape the mock tracker at url instead of the trackers
+    """
+    return dict((origin, url + path) for origin, path in ORIGINS.items())
+
+class TokenBucket(object):
+    """Allow rate requests per second on average, burst at once
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class MockTrackerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real trackers
+    disable_nagle_algorithm = True # headers and body are separate writes, don't wait for delayed ACKs
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        start = time.time()
+        tracker = self.server.tracker
+        status = tracker.inject(self)
+        if status is None:
+            status = self.route()
+        tracker.record(status, time.time() - start)
+
+    def send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def send_json(self, data):
+        return self.send(200, json.dumps(data), 'application/json')
+
+    def route(self):
+        tracker = self.server.tracker
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+
+        if path == '/_stats':
+            return self.send_json(tracker.stats(reset='reset' in query))
+
+        m = re.match(r'^/(firefox|mylyn/bugs)/show_bug\.cgi$', path)
+        if m:
+            system = m.group(1).split('/')[0]
+            return self.page(system, int(query.get('id', ['0'])[0]))
+        m = re.match(r'^/lucene/jira/browse/LUCENE-(\d+)$', path)
+        if m:
+            return self.page('lucene', int(m.group(1)))
+
+        m = re.match(r'^/(firefox|mylyn/bugs)/rest/bug(?:/(\d+)/(comment|attachment))?$', path)
+        if m:
+            return self.bugzilla(m.group(1).split('/')[0], m.group(2), m.group(3), query)
+        if path == '/lucene/jira/rest/api/2/search':
+            return self.jira_search(query)
+        return self.send(404, 'Not found')
+
+    def page(self, system, _id):
+        tracker = self.server.tracker
+        recorded = tracker.recorded_page(system, _id)
+        if recorded is not None:
+            return self.send(200, recorded)
+        if not tracker.exists(_id):
+            return self.send(404, 'Bug {0} does not exist'.format(_id))
+        return self.send(200, PAGES[system](tracker.issue(system, _id), tracker.padding))
+
+    def bugzilla(self, system, first_id, resource, query):
+        tracker = self.server.tracker
+        if resource is None:
+            if 'id' in query:
+                ids = [int(i) for i in query['id'][0].split(',') if i]
+            else: # candidate search of candidates.query_bugzilla_candidates
+                low, high = int(query['v1'][0]), int(query['v2'][0])
+                offset, limit = int(query.get('offset', ['0'])[0]), int(query.get('limit', ['1000'])[0])
+                ids = [i for i in range(low, min(high, tracker.max_id) + 1)
+                       if tracker.issue(system, i)['enhancement'] and not tracker.issue(system, i)['duplicate']]
+                ids = ids[offset:offset + limit]
+            return self.send_json({'bugs': [bugzilla_bug(i, tracker.issue(system, i)) for i in ids if tracker.exists(i)]})
+
+        ids = [int(first_id)] + [int(i) for i in query.get('ids', [])]
+        ids = [i for i in ids if tracker.exists(i)]
+        if resource == 'comment':
+            return self.send_json({'bugs': dict((str(i), {'comments': [
+                {'creator': author, 'text': text} for author, text in tracker.issue(system, i)['comments']]}) for i in ids)})
+        return self.send_json({'bugs': dict((str(i), [{'summary': a} for a in tracker.issue(system, i)['attachments']]) for i in ids)})
+
+    def jira_search(self, query):
+        tracker = self.server.tracker
+        jql = query.get('jql', [''])[0]
+        keys = re.search(r'key in \(([^)]*)\)', jql)
+        if keys:
+            ids = [int(key.split('-')[-1]) for key in keys.group(1).split(',') if key.strip()]
+        else: # candidate search of candidates.query_jira_candidates
+            low = int(re.search(r'key >= LUCENE-(\d+)', jql).group(1))
+            high = int(re.search(r'key <= LUCENE-(\d+)', jql).group(1))
+            start, limit = int(query.get('startAt', ['0'])[0]), int(query.get('maxResults', ['1000'])[0])
+            ids = [i for i in range(low, min(high, tracker.max_id) + 1) if tracker.issue('lucene', i)['enhancement']]
+            ids = ids[start:start + limit]
+        return self.send_json({'issues': [jira_issue(i, tracker.issue('lucene', i)) for i in ids if tracker.exists(i)]})
+
+class MockTrackerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients closing pages early (see early_abort.py) are not errors
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+class MockTracker(object):
+    """Threaded HTTP server standing in for the trackers
+
+    Parameters
+    ----------
+    host, port : string and integer
+        Address to listen on, port 0 for any free port
+
+    latency : float
+        Seconds added to every response
+
+    jitter : float
+        Extra latency drawn uniformly from [0, jitter] seconds
+
+    error_rate : float
+        Probability of answering a request with a 500 error
+
+    rate : float
+        Requests per second allowed before answering 429 Too Many Requests, None for no limit
+
+    burst : integer
+        Requests allowed at once by the rate limit
+
+    max_id : integer
+        Largest existing issue id
+
+    seed : integer
+        Seed of the synthetic issues
+
+    padding : integer
+        Bytes of boilerplate appended to every page
+
+    pages_dir : string
+        Directory of recorded pages, <pages_dir>/<system>/<id>.html
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0., jitter=0., error_rate=0., rate=None, burst=10,
+                 max_id=DEFAULT_MAX_ID, seed=0, padding=DEFAULT_PADDING, pages_dir=None, enhancement_ratio=ENHANCEMENT_RATIO):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_id = max_id
+        self.seed = seed
+        self.padding = padding
+        self.pages_dir = pages_dir
+        self.enhancement_ratio = enhancement_ratio
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issues = {}
+        self.reset_stats()
+        self.server = MockTrackerServer((host, port), MockTrackerHandler)
+        self.server.tracker = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def mirrors(self):
+        return mirrors(self.url)
+
+    def start(self):
+        """Serve in a background thread
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def exists(self, _id):
+        return 0 < _id <= self.max_id
+
+    def issue(self, system, _id):
+        key = (system, _id)
+        if key not in self.issues:
+            self.issues[key] = synthetic_issue(system, _id, self.seed, self.enhancement_ratio)
+        return self.issues[key]
+
+    def recorded_page(self, system, _id):
+        if self.pages_dir is None:
+            return None
+        path = os.path.join(self.pages_dir, system, '{0}.html'.format(_id))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def inject(self, handler):
+        """Apply latency, throttling and errors, returns the status sent when the request is not served
+        """
+        with self.lock:
+            delay = self.latency + self.random.random() * self.jitter
+            failed = self.random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if handler.path.startswith('/_stats'):
+            return None
+        if self.bucket is not None and not self.bucket.take():
+            return handler.send(429, 'Too many requests', headers={'Retry-After': '1'})
+        if failed:
+            return handler.send(500, 'Internal server error')
+        return None
+
+    def record(self, status, elapsed):
+        with self.lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latencies.append(elapsed)
+
+    def reset_stats(self):
+        self.requests = 0
+        self.statuses = {}
+        self.latencies = []
+
+    def stats(self, reset=False):
+        """Requests served, by status, and their service times in seconds
+        """
+        with self.lock:
+            stats = {'requests': self.requests, 'statuses': dict((str(k), v) for k, v in self.statuses.items()),
+                     'latencies': list(self.latencies)}
+            if reset:
+                self.reset_stats()
+        return stats
+
+def serve_process(conn, options):
+    tracker = MockTracker(**options)
+    conn.send(tracker.url)
+    conn.close()
+    tracker.serve_forever()
+
+def start_process(**options):
+    """Run a MockTracker in a child process, so that its CPU time isn't counted with the scrapers'
+
+    Parameters
+    ----------
+    options : keyword arguments of MockTracker
+
+    Returns
+    -------
+    (process, url) : the multiprocessing.Process, to terminate when done, and the URL it serves
+    """
+    import multiprocessing as mp
+    parent, child = mp.Pipe()
+    process = mp.Process(target=serve_process, args=(child, options))
+    process.daemon = True
+    process.start()
+    url = parent.recv()
+    return process, url
+
+def main():
+    parser = argparse.ArgumentParser('python mock_tracker.py', description='Serve synthetic Bugzilla/Jira issues locally.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0., help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0., help='Random extra latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0., help='Probability of a 500 response')
+    parser.add_argument('--rate', type=float, default=None, help='Requests per second before answering 429')
+    parser.add_argument('--burst', type=int, default=10, help='Requests allowed at once by --rate')
+    parser.add_argument('--max-id', type=int, default=DEFAULT_MAX_ID, help='Largest existing issue id')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic issues')
+    parser.add_argument('--padding', type=int, default=DEFAULT_PADDING, help='Bytes of boilerplate in every page')
+    parser.add_argument('--pages-dir', type=str, default=None, help='Recorded pages, <pages-dir>/<system>/<id>.html')
+    _args = vars(parser.parse_args())
+
+    tracker = MockTracker(_args['host'], _args['port'], _args['latency'], _args['jitter'], _args['error_rate'],
+                          _args['rate'], _args['burst'], _args['max_id'], _args['seed'], _args['padding'], _args['pages_dir'])
+    print('Serving on {0}'.format(tracker.url))
+    for origin, base in sorted(tracker.mirrors().items()):
+        print('  {0} -> {1}'.format(origin, base))
+    try:
+        tracker.serve_forever()
+    except KeyboardInterrupt:
+        tracker.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+'''
+Compiled index of the non-functional requirement word lists.
+
+The word lists are tokenized once into a sparse term x category matrix: entry
+(t, c) is the number of lines of the word list of category c in which the term t
+occurs exactly once, which is what topic_modeling.determine_nfr_category counts
+for every topic word. Scoring the topic words of any number of issues is then a
+single sparse matrix product.
+'''
+
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+class CategoryIndex(object):
+    """Word -> category membership counts
+
+    Parameters
+    ----------
+    categories : list of string
+        Category names, in the order ties are broken (first one wins)
+
+    terms : dictionary
+        Mapping from term to its row in matrix
+
+    matrix : scipy.sparse.csr_matrix
+        Terms x categories counts
+    """
+    def __init__(self, categories, terms, matrix):
+        self.categories = list(categories)
+        self.terms = terms
+        self.matrix = matrix.tocsr()
+
+    def topic_matrix(self, topics):
+        """Indicator matrix of the indexed topic words of each issue
+
+        Parameters
+        ----------
+        topics : list of list of string
+            Topic words of each issue
+
+        Returns
+        -------
+        indicator : scipy.sparse.csr_matrix
+            Issues x terms, 1 where the issue has the term among its topic words
+        """
+        indptr = [0]
+        indices = []
+        for words in topics:
+            rows = set(self.terms[word] for word in words if word in self.terms)
+            indices.extend(rows)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(topics), len(self.terms)))
+
+    def scores(self, topics):
+        """Word list matches of the topic words of each issue in each category
+
+        Returns
+        -------
+        scores : array of integer
+            Issues x categories
+        """
+        return np.asarray((self.topic_matrix(topics) @ self.matrix).todense())
+
+    def classify(self, topics):
+        """Categories of many issues at once
+
+        Parameters
+        ----------
+        topics : dictionary
+            Mapping from issue id to topic words associate with that issue
+
+        Returns
+        -------
+        issue_nfr_category : dictionary
+            Mapping from issue id to its category, None when no topic word is
+            in any word list. Ties go to the first category.
+        """
+        ids = list(topics.keys())
+        if not ids:
+            return {}
+        scores = self.scores([topics[_id] for _id in ids])
+        best = scores.argmax(axis=1) # first maximum, like max() over the categories
+        matched = scores[np.arange(len(ids)), best] > 0
+        return dict((_id, self.categories[b] if m else None) for _id, b, m in zip(ids, best, matched))
+
+    def category(self, words):
+        """Category of a single list of topic words, see classify
+        """
+        return self.classify({0: words})[0]
+
+def normalize_lines(lines):
+    """Lowercase and strip word list lines, dropping empty and repeated ones
+    """
+    seen = set()
+    normalized = []
+    for line in lines:
+        line = line.strip().lower()
+        if line and line not in seen:
+            seen.add(line)
+            normalized.append(line)
+    return normalized
+
+def compile_category_index(word_list, normalize=False):
+    """Tokenize the word lists into a CategoryIndex
+
+    Lines are tokenized like CountVectorizer does (lowercase, words of 2+
+    characters), which is how determine_nfr_category matches topic words against them.
+
+    Parameters
+    ----------
+    word_list : dictionary
+        Mapping from category to its word list file, e.g. topic_modeling.WORD_LIST
+
+    normalize : boolean
+        Count every distinct line once (see normalize_lines) instead of every
+        line of the file as it is
+
+    Returns
+    -------
+    index : CategoryIndex
+    """
+    categories = list(word_list.keys())
+    lines = []
+    line_category = []
+    for c, category in enumerate(categories):
+        with open(word_list[category]) as f:
+            category_lines = normalize_lines(f) if normalize else [line.strip() for line in f]
+        lines.extend(category_lines)
+        line_category.extend([c] * len(category_lines))
+
+    vectorizer = CountVectorizer()
+    try:
+        counts = vectorizer.fit_transform(lines)
+    except ValueError: # word lists without a single token
+        return CategoryIndex(categories, {}, sparse.csr_matrix((0, len(categories)), dtype=np.int64))
+    once = (counts == 1).astype(np.int64)
+
+    # Lines x categories membership, summed over the lines of each category
+    membership = sparse.csr_matrix((np.ones(len(lines), dtype=np.int64), (np.arange(len(lines)), line_category)),
+                                   shape=(len(lines), len(categories)))
+    matrix = (once.T @ membership).tocsr()
+    return CategoryIndex(categories, vectorizer.vocabulary_, matrix)
+
+def save_category_index(index, path, meta=None):
+    """Save an index to a single .npz file, written atomically
+
+    Parameters
+    ----------
+    index : CategoryIndex
+
+    path : string
+        File path
+
+    meta : dictionary
+        JSON-serializable data stored along, returned by load_category_index
+    """
+    terms = sorted(index.terms, key=index.terms.get)
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, data=index.matrix.data, indices=index.matrix.indices, indptr=index.matrix.indptr,
+                 shape=np.array(index.matrix.shape, dtype=np.int64),
+                 terms=np.array(terms, dtype=str), categories=np.array(index.categories, dtype=str),
+                 meta=np.array(json.dumps(meta or {})))
+    os.replace(tmp, path)
+
+def load_category_index(path):
+    """Load an index saved with save_category_index
+
+    Returns
+    -------
+    (index, meta) : CategoryIndex and dictionary
+    """
+    with np.load(path) as f:
+        matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        terms = dict((term, i) for i, term in enumerate(f['terms'].tolist()))
+        index = CategoryIndex(f['categories'].tolist(), terms, matrix)
+        meta = json.loads(str(f['meta']))
+    return index, meta
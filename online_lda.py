@@ -0,0 +1,158 @@
+'''
+Corpus-level LDA model updated incrementally with partial_fit.
+
+The model, its vocabulary and the ids of the issues it has seen are kept in a
+directory:
+    model.pkl        the LatentDirichletAllocation object and the ids of the issues
+                     it was fitted on, in one file replaced at once so they always agree
+    vocabulary.json  terms of the model columns, fixed when the model is created
+    meta.json        parameters, written last: a model directory is complete once it exists
+
+Each update only tokenizes and fits the issues the model hasn't seen, so a
+refresh costs work proportional to the new issues instead of the whole history.
+Terms that aren't in the vocabulary of the first batch are ignored, build a new
+model to take them in.
+'''
+
+import json
+import os
+import pickle
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.decomposition import LatentDirichletAllocation
+
+DEFAULT_TOPICS = 20 # topics of the corpus-level model
+DEFAULT_VOCABULARY_SIZE = 10000
+TOTAL_SAMPLES = 1e6 # expected size of the whole corpus, scales the online updates
+
+def write_atomic(path, data, mode='w'):
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, mode) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+class OnlineLDA(object):
+    """LDA model of a growing corpus, one document per issue
+
+    Parameters
+    ----------
+    path : string
+        Model directory, loaded when it holds a model
+
+    n_topics : integer
+        Number of topics of a new model
+
+    vocabulary_size : integer
+        Number of most frequent terms of the first batch making the vocabulary of a new model
+    """
+    def __init__(self, path, n_topics=DEFAULT_TOPICS, vocabulary_size=DEFAULT_VOCABULARY_SIZE):
+        self.path = path
+        self.n_topics = n_topics
+        self.vocabulary_size = vocabulary_size
+        self.lda = None
+        self.vocabulary = None
+        self.vectorizer = None
+        self.seen = set()
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            self.load()
+
+    def load(self):
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(self.path, 'vocabulary.json')) as f:
+            self.vocabulary = json.load(f)
+        with open(os.path.join(self.path, 'model.pkl'), 'rb') as f:
+            state = pickle.load(f)
+        self.lda = state['lda']
+        self.seen = set(state['ids'])
+        self.n_topics = meta['n_topics']
+        self.vocabulary_size = meta['vocabulary_size']
+        self.vectorizer = CountVectorizer(vocabulary=self.vocabulary, stop_words='english')
+
+    def save(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        # the ids go with the model, a crash between two files can't leave fitted issues unrecorded
+        write_atomic(os.path.join(self.path, 'model.pkl'), pickle.dumps({'lda': self.lda, 'ids': sorted(self.seen)}), 'wb')
+        write_atomic(os.path.join(self.path, 'vocabulary.json'), json.dumps(self.vocabulary))
+        # meta.json last: a model directory is complete once it exists
+        write_atomic(os.path.join(self.path, 'meta.json'), json.dumps({
+            'n_topics': self.n_topics, 'vocabulary_size': self.vocabulary_size}))
+
+    def new_issues(self, corpus):
+        """Part of a corpus the model hasn't been fitted on
+        """
+        return dict((k, v) for k, v in corpus.items() if k not in self.seen)
+
+    def transform_counts(self, corpus):
+        """Issues x vocabulary token counts, the texts of an issue joined into one document
+        """
+        return self.vectorizer.transform([' '.join(v) for v in corpus.values()])
+
+    def update(self, corpus):
+        """Fit the model on the issues of a corpus it hasn't seen, creating it on the first call
+
+        Parameters
+        ----------
+        corpus : dictionary
+            Mapping from issue id to its texts, see topic_modeling.issues_to_corpus
+
+        Returns
+        -------
+        new : dictionary
+            The new issues of the corpus, the ones the model was updated with.
+            Empty when there is no model yet and the new issues have no terms
+            to make its vocabulary of, the model is then left uncreated
+        """
+        new = self.new_issues(corpus)
+        if not new:
+            return new
+        if self.lda is None:
+            vectorizer = CountVectorizer(max_features=self.vocabulary_size, stop_words='english')
+            try:
+                vectorizer.fit([' '.join(v) for v in new.values()])
+            except ValueError: # nothing but stop words, the issues stay unseen until a batch can make a vocabulary
+                print('Couldn\'t create the model, the {0} new issues only have stop words'.format(len(new)))
+                return {}
+            self.vocabulary = [str(term) for term in sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)]
+            self.vectorizer = CountVectorizer(vocabulary=self.vocabulary, stop_words='english')
+            self.lda = LatentDirichletAllocation(n_components=self.n_topics, learning_method='online',
+                                                 learning_offset=50., total_samples=TOTAL_SAMPLES,
+                                                 random_state=0)
+        self.lda.partial_fit(self.transform_counts(new))
+        self.seen.update(new.keys())
+        return new
+
+    def issue_topics(self, corpus, n_topics, n_top_words):
+        """Topic words of issues, shaped like topic_modeling.make_topic_words
+
+        The n_topics topics weighing most in an issue each give the n_top_words
+        terms of the issue that topic weighs most.
+
+        Returns
+        -------
+        results : list of (id, topic words, output)
+            Like topic_modeling.lda_issue_topics, topic words are None for
+            issues without any term of the vocabulary
+        """
+        from topic_modeling import few_words_error
+
+        counts = self.transform_counts(corpus).tocsr()
+        doc_topics = self.lda.transform(counts)
+        results = []
+        for i, (k, v) in enumerate(corpus.items()):
+            terms = counts.indices[counts.indptr[i]:counts.indptr[i+1]]
+            if len(terms) == 0:
+                results.append((k, None, few_words_error(k, v)))
+                continue
+            lines = ['Topic words for issue %s' % k]
+            topic_words = []
+            for rank, topic in enumerate(np.argsort(-doc_topics[i], kind='stable')[:n_topics]):
+                weights = self.lda.components_[topic, terms]
+                tw = [self.vocabulary[terms[j]] for j in np.argsort(-weights, kind='stable')[:n_top_words]]
+                lines.append("Topic #%d: " % (rank+1) + " ".join(tw))
+                topic_words.extend(tw)
+            lines.append('')
+            results.append((k, topic_words, '\n'.join(lines)))
+        return results
@@ -0,0 +1,160 @@
+'''
+Persistent memoization cache of per-issue results (topic words, categories).
+
+Results are keyed by a hash of everything they depend on: the issue texts and
+the engine parameters for topic words, the topic words and the word list
+contents for categories. Reruns only compute the issues whose text or
+parameters changed. Entries are stored compressed in a SQLite file and the
+least recently used ones are evicted beyond a maximum size, like
+http_cache.ResponseCache.
+'''
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024 # 256 MB of compressed results
+EVICT_INTERVAL = 1000 # check the cache size every this many stores
+EVICT_RATIO = 0.9 # evict down to this fraction of max_size
+SQLITE_MAX_VARIABLES = 900 # keys per SELECT ... IN (...) query
+
+def result_key(kind, *parts):
+    """Hash of a result kind and the JSON-serializable values it depends on
+    """
+    data = json.dumps([kind] + list(parts), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def word_list_version(word_list):
+    """Hash of the categories and contents of a word list, changes whenever a file is edited
+
+    Parameters
+    ----------
+    word_list : dictionary
+        Mapping from category to its word list file
+    """
+    digest = hashlib.sha1()
+    for category, f in word_list.items():
+        digest.update(category.encode('utf-8') + b'\0')
+        with open(f, 'rb') as wl:
+            digest.update(hashlib.sha1(wl.read()).digest())
+    return digest.hexdigest()
+
+class ResultCache(object):
+    """Key/value cache of JSON-serializable results backed by a SQLite file
+
+    Parameters
+    ----------
+    directory : string
+        Directory holding the cache file, created when missing
+
+    max_size : integer
+        Maximum total size in bytes of the compressed results. Least recently
+        used entries are evicted when the cache grows beyond it
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, 'results.sqlite')
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+        self._stores = 0
+
+    def connection(self):
+        # SQLite connections must not cross fork, open one per process
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, '
+                             'size INTEGER, accessed REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            self._pid = os.getpid()
+        return self._db
+
+    def get_many(self, keys):
+        """Look up many keys at once
+
+        Returns
+        -------
+        found : dictionary
+            Mapping from the cached keys to their values
+        """
+        keys = list(set(keys))
+        db = self.connection()
+        found = {}
+        for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            batch = keys[i:i+SQLITE_MAX_VARIABLES]
+            query = 'SELECT key, value FROM results WHERE key IN ({0})'.format(','.join('?' * len(batch)))
+            for key, value in db.execute(query, batch):
+                found[key] = json.loads(zlib.decompress(value).decode('utf-8'))
+        if found:
+            now = time.time()
+            db.executemany('UPDATE results SET accessed = ? WHERE key = ?', [(now, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def put_many(self, items):
+        """Store (key, value) pairs in one transaction
+        """
+        rows = []
+        now = time.time()
+        for key, value in items:
+            blob = zlib.compress(json.dumps(value).encode('utf-8'))
+            rows.append((key, blob, len(blob), now))
+        if not rows:
+            return
+        db = self.connection()
+        db.execute('BEGIN')
+        try:
+            db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', rows)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        previous = self._stores
+        self._stores += len(rows)
+        if self._stores // EVICT_INTERVAL != previous // EVICT_INTERVAL:
+            self.evict()
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def size(self):
+        return self.connection().execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in EVICT_RATIO of max_size
+        """
+        total = self.size()
+        if total <= self.max_size:
+            return 0
+
+        db = self.connection()
+        evicted = 0
+        target = self.max_size * EVICT_RATIO
+        for key, size in db.execute('SELECT key, size FROM results ORDER BY accessed').fetchall():
+            if total <= target:
+                break
+            db.execute('DELETE FROM results WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        print('Evicted {0} results from cache'.format(evicted))
+        return evicted
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.
+
+    def report(self):
+        """Hit/miss summary of the lookups of this process
+        """
+        return 'Result cache: {0} hits, {1} misses ({2:.1%} hit rate)'.format(self.hits, self.misses, self.hit_rate())
@@ -13,6 +13,7 @@ import multiprocessing as mp
 import time
 
 from issue import Issue
+import metrics
 
 FIREFOX_URL_PREFIX = 'https://bugzilla.mozilla.org/show_bug.cgi?id='
 MYLYN_URL_PREFIX = 'https://bugs.eclipse.org/bugs/show_bug.cgi?id='
@@ -41,6 +42,210 @@ lucene_attributes = {
     'status-id':'type-val', 'title-id':'summary-val', 'description-id':'description-val', 'comment-regex':'^comment-\d+$'
 }
 
+# reasons for rejecting an issue, see reject()
+REJECT_DUPLICATE = 'duplicate'
+REJECT_NOT_ENHANCEMENT = 'not enhancement'
+REJECT_FEW_COMMENTS = 'too few comments'
+REJECT_FEW_COMMENTERS = 'too few commenters'
+REJECT_NOT_FOUND = 'not found'
+REJECT_HTTP_ERROR = 'http error'
+REJECT_EXCEPTION = 'exception'
+
+REQUEST_TIMEOUT = 60 # seconds to wait for a tracker before giving up on an issue
+CHUNK_SIZE = 100 # number of ids handed to a worker at a time
+
+_session = None # HTTP session of the current process, see get_session()
+_session_pid = None
+_cache = None # optional http_cache.ResponseCache, see enable_cache()
+_extractor = 'bs4' # HTML extraction backend, see use_extractor()
+_early_abort = False # stop downloading pages whose header rejects the issue, see use_early_abort()
+_rejections = {} # issue id to rejection reason in the current process, see reject()
+_mirrors = {} # tracker origin to the server answering in its place, see use_mirror()
+_verbose = True # print per-issue progress messages, see use_verbose()
+
+def reject(_id, reason):
+    """Remember why an issue was not scraped
+    
+    Parameters
+    ----------
+    _id : string or integer
+        Issue id
+        
+    reason : string
+        One of the REJECT_* constants
+    """
+    _rejections[str(_id)] = reason
+    metrics.inc('scraper_rejected_total', reason=reason)
+
+def pop_rejection(_id):
+    """Return and forget the rejection reason of an issue, None if it wasn't rejected
+    """
+    return _rejections.pop(str(_id), None)
+
+def use_verbose(verbose=True):
+    """Print (or not) a message for every scraped, rejected or failed issue
+    
+    Printing from many workers is slow and interleaves, the metrics module
+    counts the same events. Pool workers forked afterwards inherit the setting.
+    """
+    global _verbose
+    _verbose = verbose
+
+def log(message):
+    """Print a per-issue progress message, unless turned off with use_verbose()
+    """
+    if _verbose:
+        print(message)
+
+def get_session():
+    """Return the HTTP session of the current process
+    
+    The session keeps a pool of keep-alive connections so consecutive issues
+    from the same tracker don't pay a new TCP and TLS handshake. A new session
+    is created after fork so worker processes never share sockets.
+    
+    Returns
+    -------
+    session : a requests.Session instance
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = requests.Session()
+        _session_pid = os.getpid()
+    return _session
+
+def enable_cache(directory, max_size=None, offline=False, max_age=None):
+    """Serve every request of this process (and of workers forked from it) through an on-disk response cache
+    
+    Parameters
+    ----------
+    directory : string
+        Cache directory
+        
+    max_size : integer
+        Size cap of the cache in bytes, None for the default
+        
+    offline : boolean
+        Only answer from the cache, never touch the network
+        
+    max_age : integer
+        Serve entries younger than max_age seconds without revalidation
+    
+    Returns
+    -------
+    cache : the http_cache.ResponseCache instance
+    """
+    global _cache
+    from http_cache import ResponseCache, DEFAULT_MAX_SIZE
+    _cache = ResponseCache(directory, max_size or DEFAULT_MAX_SIZE, offline, max_age)
+    return _cache
+
+def response_cache():
+    """The http_cache.ResponseCache of this process, None unless enable_cache() was called
+    """
+    return _cache
+
+def use_extractor(name):
+    """Select the HTML extraction backend of this process (and of workers forked from it)
+    
+    Parameters
+    ----------
+    name : string
+        'bs4' for BeautifulSoup (parse_issue and parse_lucene), 'lxml' for the
+        precompiled XPath selectors of extractors.py
+    """
+    global _extractor
+    if name not in ['bs4', 'lxml']:
+        raise RuntimeError('Extractor is unsupported: ' + name)
+    _extractor = name
+
+def use_early_abort(enabled=True):
+    """Read issue pages incrementally and drop the connection as soon as the
+    status or importance of the issue rejects it (see early_abort.py). Ignored
+    when the response cache is enabled, since it stores whole pages
+    """
+    global _early_abort
+    _early_abort = enabled
+
+def early_abort_enabled():
+    return _early_abort and _cache is None
+
+def use_mirror(mirrors):
+    """Send the requests of this process (and of workers forked from it) for
+    some trackers to other servers, e.g. a local mock_tracker.MockTracker
+    
+    Parameters
+    ----------
+    mirrors : dictionary
+        Mapping from tracker origin (e.g. 'https://bugzilla.mozilla.org') to
+        the base URL answering in its place, empty to stop mirroring
+    """
+    global _mirrors
+    _mirrors = dict(mirrors or {})
+
+def mirror_url(url):
+    """URL actually requested for a tracker URL, see use_mirror()
+    """
+    for origin, base in _mirrors.items():
+        if url.startswith(origin):
+            return base + url[len(origin):]
+    return url
+
+def get_parsers():
+    """Return the (Firefox/Mylyn parser, LUCENE parser) of the selected extraction backend
+    """
+    if _extractor == 'lxml':
+        from extractors import parse_issue_lxml, parse_lucene_lxml
+        return parse_issue_lxml, parse_lucene_lxml
+    return parse_issue, parse_lucene
+
+def fetch(url, params=None):
+    """GET a url with the session of the current process, through the response cache when enabled
+    
+    429/5xx responses, connection errors and timeouts are retried with
+    backoff, see throttle.retry_request.
+    
+    Parameters
+    ----------
+    url : string
+        URL to download
+        
+    params : dictionary
+        Query string parameters
+    
+    Returns
+    -------
+    result : a requests.Response (or http_cache.CachedResponse)
+    """
+    from throttle import retry_request
+    target = mirror_url(url)
+    if _cache is not None and params:
+        target = requests.Request('GET', target, params=params).prepare().url
+    
+    def send():
+        with metrics.timer('scraper_fetch_seconds'):
+            if _cache is None:
+                result = get_session().get(target, params=params, timeout=REQUEST_TIMEOUT)
+            else:
+                result = _cache.get(get_session(), target, timeout=REQUEST_TIMEOUT)
+        metrics.inc('scraper_responses_total', status=result.status_code)
+        metrics.inc('scraper_fetch_bytes_total', len(result.content))
+        return result
+    
+    if _cache is not None and _cache.offline: # never touches the network, nothing to retry or throttle
+        return send()
+    # 429/5xx responses and connection errors are retried, the last one is returned or raised
+    return retry_request(send, url)
+
+def parse_page(parse, url_prefix, _id, c, attributes):
+    """Parse a downloaded issue page with a parser of get_parsers(), timing it and counting kept issues
+    """
+    with metrics.timer('scraper_parse_seconds'):
+        issue = parse(url_prefix, _id, c, attributes)
+    if issue is not None:
+        metrics.inc('scraper_issues_total')
+    return issue
+
 def scrape_issue(url_prefix, _id, attributes):
     """Scrape Mylyn or Firefox issues (They share HTML structure)
     
@@ -59,6 +264,50 @@ def scrape_issue(url_prefix, _id, attributes):
     -------
     issue : an Issue instance
     """
+    url = url_prefix + str(_id)
+    log('Scraping url: %s' % url)
+    
+    if early_abort_enabled():
+        from early_abort import fetch_unless_rejected
+        c = fetch_unless_rejected(url, _id, url_prefix, attributes)
+        return None if c is None else parse_page(get_parsers()[0], url_prefix, _id, c, attributes)
+    
+    try:
+        result = fetch(url)
+        # Can't access the url
+        if result.status_code != 200:
+            log('Can\'t access url!')
+            reject(_id, REJECT_HTTP_ERROR)
+            return
+        c = result.content
+    except Exception as err: # an unexpected exception happened. sometimes due to invalid authority access
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
+        return None
+    
+    return parse_page(get_parsers()[0], url_prefix, _id, c, attributes)
+
+def parse_issue(url_prefix, _id, c, attributes):
+    """Parse a downloaded Mylyn or Firefox issue page
+    
+    Parameters
+    ----------
+    url_prefix : string
+        Issue tracking system URL prefix, used to tell Firefox and Mylyn apart
+        
+    _id : string
+        Issue id
+        
+    c : bytes
+        Content of the issue page
+        
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+    
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected
+    """
     # extract necessary html attributes from dictionary
     status_id = attributes['status-id']
     title_id = attributes['title-id']
@@ -70,34 +319,31 @@ def scrape_issue(url_prefix, _id, attributes):
     commenter_class = attributes['commenter-class']
     comment_text_class = attributes['comment-text-class']
     
-    url = url_prefix + str(_id)
-    print('Scraping url: %s' % url)
-    
     try:
-        result = requests.get(url)
-        # Can't access the url
-        if result.status_code != 200:
-            print('Can\'t access url!')
-            return
-        c = result.content
         soup = BeautifulSoup(c, 'lxml')
         # check if the issue is duplicate
         status = soup.find(id=status_id).text
         status = ' '.join(status.split())
         if status in DUPLICATED_ISSUES:
-            print('[{0}] Duplicated issue!'.format(_id))
+            log('[{0}] Duplicated issue!'.format(_id))
+            reject(_id, REJECT_DUPLICATE)
             return None
         
         if 'bugzilla.mozilla.org' in url_prefix:
             importance = soup.find(id='field-value-bug_severity').text
+            bug_type = soup.find(id='field-value-bug_type') # bugzilla.mozilla.org moved enhancements from the severity to the type field
+            if bug_type is not None:
+                importance += ' ' + bug_type.text
         elif 'https://bugs.eclipse.org' in url_prefix:
             importance = soup.find(id='bz_show_bug_column_1').find('table').find_all('tr')[8].text
         else: # invalid url
+            reject(_id, REJECT_EXCEPTION)
             return None
         
         importance = ' '.join(importance.split())
         if 'enhancement' not in importance: # only retrieve requirements (with enhancement)
-            print('[{0}] Not requirement - {1}\n'.format(_id, importance))
+            log('[{0}] Not requirement - {1}\n'.format(_id, importance))
+            reject(_id, REJECT_NOT_ENHANCEMENT)
             return None
         
         title = soup.find(id=title_id).text
@@ -124,7 +370,8 @@ def scrape_issue(url_prefix, _id, attributes):
                 # print('Comment: %s' % comment)
                 description = ' '.join(comment.split())
         else:
-            print('[{0}] Issue has only {1} comments\n'.format(_id, len(comments)))
+            log('[{0}] Issue has only {1} comments\n'.format(_id, len(comments)))
+            reject(_id, REJECT_FEW_COMMENTS)
             return None
                     
         # Attachments description might reveal some important information about the issue
@@ -141,10 +388,11 @@ def scrape_issue(url_prefix, _id, attributes):
                         attachments_content.append(' '.join(attach.b.text.split()))
 
     except Exception as err: # an unexpected exception happened. sometimes due to invalid authority access
-        print('[{0}] Exception happened! {1}\n'.format(_id, err))
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
         return None
     
-    print('[{0}] Completed!\n'.format(_id))
+    log('[{0}] Completed!\n'.format(_id))
     return Issue(str(_id), title, description, attachments_content, len(comments), len(commenters))
 
 def scrape_lucene(url_prefix, _id, attributes):
@@ -165,34 +413,71 @@ def scrape_lucene(url_prefix, _id, attributes):
     -------
     issue : an Issue instance
     """
+    url = url_prefix + str(_id)
+    log('Scraping url: %s' % url)
+
+    if early_abort_enabled():
+        from early_abort import fetch_unless_rejected
+        c = fetch_unless_rejected(url, _id, url_prefix, attributes)
+        return None if c is None else parse_page(get_parsers()[1], url_prefix, _id, c, attributes)
+
+    try:
+        result = fetch(url)
+        if result.status_code != 200:
+            log('Can\'t access URL!')
+            reject(_id, REJECT_HTTP_ERROR)
+            return None
+        c = result.content
+    except Exception as err:
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
+        return None
+    
+    return parse_page(get_parsers()[1], url_prefix, _id, c, attributes)
+
+def parse_lucene(url_prefix, _id, c, attributes):
+    """Parse a downloaded LUCENE issue page
     
+    Parameters
+    ----------
+    url_prefix : string
+        Issue tracking system URL prefix
+        
+    _id : string
+        Issue id
+        
+    c : bytes
+        Content of the issue page
+        
+    attributes : dictionary
+        Contains all HTML attributes needed to scrape data
+    
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected
+    """
     status_id = attributes['status-id']
     title_id = attributes['title-id']
     description_id = attributes['description-id']
     comment_regex = attributes['comment-regex']
-    
-    url = url_prefix + str(_id)
-    print('Scraping url: %s' % url)
 
     try:
-        result = requests.get(url)
-        if result.status_code != 200:
-            print('Can\'t access URL!')
-        
-        soup = BeautifulSoup(result.content, 'lxml')
+        soup = BeautifulSoup(c, 'lxml')
         status = soup.find(id=status_id).text
         status = ' '.join(status.split())
         if status != 'New Feature' and status != 'Improvement': # not a requirement
-            print('[{0}] Not requirement - {1}\n'.format(_id, status))
+            log('[{0}] Not requirement - {1}\n'.format(_id, status))
+            reject(_id, REJECT_NOT_ENHANCEMENT)
             return None
         
         # Only accept issue that contains a certain number of comments
         comments = soup.find_all(id=re.compile(comment_regex))
         if len(comments) < MINIMUM_COMMENTS:
-            print('[{0}] Issue has only {1} comments!\n'.format(_id, len(comments)))
+            log('[{0}] Issue has only {1} comments!\n'.format(_id, len(comments)))
+            reject(_id, REJECT_FEW_COMMENTS)
             return None
         else:
-            print('[{0}] Issue has {1} comments!\n'.format(_id, len(comments)))
+            log('[{0}] Issue has {1} comments!\n'.format(_id, len(comments)))
         # Count number of commenters participating in the discussion
         commenters = count_commenters(_id, comments, ('a', {'class':'user-hover user-avatar'}))
         if commenters is None:
@@ -201,19 +486,42 @@ def scrape_lucene(url_prefix, _id, attributes):
         title = ' '.join(soup.find(id=title_id).text.split())
         description = ' '.join(soup.find(id=description_id).text.split())
     except Exception as err:
-        print('[{0}] Exception happened! {1}\n'.format(_id, err))
+        log('[{0}] Exception happened! {1}\n'.format(_id, err))
+        reject(_id, REJECT_EXCEPTION)
         return None
     
-    print('[{0}] Completed!\n'.format(_id))
+    log('[{0}] Completed!\n'.format(_id))
     return Issue(str(_id), title, description, [], len(comments), len(commenters))
 
-def scrape(system, ids):
+def system_config(system):
+    """Look up how to scrape a system
+    
+    Args:
+        system (str): Firefox, Mylyn or Lucene (case insensitive)
+        
+    Return:
+        (url_prefix, parse, attributes): URL prefix of the tracker, the page parser
+            of the selected extraction backend and the HTML attributes it needs
+    """
+    system = system.upper()
+    parse_issue, parse_lucene = get_parsers()
+    if system == 'FIREFOX':
+        return FIREFOX_URL_PREFIX, parse_issue, firefox_attributes
+    elif system == 'MYLYN':
+        return MYLYN_URL_PREFIX, parse_issue, mylyn_attributes
+    elif system == 'LUCENE':
+        return LUCENE_URL_PREFIX, parse_lucene, lucene_attributes
+    raise RuntimeError('System is unsupported: ' + system)
+
+def scrape(system, ids, callback=None):
     """Scrape a list of issues given the id range.
     
     Args:
         system (str): The specified system. The prefix url will be determined given the system
                 Currently support Firefox and Mylyn.
         ids (list): id range
+        callback (function): called with (id, issue) as soon as each id is done,
+                issue is None when the id was rejected
         
     Return:
         issues: A list of scraped issues
@@ -231,6 +539,9 @@ def scrape(system, ids):
         else:
             raise RuntimeError('System is unsupported: ' + system)
         
+        if callback is not None:
+            callback(i, issue)
+        pop_rejection(i) # the reason is only kept for the callback, forget it once the id is done
         if issue is not None:
             issues.append(issue)
     return issues
@@ -243,36 +554,154 @@ def count_commenters(_id, comments, attributes):
         commenters[c] = commenters.get(c, 0) + 1
     
     if (len(commenters) < MINIMUM_COMMENTERS):
-        print('[{0}] Issue has only {1} comments!\n'.format(_id, len(commenters)))
+        log('[{0}] Issue has only {1} comments!\n'.format(_id, len(commenters)))
+        reject(_id, REJECT_FEW_COMMENTERS)
         return None
     else:
-        print('[{0}] Issue has {1} commenters!\n'.format(_id, len(commenters)))
+        log('[{0}] Issue has {1} commenters!\n'.format(_id, len(commenters)))
     
     return commenters
 
-def multiprocess_scrape(system, ids, num_processes):
-    """Use a pool of workers to speed up scraping process
+def chunks(ids, n):
+    """Split a list of ids into batches of at most n ids
     
     Arguments:
-        system: an open-source system (Firefox or Mylyn)
-        ids: a list of id ranges
-        num_processes: number of desired parallel processes
+        ids: iterable of issue ids
+        n: batch size
+        
+    Returns:
+        a generator of lists of ids
+    """
+    if n <= 0:
+        raise RuntimeError('Batch size should be positive - {0}\n'.format(n))
+    
+    batch = []
+    for _id in ids:
+        batch.append(_id)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def flatten_ids(ids):
+    """Accept either a flat list of ids or a list of id ranges
+    """
+    for item in ids:
+        if isinstance(item, (list, tuple, range)):
+            for _id in item:
+                yield _id
+        else:
+            yield item
+
+def scrape_chunk(task):
+    """Scrape one chunk of ids in a worker process
+    
+    Arguments:
+        task: tuple (system, ids, concurrency, backend, callback), see multiprocess_scrape
     
     Returns:
-        a list of scraped data storing in Issue objects
+        tuple (worker pid, number of ids, scraped issues, elapsed seconds, error message or None,
+            metrics recorded by the worker for the chunk)
     """
-    pool = mp.Pool(processes=num_processes)
-    results = [pool.apply_async(scrape, args=(system, range(id_range[0], id_range[1]))) for id_range in ids]
+    system, ids, concurrency, backend, callback = task
+    start = time.time()
+    try:
+        if backend == 'api':
+            from tracker_api import api_scrape
+            issues = api_scrape(system, ids, callback=callback)
+        elif concurrency is None:
+            issues = scrape(system, ids, callback=callback)
+        else:
+            from async_scraper import scrape_concurrently
+            issues = scrape_concurrently(system, ids, concurrency, callback=callback)
+        error = None
+    except Exception as err: # keep the pool going, the chunk is reported as failed
+        issues, error = [], '{0}: {1}'.format(type(err).__name__, err)
+    # the engines forget the reasons of the ids they are done with, but not of ids they never finished
+    _rejections.clear()
+    return os.getpid(), len(ids), issues, time.time() - start, error, metrics.take()
+
+def iter_multiprocess_scrape(system, ids, num_processes, concurrency=None, backend='html', callback=None, chunk_size=None):
+    """Scrape ids with a pool of workers, yielding issues as soon as their chunk is done
+    
+    Workers pull small chunks of ids from a shared queue, so a slow part of the
+    id range never leaves the other workers idle. Throughput of every worker and
+    rejection counts are printed at the end, the metrics recorded by the workers
+    are merged into the metrics registry of this process.
+    
+    Arguments:
+        see multiprocess_scrape
+    
+    Returns:
+        a generator of Issue, in completion order
+    """
+    if backend not in ['html', 'api']:
+        raise RuntimeError('Backend is unsupported: ' + backend)
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE if concurrency is None else max(CHUNK_SIZE, 4 * concurrency)
+    
+    tasks = ((system, chunk, concurrency, backend, callback) for chunk in chunks(flatten_ids(ids), chunk_size))
+    workers = {} # worker pid to [ids, issues, busy seconds]
+    rejected = {} # reason to ids rejected by the workers of this call
+    failed = 0
+    start = time.time()
+    
+    # workers start from an empty registry, not the copy of the parent's they are forked with
+    pool = mp.Pool(processes=num_processes, initializer=metrics.reset)
+    try:
+        for pid, n_ids, issues, elapsed, error, recorded in pool.imap_unordered(scrape_chunk, tasks):
+            metrics.merge(recorded)
+            for (name, labels), n in recorded[0].items():
+                if name == 'scraper_rejected_total':
+                    reason = dict(labels)['reason']
+                    rejected[reason] = rejected.get(reason, 0) + n
+            stats = workers.setdefault(pid, [0, 0, 0.0])
+            stats[0] += n_ids
+            stats[1] += len(issues)
+            stats[2] += elapsed
+            if error is not None:
+                failed += n_ids
+                print('A chunk of {0} ids failed in worker {1}! {2}'.format(n_ids, pid, error))
+            for issue in issues:
+                yield issue
+    except BaseException: # including the consumer closing the generator early
+        pool.terminate()
+        raise
     # ensure that all processes in the pool were terminated and resources were freed
-    pool.close() 
+    pool.close()
     pool.join()
     
-    l = []
-    [l.append(r.get()) for r in results]
+    total = sum(stats[0] for stats in workers.values())
+    elapsed = time.time() - start
+    print('Scraped {0} ids in {1:.1f}s ({2:.2f} ids/s), {3} ids in failed chunks'.format(
+        total, elapsed, total / elapsed if elapsed > 0 else 0, failed))
+    for pid, (n_ids, n_issues, busy) in sorted(workers.items()):
+        print('Worker {0}: {1} ids, {2} issues, {3:.1f}s busy, {4:.2f} ids/s'.format(
+            pid, n_ids, n_issues, busy, n_ids / busy if busy > 0 else 0))
+    if rejected:
+        print('Rejected: ' + ', '.join('{0} {1}'.format(reason, n) for reason, n in sorted(rejected.items())))
+
+def multiprocess_scrape(system, ids, num_processes, concurrency=None, backend='html', callback=None, chunk_size=None):
+    """Use a pool of workers to speed up scraping process
     
-    # flat out multiple list into one
-    issues = [item for sublist in l for item in sublist]
+    Arguments:
+        system: an open-source system (Firefox or Mylyn)
+        ids: a list of ids, or a list of id ranges
+        num_processes: number of desired parallel processes
+        concurrency: if given, every worker runs the asyncio engine with this
+            many in-flight requests instead of scraping one issue at a time
+        backend: 'html' to scrape issue pages, 'api' to fetch batches of issues
+            from the tracker's REST API
+        callback: picklable function called in the workers with (id, issue) as
+            soon as each id is done, e.g. a journal.Journal
+        chunk_size: number of ids handed to a worker at a time
     
+    Returns:
+        a list of scraped data storing in Issue objects, sorted by id
+    """
+    issues = list(iter_multiprocess_scrape(system, ids, num_processes, concurrency, backend, callback, chunk_size))
+    issues.sort(key=lambda issue: int(issue.get_id()))
     return issues
 
 def to_xml(f, system, issues):
@@ -314,32 +743,53 @@ def to_xml(f, system, issues):
     Args:
         f (file): the file to write
         system (str): scraped system
-        issues (issue): list of issues
+        issues (issue): list (or any iterable, e.g. a generator) of issues
         
     Return:
-        XML file
+        count: number of issues written to the XML file
         
     """
     
-    root = etree.Element("root")
-    etree.SubElement(root, "system").text = system
-    issues_e = etree.SubElement(root, "issues")
-    
-    for issue in issues:
-        issue_e = etree.SubElement(issues_e, "issue")
-        etree.SubElement(issue_e, "id").text = issue.get_id()
-        etree.SubElement(issue_e, "title").text = issue.get_title()
-        etree.SubElement(issue_e, "description").text = issue.get_description()
-        attachments_e = etree.SubElement(issue_e, "attachments")
-        # add attachment
-        for at in issue.get_attachments():
-            etree.SubElement(attachments_e, "attach").text = at
+    # Issues are written (and flushed) one by one as they come, so memory stays
+    # flat and the file can be read while a crawl is still running
+    count = 0
+    with etree.xmlfile(f, encoding='UTF-8') as xf:
+        xf.write_declaration()
+        with xf.element('root'):
+            system_e = etree.Element('system')
+            system_e.text = system
+            xf.write('\n  ', system_e, '\n  ')
+            with xf.element('issues'):
+                for issue in issues:
+                    xf.write('\n    ', issue_to_element(issue))
+                    xf.flush()
+                    count += 1
+                xf.write('\n  ')
+            xf.write('\n')
+    return count
+
+def issue_to_element(issue):
+    """Make the <issue> element of an issue, indented to its place in the output file
+    
+    Args:
+        issue (Issue): the issue to convert
         
-        etree.SubElement(issue_e, "comments").text = str(issue.get_comments())
-        etree.SubElement(issue_e, "commenters").text = str(issue.get_commenters())
-    # write to file
-    tree = etree.ElementTree(element=root)
-    tree.write(f, pretty_print=True, xml_declaration=True, encoding='utf-8')
+    Return:
+        issue_e: an lxml element
+    """
+    issue_e = etree.Element("issue")
+    etree.SubElement(issue_e, "id").text = issue.get_id()
+    etree.SubElement(issue_e, "title").text = issue.get_title()
+    etree.SubElement(issue_e, "description").text = issue.get_description()
+    attachments_e = etree.SubElement(issue_e, "attachments")
+    # add attachment
+    for at in issue.get_attachments():
+        etree.SubElement(attachments_e, "attach").text = at
+    
+    etree.SubElement(issue_e, "comments").text = str(issue.get_comments())
+    etree.SubElement(issue_e, "commenters").text = str(issue.get_commenters())
+    etree.indent(issue_e, space='  ', level=2)
+    return issue_e
  
 def split_range(l, n):
     """Split a list into n-equal ranges
@@ -359,15 +809,16 @@ def split_range(l, n):
         raise RuntimeError('The first item in list should be smaller one - {0} > {1}\n'.format(l[0], l[1]))
     
     range_list = []
-    range_diff = (l[1] - l[0])/n
+    range_diff = (l[1] - l[0])//n # integer bounds, range() rejects floats
     for i in range(n):
         range_list.append([l[0]+range_diff*i, l[0]+range_diff*(i+1)-1])
+    range_list[-1][1] = l[1] # the last range takes the remainder
         
     return range_list
 
 def main():
     # argurment parser
-    parser = argparse.ArgumentParser('python scraper.py <system> <from-id> <to-id> <num-processes> <--filepath>', description='Running scraper.')
+    parser = argparse.ArgumentParser('python scraper.py <system> <from-id> <to-id> <num-processes> <--filepath> <--concurrency> <--id-file> <--prefilter> <--cache-dir> <--cache-size> <--offline> <--journal> <--resume> <--chunk-size> <--extractor> <--early-abort> <--backend> <--quiet> <--metrics-json> <--metrics-textfile>', description='Running scraper.')
     # positional arguments
     parser.add_argument('system', type=str, help='An open-source system. Can be either Firefox, Mylyn or Lucene')
     parser.add_argument('from-id', type=int, help='Starting id.')
@@ -375,14 +826,51 @@ def main():
     parser.add_argument('num-processes', type=int, help='Number of processes running to scrape data.')
     # optional arguments
     parser.add_argument('--filepath', type=str, help='filepath to generated xml file.')
+    parser.add_argument('--concurrency', type=int, help='Use the asyncio engine with this many in-flight requests per process.')
+    parser.add_argument('--id-file', type=str, help='Only scrape the ids listed in this file (one id per line).')
+    parser.add_argument('--prefilter', action='store_true', help='Ask the tracker for enhancement ids in the range and only scrape those.')
+    parser.add_argument('--cache-dir', type=str, help='Cache responses in this directory and revalidate them on reruns.')
+    parser.add_argument('--cache-size', type=int, help='Size cap of the response cache in MB.')
+    parser.add_argument('--offline', action='store_true', help='Only use responses from the cache, never touch the network.')
+    parser.add_argument('--journal', type=str, help='Append every finished id to this checkpoint journal and build the xml file from it.')
+    parser.add_argument('--resume', action='store_true', help='Skip ids already recorded in the journal.')
+    parser.add_argument('--chunk-size', type=int, help='Number of ids handed to a worker at a time.')
+    parser.add_argument('--extractor', type=str, default='bs4', choices=['bs4', 'lxml'], help='HTML extraction backend.')
+    parser.add_argument('--early-abort', action='store_true', help='Stop downloading an issue page as soon as its status or importance rejects it.')
+    parser.add_argument('--backend', type=str, default='html', choices=['html', 'api'], help='Scrape issue pages (html) or fetch batches from the REST API (api).')
+    parser.add_argument('--quiet', action='store_true', help='Don\'t print a message for every issue, see --metrics-json.')
+    parser.add_argument('--metrics-json', type=str, help='Write counters and latency histograms of the run to this JSON file.')
+    parser.add_argument('--metrics-textfile', type=str, help='Write counters and latency histograms of the run as a Prometheus textfile.')
     
     _args = vars(parser.parse_args())
 #     _args = vars(parser.parse_args(['Mylyn', '500000', '500100', '10', '--filepath=issues.xml']))
     
-    ids = split_range([_args['from-id'], _args['to-id']], _args['num-processes'])
-    issues = multiprocess_scrape(_args['system'], ids, _args['num-processes'])
-
-    print('There are {0} requirements are valid!'.format(len(issues)))
+    use_extractor(_args['extractor'])
+    use_early_abort(_args['early_abort'])
+    use_verbose(not _args['quiet'])
+    if _args['cache_dir'] is not None:
+        cache_size = _args['cache_size'] * 1024 * 1024 if _args['cache_size'] else None
+        enable_cache(_args['cache_dir'], cache_size, _args['offline'])
+    elif _args['offline']:
+        parser.error('--offline requires --cache-dir')
+    
+    if _args['id_file'] is not None or _args['prefilter']:
+        from candidates import discover_candidates
+        candidates = discover_candidates(_args['system'], _args['from-id'], _args['to-id'], _args['id_file'])
+        ids = candidates
+    else:
+        ids = range(_args['from-id'], _args['to-id'] + 1)
+    journal = None
+    if _args['journal'] is not None:
+        from journal import Journal, completed_ids, journal_to_issues
+        journal = Journal(_args['journal'])
+        if _args['resume']:
+            done = completed_ids(_args['journal'])
+            print('Resuming: {0} ids are already in the journal'.format(len(done)))
+            ids = [i for i in ids if str(i) not in done]
+    elif _args['resume']:
+        parser.error('--resume requires --journal')
+    
     # write scraped issues to xml file
     filepath = _args.get('filepath', -1)
     if filepath == -1 or filepath is None: # user didn't input filepath, use current date time to make unique file name
@@ -392,7 +880,18 @@ def main():
         filepath = os.path.join('data', filepath)
         
     print(filepath)
-    to_xml(filepath, _args['system'], issues)
+    if journal is not None:
+        multiprocess_scrape(_args['system'], ids, _args['num-processes'], _args['concurrency'], _args['backend'], journal, _args['chunk_size'])
+        count = to_xml(filepath, _args['system'], journal_to_issues(_args['journal']))
+    else: # stream issues to the file as soon as workers finish them
+        issues = iter_multiprocess_scrape(_args['system'], ids, _args['num-processes'], _args['concurrency'], _args['backend'], None, _args['chunk_size'])
+        count = to_xml(filepath, _args['system'], issues)
+
+    print('There are {0} requirements are valid!'.format(count))
+    if _args['metrics_json'] is not None:
+        metrics.write_json(_args['metrics_json'])
+    if _args['metrics_textfile'] is not None:
+        metrics.write_textfile(_args['metrics_textfile'])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,209 @@
+'''
+Parameter sweeps of the filtering/topic modeling/classification pipeline.
+
+The corpus is loaded and tokenized once, then every point of a parameter grid
+(filter thresholds, topic engine, topics, top words, word list experiment) is
+run by a pool of worker processes sharing it. Points that only differ by word
+list experiment share their topics, classification being the cheap part.
+The result is a table of category counts per configuration, printed and
+optionally written as CSV.
+
+    python sweep.py data/mylyn-enhancement-issues.xml --commenter-std-dev 0 1 3 \
+        --engine lda tfidf --topics 1 2 --top-words 2 5 --experiment default exp2 --jobs 4
+'''
+
+import argparse
+import contextlib
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+
+from corpus_store import load_store
+from issue_table import IssueTable
+from result_cache import ResultCache
+import topic_modeling
+
+DEFAULT_EXPERIMENT = 'default' # grid value for topic_modeling.WORD_LIST
+
+_sweep_corpus = None # (table, corpus, matrix) shared by the workers, see share_corpus()
+_sweep_cache = None
+
+def share_corpus(corpus, cache_dir=None):
+    """Make the loaded corpus available to the sweep points run by this process
+    """
+    global _sweep_corpus, _sweep_cache
+    _sweep_corpus = corpus
+    _sweep_cache = ResultCache(cache_dir) if cache_dir is not None else None
+
+def load_corpus(path):
+    """Load the issues of an XML file or a corpus store directory and tokenize them once
+
+    Returns
+    -------
+    (table, corpus, matrix) : IssueTable, corpus of every issue and its vocabulary.CorpusMatrix
+    """
+    if os.path.isdir(path):
+        table = IssueTable.from_store(load_store(path))
+    else:
+        table = IssueTable.from_issues(topic_modeling.xml_to_issues(path))
+    corpus = topic_modeling.issues_to_corpus(table)
+    return table, corpus, topic_modeling.build_corpus_matrix(corpus)
+
+def make_grid(filters, engines, n_topics, n_top_words, experiments):
+    """Sweep points, one per topic configuration with every experiment
+
+    Parameters
+    ----------
+    filters : list of (comment_std_dev, commenter_std_dev)
+
+    engines, n_topics, n_top_words, experiments : list
+        Values of each parameter
+
+    Returns
+    -------
+    points : list of dictionary
+    """
+    return [{'comment_std_dev': c, 'commenter_std_dev': cc, 'engine': engine,
+             'n_topics': topics, 'n_top_words': words, 'experiments': list(experiments)}
+            for (c, cc), engine, topics, words in itertools.product(filters, engines, n_topics, n_top_words)]
+
+def run_point(point):
+    """Filter, extract topics and classify for one sweep point
+
+    Returns
+    -------
+    rows : list of dictionary
+        One result row per experiment of the point
+    """
+    table, corpus, matrix = _sweep_corpus
+    start = time.time()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        filtered = table.filter(point['comment_std_dev'], point['commenter_std_dev'], point.get('std_units', False))
+        point_corpus = dict((issue.get_id(), corpus[issue.get_id()]) for issue in filtered)
+        if _sweep_cache is not None and point['engine'] in ('lda', 'nmf'):
+            topics = topic_modeling.topic_modeling_cached(point_corpus, point['n_topics'], point['n_top_words'],
+                                                          _sweep_cache, point['engine'], matrix=matrix)
+        else:
+            engine = topic_modeling.TOPIC_ENGINES[point['engine']]
+            topics = engine(point_corpus, point['n_topics'], point['n_top_words'], matrix=matrix)
+        topics_time = time.time() - start
+
+        rows = []
+        for experiment in point['experiments']:
+            categories = topic_modeling.assign_nfr_category(
+                topics, None if experiment == DEFAULT_EXPERIMENT else experiment, _sweep_cache)
+            counts = {}
+            for category in categories.values():
+                counts[str(category)] = counts.get(str(category), 0) + 1
+            row = dict((k, v) for k, v in point.items() if k != 'experiments')
+            row.update({'experiment': experiment, 'issues': len(point_corpus), 'topics': len(topics),
+                        'topics_time': round(topics_time, 3), 'categories': counts})
+            rows.append(row)
+    return rows
+
+def sweep(corpus, points, n_jobs=1, cache_dir=None):
+    """Run every point of a grid on a loaded corpus
+
+    Parameters
+    ----------
+    corpus : tuple
+        See load_corpus
+
+    points : list of dictionary
+        See make_grid
+
+    n_jobs : integer
+        Number of worker processes, -1 for one per CPU
+
+    cache_dir : string
+        Directory of a result_cache.ResultCache shared by the points
+
+    Returns
+    -------
+    rows : list of dictionary
+        Result rows in grid order
+    """
+    if n_jobs == -1:
+        n_jobs = mp.cpu_count()
+    if n_jobs > 1 and len(points) > 1:
+        # Workers are forked after the corpus is loaded, they share its memory
+        pool = mp.Pool(processes=n_jobs, initializer=share_corpus, initargs=(corpus, cache_dir))
+        try:
+            results = pool.map(run_point, points, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        share_corpus(corpus, cache_dir)
+        results = [run_point(point) for point in points]
+    return [row for rows in results for row in rows]
+
+def category_columns(rows):
+    columns = sorted(set(category for row in rows for category in row['categories']))
+    if 'None' in columns: # non-nfr issues last
+        columns.remove('None')
+        columns.append('None')
+    return columns
+
+def print_table(rows):
+    """Print a compact table of the category counts of each configuration
+    """
+    columns = category_columns(rows)
+    header = '{0:>6} {1:>6} {2:>6} {3:>3} {4:>3} {5:>10} {6:>6} {7:>6} '.format(
+        'cmts', 'cmtrs', 'engine', 'k', 'w', 'experiment', 'issues', 'topics')
+    print(header + ' '.join('{0:>7.7}'.format(c) for c in columns))
+    for row in rows:
+        line = '{0:>6} {1:>6} {2:>6} {3:>3} {4:>3} {5:>10.10} {6:>6} {7:>6} '.format(
+            row['comment_std_dev'], row['commenter_std_dev'], row['engine'], row['n_topics'],
+            row['n_top_words'], row['experiment'], row['issues'], row['topics'])
+        print(line + ' '.join('{0:>7}'.format(row['categories'].get(c, 0)) for c in columns))
+
+def write_csv(rows, f):
+    """Write the result rows as CSV, one column per category
+    """
+    columns = category_columns(rows)
+    fields = ['comment_std_dev', 'commenter_std_dev', 'engine', 'n_topics', 'n_top_words',
+              'experiment', 'issues', 'topics', 'topics_time']
+    with open(f, 'w') as out:
+        writer = csv.writer(out)
+        writer.writerow(fields + columns)
+        for row in rows:
+            writer.writerow([row[field] for field in fields] + [row['categories'].get(c, 0) for c in columns])
+
+def main():
+    parser = argparse.ArgumentParser('python sweep.py <corpus>', description='Run the topic modeling pipeline over a parameter grid.')
+    parser.add_argument('corpus', type=str, help='XML file written by scraper.py or corpus store directory')
+    parser.add_argument('--comment-std-dev', type=float, nargs='+', default=[0], help='Comment thresholds above average')
+    parser.add_argument('--commenter-std-dev', type=float, nargs='+', default=[3], help='Commenter thresholds above average')
+    parser.add_argument('--engine', type=str, nargs='+', default=['lda'], choices=sorted(topic_modeling.TOPIC_ENGINES), help='Topic engines')
+    parser.add_argument('--topics', type=int, nargs='+', default=[1], help='Numbers of topics per issue')
+    parser.add_argument('--top-words', type=int, nargs='+', default=[2], help='Numbers of words per topic')
+    parser.add_argument('--experiment', type=str, nargs='+', default=[DEFAULT_EXPERIMENT],
+                        help='Word list experiments, "{0}" for the lists of topic_modeling.WORD_LIST'.format(DEFAULT_EXPERIMENT))
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes, -1 for one per CPU')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Result cache shared by the runs')
+    parser.add_argument('--output', type=str, default=None, help='CSV file to write the results to')
+    _args = vars(parser.parse_args())
+
+    for experiment in _args['experiment']:
+        if experiment != DEFAULT_EXPERIMENT:
+            topic_modeling.word_list_registry().word_list(experiment) # fail before the sweep on unknown experiments
+
+    start = time.time()
+    corpus = load_corpus(_args['corpus'])
+    print('Loaded {0} issues in {1:.1f}s'.format(len(corpus[0]), time.time() - start), file=sys.stderr)
+
+    filters = list(itertools.product(_args['comment_std_dev'], _args['commenter_std_dev']))
+    points = make_grid(filters, _args['engine'], _args['topics'], _args['top_words'], _args['experiment'])
+    rows = sweep(corpus, points, _args['jobs'], _args['cache_dir'])
+    print('Ran {0} configurations in {1:.1f}s'.format(len(rows), time.time() - start), file=sys.stderr)
+
+    print_table(rows)
+    if _args['output'] is not None:
+        write_csv(rows, _args['output'])
+
+if __name__ == '__main__':
+    main()
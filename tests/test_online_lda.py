@@ -0,0 +1,27 @@
+import os
+
+from online_lda import OnlineLDA
+
+CORPUS = {
+    '1': ['editor startup is slow', 'improve startup performance of the editor'],
+    '2': ['proxy configuration for synchronization', 'synchronization fails behind a proxy'],
+    '3': ['wizard usability', 'the wizard layout is confusing'],
+}
+
+def test_first_batch_of_stop_words_leaves_the_model_uncreated(tmp_path):
+    model = OnlineLDA(str(tmp_path), n_topics=2)
+    assert model.update({'1': ['the and of', 'it is'], '2': []}) == {}
+    assert model.lda is None
+    assert model.seen == set()
+
+    new = model.update(CORPUS)
+    assert set(new) == set(CORPUS)
+    assert model.lda is not None
+    model.save()
+    assert OnlineLDA(str(tmp_path)).seen == set(CORPUS)
+
+def test_empty_first_batch(tmp_path):
+    model = OnlineLDA(str(tmp_path), n_topics=2)
+    assert model.update({}) == {}
+    assert model.lda is None
+    assert not os.path.exists(os.path.join(str(tmp_path), 'meta.json'))
@@ -0,0 +1,283 @@
+'''
+Retries with backoff and adaptive per-host concurrency and rate for the scrapers.
+
+Transient failures (429, 5xx, connection errors and timeouts) are retried with
+jittered exponential backoff, waiting at least what a Retry-After header asks
+for. An id is only rejected once its retries are exhausted.
+
+The number of in-flight requests to each tracker host is set by an AIMD
+controller, like TCP congestion control: it starts low, grows by one request
+per completed request while latency stays close to the fastest seen (doubling
+every round trip, the slow start) and by one request per round trip after the
+first overload signal. A 429/503/504, a timeout or latency inflated past
+LATENCY_TOLERANCE times the baseline halves it, at most once per round trip,
+and Retry-After pauses the whole host. Hosts rate limiting by requests per
+second answer 429 whatever the concurrency, so a 429 also paces the requests
+to the host, at half their rate, growing again by RATE_INCREASE every second.
+The limit of a host is kept for the life of the process, across the chunks it
+scrapes.
+'''
+
+import asyncio
+import email.utils
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504) # transient HTTP failures, retried
+OVERLOAD_STATUSES = ('429', '503', '504') # failures telling the host is overloaded, the others don't lower its limit
+MAX_RETRIES = 4 # retries of a request before giving up on it
+BACKOFF_BASE = 0.5 # seconds, doubled on every retry
+BACKOFF_MAX = 60. # seconds, cap of a backoff delay and of Retry-After
+INITIAL_LIMIT = 4 # in-flight requests to a host before any feedback
+LATENCY_TOLERANCE = 2. # latency past this multiple of the baseline counts as overload
+DECREASE_FACTOR = 0.5 # multiplicative decrease of the limit on overload
+LATENCY_SMOOTHING = 0.2 # weight of the latest request in the smoothed latency
+MIN_RATE = 0.1 # requests per second, floor of the request rate of a host
+RATE_INCREASE = 1. # requests per second added to the rate of a host every second without 429
+BASELINE_DRIFT = 1.01 # growth of the baseline per request, so one lucky fast request doesn't hold it down forever
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+class TransientError(Exception):
+    """A request failed in a way worth retrying
+
+    Parameters
+    ----------
+    reason : string
+        HTTP status or exception name, the label of the retry counter
+
+    retry_after : float
+        Seconds the server asked to wait, None when it didn't
+    """
+    def __init__(self, reason, retry_after=None):
+        Exception.__init__(self, reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def overloaded(self):
+        # timeouts and connection errors included, servers drop what they can't take
+        return not self.reason.isdigit() or self.reason in OVERLOAD_STATUSES
+
+    def notify(self, limit):
+        """Report the failure to the AIMDLimit of its host
+        """
+        if self.overloaded():
+            limit.overload(self.retry_after, self.reason == '429')
+        elif self.retry_after is not None:
+            limit.overload_pause(self.retry_after)
+
+def retry_after(value):
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date
+
+    Returns
+    -------
+    seconds : float, None when the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = date.timestamp() - time.time()
+    return min(max(seconds, 0.), BACKOFF_MAX)
+
+def backoff_delay(attempt, wait=None):
+    """Seconds to wait before retry number attempt (from 0), with full jitter
+
+    Parameters
+    ----------
+    attempt : integer
+        Number of retries already made
+
+    wait : float
+        Retry-After of the failed response, the delay is at least that
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if wait is not None:
+        delay = max(delay, wait + random.uniform(0, BACKOFF_BASE)) # spread the requests released at the same time
+    return delay
+
+def host(url):
+    return urlsplit(url).netloc
+
+def retry_request(send, url, max_retries=MAX_RETRIES):
+    """Send a blocking request, retrying it on transient failures
+
+    Parameters
+    ----------
+    send : function
+        Sends the request, returns a requests.Response (or an http_cache.CachedResponse)
+
+    url : string
+        URL of the request, for the host pause and messages
+
+    Returns
+    -------
+    response : the first response that isn't a transient failure, or the last
+        one once retries are exhausted. Responses served by the cache are
+        returned as they are. The exception of the last attempt is raised when
+        it failed with one
+    """
+    limit = host_limit(host(url))
+    for attempt in range(max_retries + 1):
+        time.sleep(limit.reserve())
+        start = time.perf_counter()
+        try:
+            response = send()
+        except TRANSIENT_ERRORS as err:
+            if attempt == max_retries:
+                raise
+            error = TransientError(type(err).__name__)
+        else:
+            if getattr(response, 'from_cache', False): # offline cache misses are 504s, nothing to wait for
+                return response
+            if response.status_code not in RETRY_STATUSES:
+                limit.success(time.perf_counter() - start)
+                return response
+            if attempt == max_retries:
+                return response
+            error = TransientError(str(response.status_code), retry_after(response.headers.get('Retry-After')))
+            if hasattr(response, 'close'):
+                response.close()
+        error.notify(limit)
+        metrics.inc('scraper_retries_total', reason=error.reason)
+        time.sleep(backoff_delay(attempt, error.retry_after))
+
+class AIMDLimit(object):
+    """Concurrency limit and request rate of a host, adjusted from the outcome of its requests
+
+    Parameters
+    ----------
+    maximum : integer
+        Ceiling of the limit, e.g. the concurrency of the async engine
+
+    initial : integer
+        Limit before any feedback
+    """
+    def __init__(self, maximum, initial=INITIAL_LIMIT):
+        self.maximum = maximum
+        self.limit = float(min(initial, maximum))
+        self.slow_start = True
+        self.baseline = None # fastest recent latency
+        self.smoothed = None
+        self.rate = None # requests per second, unpaced until the host answers 429
+        self.next_start = 0.
+        self.paused_until = 0.
+        self.last_decrease = 0.
+
+    def current(self):
+        return max(1, int(self.limit))
+
+    def round_trip(self):
+        return self.smoothed if self.smoothed is not None else 1.
+
+    def success(self, latency):
+        """A request completed in latency seconds
+        """
+        self.baseline = latency if self.baseline is None else min(self.baseline * BASELINE_DRIFT, latency)
+        self.smoothed = latency if self.smoothed is None else \
+            (1 - LATENCY_SMOOTHING) * self.smoothed + LATENCY_SMOOTHING * latency
+        if self.rate is not None:
+            self.rate += RATE_INCREASE / self.rate # RATE_INCREASE more requests per second every second
+        if self.smoothed > LATENCY_TOLERANCE * self.baseline and self.baseline > 0:
+            self.decrease()
+        elif self.slow_start:
+            self.limit = min(self.maximum, self.limit + 1)
+        else:
+            self.limit = min(self.maximum, self.limit + 1. / self.limit)
+
+    def overload(self, wait=None, throttled=False):
+        """A request failed with a 429/503/504 or timed out
+
+        Parameters
+        ----------
+        wait : float
+            Retry-After of the response, pauses the host
+
+        throttled : boolean
+            The host answered 429, its request rate is halved too
+        """
+        self.overload_pause(wait)
+        self.decrease(throttled)
+
+    def overload_pause(self, wait):
+        if wait is not None:
+            self.paused_until = max(self.paused_until, time.time() + wait)
+
+    def decrease(self, throttled=False):
+        # the requests in flight when the host got overloaded report it too, count it once
+        now = time.time()
+        if now - self.last_decrease < self.round_trip():
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.limit = max(1., self.limit * DECREASE_FACTOR)
+        if throttled:
+            rate = self.rate if self.rate is not None else self.limit / DECREASE_FACTOR / self.round_trip()
+            self.rate = max(MIN_RATE, rate * DECREASE_FACTOR)
+        metrics.inc('scraper_limit_decreases_total')
+
+    def reserve(self):
+        """Book the start time of a request
+
+        Returns
+        -------
+        delay : seconds to wait before sending it, for the Retry-After pause
+            and the request rate of the host
+        """
+        now = time.time()
+        start = max(now, self.next_start, self.paused_until)
+        self.next_start = start + (1. / self.rate if self.rate is not None else 0.)
+        return start - now
+
+_limits = {} # host to AIMDLimit in the current process, see host_limit()
+
+def host_limit(name, maximum=None):
+    """Concurrency limit of a host in the current process, created on first use
+
+    Parameters
+    ----------
+    maximum : integer
+        Ceiling of the limit, updated when given
+    """
+    limit = _limits.get(name)
+    if limit is None:
+        limit = _limits[name] = AIMDLimit(maximum or INITIAL_LIMIT)
+    elif maximum is not None:
+        limit.maximum = maximum
+        limit.limit = min(limit.limit, maximum)
+    return limit
+
+class AsyncGate(object):
+    """Admission of the requests of an asyncio engine to a host, at most its current limit in flight
+
+    Bound to the event loop of the scrape, while the AIMDLimit it follows
+    outlives it.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.released = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.released:
+            while self.in_flight >= self.limit.current():
+                await self.released.wait()
+            self.in_flight += 1
+        delay = self.limit.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self):
+        async with self.released:
+            self.in_flight -= 1
+            self.released.notify_all()
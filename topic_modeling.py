@@ -2,18 +2,39 @@
 # Some methods are inspired from scikit-learn tutorials
 # topic_modeling.py
 
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer, TfidfTransformer
 from sklearn.decomposition import NMF, LatentDirichletAllocation
 import numpy as np
+import sklearn
 
 from lxml import etree
 
 import os
+import time
+import multiprocessing as mp
+from functools import partial
 
 from issue import Issue
+from issue_table import IssueTable
+from vocabulary import build_corpus_matrix
+from nfr_index import compile_category_index
+from wordlist_registry import WordListRegistry
+from lexicon import Lexicon
+from online_lda import OnlineLDA, DEFAULT_TOPICS
+from result_cache import result_key, word_list_version
+import metrics
 from scraper import multiprocess_scrape, split_range, to_xml, scrape
 
 n_features = 1000
+max_df = 0.95 # document frequency bounds of the per-issue vectorizers
+lda_min_df = 0.5
+nmf_min_df = 0.2
+
+min_model_tokens = 100 # the tf-idf engine falls back to a topic model for issues with at least that many terms
+_shared_matrix = None # vocabulary.CorpusMatrix of the running model_issues, see share_matrix()
+_category_indexes = {} # compiled nfr_index.CategoryIndex of each word list, see category_index()
+_registry = None # wordlist_registry.WordListRegistry, see word_list_registry()
+_lexicons = {} # compiled lexicon.Lexicon of each word list, see lexicon()
 # n_components = 10
 # n_top_words = 10
 
@@ -45,40 +66,99 @@ def unique_list(l):
             ulist.append(item)
     return ulist
 
-def filter_issues(issues, comment_std_dev=0, commenter_std_dev=0):
-    """Filter issues with number of comments and commenters higher than average
+def issue_averages(issues):
+    """Compute average number of comments and commenters of issues
     
     Parameters
     ----------
-    issues : list of Issue
-    
-    std_dev : standard deviation
+    issues : iterable of Issue
     
     Returns
     -------
-    filtered_issues
+    (avg_comment, avg_commenter) : tuple of float
     """
-    
     total_comments = 0;
     total_commenters = 0;
+    count = 0
     for issue in issues:
         total_comments += issue.get_comments()
         total_commenters += issue.get_commenters()
+        count += 1
+    
+    return total_comments/count, total_commenters/count
+
+def filter_issues(issues, comment_std_dev=0, commenter_std_dev=0, std_units=False, predicate=None):
+    """Filter issues with number of comments and commenters higher than average
+    
+    Parameters
+    ----------
+    issues : list of Issue, or an IssueTable
+    
+    comment_std_dev, commenter_std_dev : number
+        Offsets added to the average number of comments and commenters
+    
+    std_units : boolean
+        Count the offsets in standard deviations (average + k * std) instead of
+        in comments/commenters (average + k)
+    
+    predicate : function
+        Extra vectorized condition, takes the IssueTable and returns a boolean
+        array, e.g. lambda t: t.comments < 100
+    
+    Returns
+    -------
+    filtered_issues : list of Issue (an IssueTable if issues is an IssueTable)
+    """
+    table = issues if isinstance(issues, IssueTable) else IssueTable.from_issues(issues)
+    if len(table) > 0:
+        stats = table.stats()
+        print('Average comments: {0}'.format(stats['comments_mean']))
+        print('Average commenters: {0}'.format(stats['commenters_mean']))
+    
+    with metrics.timer('pipeline_stage_seconds', stage='filter'):
+        filtered = table.filter(comment_std_dev, commenter_std_dev, std_units, predicate)
+    metrics.inc('pipeline_issues_total', len(table), stage='filter')
+    
+    print('Get {0} issues out of {1} issues'.format(len(filtered), len(table)))
+    return filtered if isinstance(issues, IssueTable) else filtered.issues()
+
+def filter_xml_issues(f, comment_std_dev=0, commenter_std_dev=0):
+    """Filter issues of an xml file like filter_issues, without loading the file in memory
+    
+    The file is read twice: once to compute the averages and once to yield the
+    issues passing the thresholds.
+    
+    Parameters
+    ----------
+    f : string
+        XML file path
     
-    avg_comment = total_comments/len(issues)
-    avg_commenter = total_commenters/len(issues)
+    Returns
+    -------
+    filtered_issues : generator of Issue
+    """
+    avg_comment, avg_commenter = issue_averages(iter_xml_issues(f))
     
     print('Average comments: {0}'.format(avg_comment))
     print('Average commenters: {0}'.format(avg_commenter))
     
-    filtered_issues = []
-    
-    for issue in issues:
+    for issue in iter_xml_issues(f):
         if issue.get_comments() >= (avg_comment+comment_std_dev) and issue.get_commenters() >= (avg_commenter + commenter_std_dev):
-            filtered_issues.append(issue)
+            yield issue
+
+def issue_content(issue):
+    """Extract the non-empty texts of an issue: [title, description, attachments]
+    
+    Parameters
+    ----------
+    issue : Issue
     
-    print('Get {0} issues out of {1} issues'.format(len(filtered_issues), len(issues)))
-    return filtered_issues
+    Returns
+    -------
+    content : list of string
+    """
+    attachments = ' '.join(item for item in issue.get_attachments())
+    return [item for item in [issue.get_title(), issue.get_description(), attachments] if item != '' and item != None]
 
 def issues_to_corpus(issues):
     """Convert from list of issues to a corpus.
@@ -99,13 +179,40 @@ def issues_to_corpus(issues):
     """    
     corpus = {}
     for issue in issues:
-        _id = issue.get_id()
-        attachments = ' '.join(item for item in issue.get_attachments())
-        content = [item for item in [issue.get_title(), issue.get_description(), attachments] if item != '' and item != None]
-        corpus[_id] = content
+        corpus[issue.get_id()] = issue_content(issue)
     
     return corpus
 
+def iter_xml_issues(f):
+    """Read issues from an xml file one at a time
+    
+    Only the <issue> element being read is kept in memory, processed elements
+    are cleared so memory stays constant whatever the file size.
+    
+    Parameters
+    ----------
+    f : string 
+        XML file path
+    
+    Returns
+    -------
+    issues : generator of Issue
+    """
+    for _, issue_e in etree.iterparse(f, events=('end',), tag='issue', remove_comments=True):
+        attachments = []
+        _id = issue_e.findtext('id')
+        title = issue_e.findtext('title')
+        description = issue_e.findtext('description')
+        for item in issue_e.findall('.//attachment'):
+            attachments.append(item.text)            
+        comments = issue_e.findtext('comments')
+        commenters = issue_e.findtext('commenters')
+        # free the processed element and the already processed siblings
+        issue_e.clear()
+        while issue_e.getprevious() is not None:
+            del issue_e.getparent()[0]
+        yield Issue(_id, title or None, description or None, attachments, int(comments), int(commenters))
+
 def xml_to_issues(f):
     """Extract issue data from xml file to make an issue list
     
@@ -119,24 +226,7 @@ def xml_to_issues(f):
     issues : list
         issues list
     """
-    parser = etree.XMLParser(ns_clean=True, remove_comments=True)
-    tree = etree.parse(f, parser)
-    root = tree.getroot()
-    
-    issues = []
-    issues_e = root.find('issues') # find all issues
-    for issue_e in issues_e:
-        attachments = []
-        _id = issue_e.find('id').text
-        title = issue_e.find('title').text
-        description = issue_e.find('description').text
-        for item in issue_e.findall('.//attachment'):
-            attachments.append(item.text)            
-        comments = issue_e.find('comments').text
-        commenters = issue_e.find('commenters').text
-        issues.append(Issue(_id, title, description, attachments, int(comments), int(commenters)))
-        
-    return issues
+    return list(iter_xml_issues(f))
 
 def xml_to_corpus(f):
     """Extract issue data from xml file to make a corpus
@@ -153,23 +243,28 @@ def xml_to_corpus(f):
         e.g, corpus = {12345:['issue title', 'issue descriptions', 
         ['attachment description 1', attachments description 2']]}
     """
-    parser = etree.XMLParser(ns_clean=True, remove_comments=True)
-    tree = etree.parse(f, parser)
-    root = tree.getroot()
-    
-    corpus = {}
-    issues_e = root.find('issues') # find all issues
-    for issue_e in issues_e:
-        _id = issue_e.find('id').text
-        title = issue_e.find('title').text
-        description = issue_e.find('description').text
-        attachments = ' '.join(item.text for item in issue_e.findall('.//attachment'))            
-        # Combine all non-empty items to the content list
-        content = [item for item in [title, description, attachments] if item != '' and item != None]
-        corpus[_id] = content
+    return issues_to_corpus(iter_xml_issues(f))
+        
+def format_top_words(model, _id, feature_names, n_top_words):
+    """Format topic words from topic modeling models, the text printed by print_top_words
     
-    return corpus
+    Parameters
+    ----------
+    see print_top_words
         
+    Returns
+    -------
+    text : string
+    """
+    lines = ['Topic words for issue %s' % _id]
+    for topic_idx, topic in enumerate(model.components_):
+        message = "Topic #%d: " % (topic_idx+1)
+        message += " ".join([feature_names[i]
+                             for i in topic.argsort()[:-n_top_words - 1:-1]])
+        lines.append(message)
+    lines.append('')
+    return '\n'.join(lines)
+
 def print_top_words(model, _id, feature_names, n_top_words):
     """Print topic words from topic modeling models
     
@@ -188,13 +283,7 @@ def print_top_words(model, _id, feature_names, n_top_words):
     -------
     None
     """
-    print('Topic words for issue %s' % _id)
-    for topic_idx, topic in enumerate(model.components_):
-        message = "Topic #%d: " % (topic_idx+1)
-        message += " ".join([feature_names[i]
-                             for i in topic.argsort()[:-n_top_words - 1:-1]])
-        print(message)
-    print('')
+    print(format_top_words(model, _id, feature_names, n_top_words))
 
 def make_topic_words(model, feature_names, n_top_words):
     """Extract topic words from topic modeling models
@@ -221,9 +310,179 @@ def make_topic_words(model, feature_names, n_top_words):
         u_list = unique_list(tw)
         topic_words.extend(u_list)
     return topic_words
+
+def feature_names(vectorizer):
+    """Vocabulary of a fitted vectorizer (get_feature_names was removed in scikit-learn 1.2)
+    """
+    if hasattr(vectorizer, 'get_feature_names_out'):
+        return list(vectorizer.get_feature_names_out())
+    return vectorizer.get_feature_names()
+
+def make_nmf(n_topics):
+    """NMF model used for topic modeling, for scikit-learn before and after 1.2 (alpha was split into alpha_W and alpha_H)
+    """
+    params = dict(n_components=n_topics, random_state=1, beta_loss='kullback-leibler', solver='mu',
+                  max_iter=1000, l1_ratio=.5)
+    if 'alpha_W' in NMF().get_params():
+        return NMF(alpha_W=.1, alpha_H='same', **params)
+    return NMF(alpha=.1, **params)
+
+def few_words_error(k, v):
+    return 'Error in id %s. There are only a few words (%d words) in content so couldn\'t extract topics!' % (k, sum(len(item.split()) for item in v))
+
+def lda_issue_topics(item, n_topics, n_top_words):
+    """Fit an LDA model on the content of one issue
+    
+    Parameters
+    ----------
+    item : tuple
+        (issue id, list of texts) entry of a corpus
+    
+    n_topics, n_top_words : integer
+        see topic_modeling_lda
+    
+    Returns
+    -------
+    (id, topic words, output) : topic words are None if topics couldn't be
+        extracted, output is the text to print for the issue
+    """
+    k, v = item
+    try:
+        if _shared_matrix is not None and k in _shared_matrix: # already tokenized
+            tf, tf_feature_names = _shared_matrix.issue_counts(k, lda_min_df, max_df, n_features)
+        else:
+            tf_vectorizer = CountVectorizer(max_df=max_df, min_df=lda_min_df,
+                                            max_features=n_features,
+                                            stop_words='english')
+            tf = tf_vectorizer.fit_transform(v)
+            tf_feature_names = feature_names(tf_vectorizer)
+        # Fit the LDA model
+        lda = LatentDirichletAllocation(n_components=n_topics, max_iter=10,
+                                        learning_method='online',
+                                        learning_offset=50.,
+                                        random_state=0).fit(tf)
+        return k, make_topic_words(lda, tf_feature_names, n_top_words), format_top_words(lda, k, tf_feature_names, n_top_words)
+    except ValueError:
+        return k, None, few_words_error(k, v)
+
+def nmf_issue_topics(item, n_topics, n_top_words):
+    """Fit an NMF model on the content of one issue
+    
+    Parameters
+    ----------
+    see lda_issue_topics
+    
+    Returns
+    -------
+    see lda_issue_topics
+    """
+    k, v = item
+    try:
+        # Use tf-idf features for Non-negative Matrix Factorization (NMF)
+        if _shared_matrix is not None and k in _shared_matrix: # already tokenized
+            tf, tfidf_feature_names = _shared_matrix.issue_counts(k, nmf_min_df, max_df, n_features, np.float64) # TfidfVectorizer counts in floats
+            tfidf = TfidfTransformer().fit_transform(tf)
+        else:
+            tfidf_vectorizer = TfidfVectorizer(max_df=max_df, min_df=nmf_min_df,
+                                               max_features=n_features,
+                                               stop_words='english')
+            tfidf = tfidf_vectorizer.fit_transform(v)
+            tfidf_feature_names = feature_names(tfidf_vectorizer)
+        # Fit the NMF model
+        nmf = make_nmf(n_topics).fit(tfidf)
         
+        output = "\nTopics in NMF model (generalized Kullback-Leibler divergence):\n"
+        output += format_top_words(nmf, k, tfidf_feature_names, n_top_words)
+        return k, make_topic_words(nmf, tfidf_feature_names, n_top_words), output
+    except ValueError:
+        return k, None, few_words_error(k, v)
+
+def timed_fit(fit, item):
+    """Run a per-issue fitting function, adding the seconds it took to its result
+    """
+    start = time.perf_counter()
+    return fit(item) + (time.perf_counter() - start,)
+
+def share_matrix(matrix):
+    """Make a tokenized corpus available to the per-issue fitting functions of this process
+    """
+    global _shared_matrix
+    _shared_matrix = matrix
+
+def model_issues(fit, corpus, n_topics, n_top_words, n_jobs=1, chunksize=None, matrix=None, callback=None, echo=True):
+    """Run a per-issue topic model over a corpus, in parallel when n_jobs > 1
+    
+    Issues are dispatched to the workers in chunks and collected in corpus
+    order, so the printed output and the topics are the same as a serial run.
+    
+    Parameters
+    ----------
+    fit : function
+        lda_issue_topics or nmf_issue_topics
+    
+    corpus : a dictionary-like corpus
+    
+    n_jobs : integer
+        Number of worker processes, -1 for one per CPU
+    
+    chunksize : integer
+        Number of issues sent to a worker at a time, chosen from the corpus size when None
+    
+    matrix : vocabulary.CorpusMatrix
+        Tokenized corpus. Per-issue matrices are sliced out of it instead of
+        vectorizing the text again
+    
+    callback : function
+        Called with (id, topic words, output) of every issue, topic words are
+        None when topics couldn't be extracted
+    
+    echo : boolean
+        Print the output of every issue, turn off to print it with callback
+    
+    Returns
+    -------
+    topics : dictionary
+        Mapping from issues id (string) to its topic words (list of string)
+    """
+    if n_jobs == -1:
+        n_jobs = mp.cpu_count()
+    start = time.perf_counter()
+    engine = fit.__name__.split('_')[0] # lda or nmf
+    items = list(corpus.items())
+    fit = partial(timed_fit, partial(fit, n_topics=n_topics, n_top_words=n_top_words))
+    
+    topics = {} # mapping from issue id to topic words
+    pool = None
+    if n_jobs > 1 and len(items) > 1:
+        if chunksize is None:
+            chunksize = max(1, len(items) // (n_jobs * 4))
+        pool = mp.Pool(processes=n_jobs, initializer=share_matrix, initargs=(matrix,))
+        results = pool.imap(fit, items, chunksize)
+    else:
+        share_matrix(matrix)
+        results = map(fit, items)
+    
+    try:
+        for k, topic_words, output, seconds in results:
+            metrics.observe('model_issue_seconds', seconds, engine=engine)
+            if echo:
+                print(output)
+            if callback is not None:
+                callback(k, topic_words, output)
+            if topic_words is not None:
+                # Add list topic words into topics
+                topics[k] = topic_words
+    finally:
+        share_matrix(None)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    
+    metrics.observe('pipeline_stage_seconds', time.perf_counter() - start, stage='model', engine=engine)
+    metrics.inc('pipeline_issues_total', len(items), stage='model')
+    return topics
 
-def topic_modeling_lda(corpus, n_topics, n_top_words):
+def topic_modeling_lda(corpus, n_topics, n_top_words, n_jobs=1, chunksize=None, matrix=None):
     """Extract topics from a corpus using latent direlect allocation
     
     Parameters
@@ -237,6 +496,16 @@ def topic_modeling_lda(corpus, n_topics, n_top_words):
     n_top_words : integer
         Number of most important words in the topics
     
+    n_jobs : integer
+        Number of processes fitting issues in parallel, -1 for one per CPU
+    
+    chunksize : integer
+        Number of issues sent to a process at a time
+    
+    matrix : vocabulary.CorpusMatrix
+        Corpus tokenized once with vocabulary.build_corpus_matrix, to skip
+        tokenizing the text of every issue again
+    
     Returns
     -------
     topics : a dictionary-like collection.
@@ -246,29 +515,9 @@ def topic_modeling_lda(corpus, n_topics, n_top_words):
     if corpus == None or n_topics <= 0 or n_top_words <= 0:
         return None
     
-    topics = {} # mapping from issue id to topic words
-    
-    for k, v in corpus.items():
-        try:
-            tf_vectorizer = CountVectorizer(max_df=0.95, min_df=0.5,
-                                            max_features=n_features,
-                                            stop_words='english')
-            tf = tf_vectorizer.fit_transform(v)
-            # Fit the LDA model
-            lda = LatentDirichletAllocation(n_components=n_topics, max_iter=10,
-                                            learning_method='online',
-                                            learning_offset=50.,
-                                            random_state=0).fit(tf)
-            tf_feature_names = tf_vectorizer.get_feature_names()
-            print_top_words(lda, k, tf_feature_names, n_top_words)
-            # Add list topic words into topics
-            topics[k] = make_topic_words(lda, tf_feature_names, n_top_words) 
-        except ValueError:
-            print('Error in id %s. There are only a few words (%d words) in content so couldn\'t extract topics!' % (k, sum(len(item.split()) for item in v)))
-    
-    return topics
+    return model_issues(lda_issue_topics, corpus, n_topics, n_top_words, n_jobs, chunksize, matrix)
 
-def topic_modeling_nmf(corpus, n_topics, n_top_words):
+def topic_modeling_nmf(corpus, n_topics, n_top_words, n_jobs=1, chunksize=None, matrix=None):
     """Extract topics from a corpus using non-negative matrix factorization
     
     Parameters
@@ -282,6 +531,16 @@ def topic_modeling_nmf(corpus, n_topics, n_top_words):
     n_top_words : integer
         Number of most important words in the topics
     
+    n_jobs : integer
+        Number of processes fitting issues in parallel, -1 for one per CPU
+    
+    chunksize : integer
+        Number of issues sent to a process at a time
+    
+    matrix : vocabulary.CorpusMatrix
+        Corpus tokenized once with vocabulary.build_corpus_matrix, to skip
+        tokenizing the text of every issue again
+    
     Returns
     -------
     topics : a dictionary-like collection.
@@ -291,30 +550,259 @@ def topic_modeling_nmf(corpus, n_topics, n_top_words):
     if corpus == None or n_topics <= 0 or n_top_words <= 0:
         return None
     
-    topics = {} # mapping from issue id to topic words
+    return model_issues(nmf_issue_topics, corpus, n_topics, n_top_words, n_jobs, chunksize, matrix)
+
+def top_terms(counts, n_terms):
+    """Highest tf-idf terms of each row of a count matrix, idf computed over all its rows
     
-    for k, v in corpus.items():
-        try:
-            # Use tf-idf features for Non-negative Matrix Factorization (NMF)
-            tfidf_vectorizer = TfidfVectorizer(max_df=0.95, min_df=0.2,
-                                               max_features=n_features,
-                                               stop_words='english')
-            tfidf = tfidf_vectorizer.fit_transform(v)
-            # Fit the NMF model
-            nmf = NMF(n_components=n_topics, random_state=1,
-                      beta_loss='kullback-leibler', solver='mu', max_iter=1000, 
-                      alpha=.1, l1_ratio=.5).fit(tfidf)
-            
-            print("\nTopics in NMF model (generalized Kullback-Leibler divergence):")
-            tfidf_feature_names = tfidf_vectorizer.get_feature_names()
-            print_top_words(nmf, k, tfidf_feature_names, n_top_words)
-            # Add list topic words into topics
-            topics[k] = make_topic_words(nmf, tfidf_feature_names, n_top_words) 
-        except ValueError:
-            print('Error in id %s. There are only a few words (%d words) in content so couldn\'t extract topics!' % (k, sum(len(item.split()) for item in v)))
+    Parameters
+    ----------
+    counts : scipy.sparse.csr_matrix
+        Documents x vocabulary token counts, e.g. vocabulary.CorpusMatrix.issue_matrix()
+    
+    n_terms : integer
+        Number of terms kept for each document
+    
+    Returns
+    -------
+    terms : list of array of integer
+        Column indices of the top terms of each row, highest weight first
+        (ties broken by column, i.e. alphabetically)
+    """
+    counts = counts.tocsr()
+    n_docs = counts.shape[0]
+    dfs = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1. + n_docs) / (1. + dfs)) + 1. # smoothed like TfidfTransformer
+    weights = counts.data * idf[counts.indices]
+    
+    terms = []
+    for i in range(n_docs):
+        start, end = counts.indptr[i], counts.indptr[i+1]
+        row_weights = weights[start:end]
+        row_terms = counts.indices[start:end]
+        if end - start > n_terms:
+            # Ties at the cut would be resolved arbitrarily by argpartition, keep them all for the sort
+            threshold = row_weights[np.argpartition(-row_weights, n_terms - 1)[n_terms - 1]]
+            keep = row_weights >= threshold
+            row_weights = row_weights[keep]
+            row_terms = row_terms[keep]
+        order = np.lexsort((row_terms, -row_weights))[:n_terms]
+        terms.append(row_terms[order])
+    return terms
+
+def tfidf_issue_topics(k, v, term_indices, names, n_topics, n_top_words):
+    """Topic words of an issue from its top tf-idf terms, shaped like make_topic_words:
+    n_topics groups of n_top_words terms, in decreasing weight
+    
+    Returns
+    -------
+    see lda_issue_topics
+    """
+    if len(term_indices) == 0:
+        return k, None, few_words_error(k, v)
+    
+    lines = ['Topic words for issue %s' % k]
+    topic_words = []
+    for topic_idx in range(n_topics):
+        tw = [names[i] for i in term_indices[topic_idx*n_top_words:(topic_idx+1)*n_top_words]]
+        if not tw:
+            break
+        lines.append("Topic #%d: " % (topic_idx+1) + " ".join(tw))
+        topic_words.extend(tw)
+    lines.append('')
+    return k, topic_words, '\n'.join(lines)
+
+def topic_modeling_tfidf(corpus, n_topics, n_top_words, n_jobs=1, chunksize=None, matrix=None, fallback=None):
+    """Extract topic words from a corpus using the top tf-idf terms of each issue
+    
+    Issues are one to three texts (title, description, attachments), too few
+    documents for a topic model to be worth fitting: the n_topics * n_top_words
+    highest tf-idf terms of the issue, weighted against the whole corpus, are
+    used instead, in groups of n_top_words.
+    
+    Parameters
+    ----------
+    corpus, n_topics, n_top_words, n_jobs, chunksize, matrix : see topic_modeling_lda
+    
+    fallback : string
+        'lda' or 'nmf' to fit that topic model on the issues with at least
+        min_model_tokens terms (stop words excluded), None to use tf-idf terms
+        for every issue
+    
+    Returns
+    -------
+    topics : a dictionary-like collection.
+        Mapping from issues id (string) to its topic words (list of string)
+    """
+    # precondition check
+    if corpus == None or n_topics <= 0 or n_top_words <= 0:
+        return None
+    
+    start = time.perf_counter()
+    if matrix is None or any(k not in matrix for k in corpus):
+        matrix = build_corpus_matrix(corpus)
+    # idf over the issues of the corpus only, the matrix may hold more of them
+    rows = [matrix.index[k] for k in corpus]
+    counts = matrix.issue_matrix()[rows]
+    terms = top_terms(counts, n_topics * n_top_words)
+    
+    modeled = {}
+    if fallback is not None:
+        tokens = np.asarray(counts.sum(axis=1)).ravel()
+        modeled = dict((k, v) for i, (k, v) in enumerate(corpus.items()) if tokens[i] >= min_model_tokens)
+    
+    results = {} # issue id to (topic words, output)
+    for i, (k, v) in enumerate(corpus.items()):
+        if k not in modeled:
+            k, topic_words, output = tfidf_issue_topics(k, v, terms[i], matrix.vocabulary, n_topics, n_top_words)
+            results[k] = (topic_words, output)
+    metrics.observe('pipeline_stage_seconds', time.perf_counter() - start, stage='model', engine='tfidf')
+    metrics.inc('pipeline_issues_total', len(corpus) - len(modeled), stage='model')
+    
+    if modeled:
+        fits = {'lda': lda_issue_topics, 'nmf': nmf_issue_topics}
+        def collect(k, topic_words, output):
+            results[k] = (topic_words, output)
+        model_issues(fits[fallback], modeled, n_topics, n_top_words, n_jobs, chunksize, matrix, collect, echo=False)
+    
+    # printed in corpus order, whichever way the topics of an issue were extracted
+    topics = {}
+    for k in corpus:
+        topic_words, output = results[k]
+        print(output)
+        if topic_words is not None:
+            topics[k] = topic_words
+    return topics
+
+def topic_modeling_online_lda(corpus, n_topics, n_top_words, model_dir, corpus_topics=DEFAULT_TOPICS):
+    """Update a persisted corpus-level LDA model with the new issues of a corpus
+    and extract their topic words
+    
+    Issues the model was already fitted on (in previous runs) are skipped, so
+    a refresh costs work proportional to the new issues only.
+    
+    Parameters
+    ----------
+    corpus : a dictionary-like corpus
+        Collection of documents, e.g. the latest scraper output
+    
+    n_topics : integer
+        Number of topics of each issue, its most weighing topics of the model
+    
+    n_top_words : integer
+        Number of most important words in the topics
+    
+    model_dir : string
+        Directory of the model, created on the first run
+    
+    corpus_topics : integer
+        Number of topics of the model when it's created
+    
+    Returns
+    -------
+    topics : a dictionary-like collection.
+        Mapping from the ids of the new issues to their topic words, to be
+        passed to assign_nfr_category
+    """
+    # precondition check
+    if corpus == None or n_topics <= 0 or n_top_words <= 0:
+        return None
+    
+    start = time.perf_counter()
+    model = OnlineLDA(model_dir, corpus_topics)
+    new = model.update(corpus)
+    topics = {}
+    if new:
+        for k, topic_words, output in model.issue_topics(new, n_topics, n_top_words):
+            print(output)
+            if topic_words is not None:
+                topics[k] = topic_words
+        model.save()
+    metrics.observe('pipeline_stage_seconds', time.perf_counter() - start, stage='model', engine='online_lda')
+    metrics.inc('pipeline_issues_total', len(new), stage='model')
+    print('Updated the model with {0} new issues ({1} in total)'.format(len(new), len(model.seen)))
+    return topics
+
+def engine_params(engine, n_topics, n_top_words, tokenized=False):
+    """Everything the topic words of an issue depend on besides its text
+
+    Parameters
+    ----------
+    tokenized : boolean
+        The per-issue matrices are sliced out of a vocabulary.CorpusMatrix
+        rather than vectorized from the text
+    """
+    return {
+        'engine': engine,
+        'path': 'matrix' if tokenized else 'text',
+        'n_topics': n_topics,
+        'n_top_words': n_top_words,
+        'n_features': n_features,
+        'max_df': max_df,
+        'min_df': lda_min_df if engine == 'lda' else nmf_min_df,
+        'stop_words': 'english',
+        'sklearn': sklearn.__version__,
+    }
+
+def topic_modeling_cached(corpus, n_topics, n_top_words, cache, engine='lda', n_jobs=1, chunksize=None, matrix=None):
+    """Extract topics like topic_modeling_lda/topic_modeling_nmf, reusing the
+    results cached for issues whose text and parameters didn't change
+    
+    Parameters
+    ----------
+    corpus, n_topics, n_top_words, n_jobs, chunksize, matrix : see topic_modeling_lda
+    
+    cache : result_cache.ResultCache
+        Cache of the topic words and printed output of each issue, keyed by
+        its id, its text and the parameters
     
+    engine : string
+        'lda' or 'nmf'. The tf-idf engine weighs terms against the whole
+        corpus, so its results can't be cached per issue
+    
+    Returns
+    -------
+    topics : a dictionary-like collection.
+        Mapping from issues id (string) to its topic words (list of string)
+    """
+    # precondition check
+    if corpus == None or n_topics <= 0 or n_top_words <= 0:
+        return None
+    fits = {'lda': lda_issue_topics, 'nmf': nmf_issue_topics}
+    if engine not in fits:
+        raise RuntimeError('Topic engine {0} can\'t be cached, use one of: {1}'.format(engine, ', '.join(sorted(fits))))
+    
+    params = engine_params(engine, n_topics, n_top_words, matrix is not None)
+    # the printed output names the issue, so issues with the same text get an entry each
+    keys = dict((k, result_key('topics', k, v, params)) for k, v in corpus.items())
+    found = cache.get_many(keys.values())
+    missing = dict((k, v) for k, v in corpus.items() if keys[k] not in found)
+    
+    if missing:
+        computed = []
+        def store(k, topic_words, output):
+            result = {'words': topic_words, 'output': output}
+            found[keys[k]] = result
+            computed.append((keys[k], result))
+        model_issues(fits[engine], missing, n_topics, n_top_words, n_jobs, chunksize, matrix, store, echo=False)
+        cache.put_many(computed)
+    
+    # print cached and computed issues in corpus order, like an uncached run
+    topics = {}
+    for k in corpus.keys():
+        result = found[keys[k]]
+        print(result['output'])
+        if result['words'] is not None:
+            topics[k] = result['words']
+    print(cache.report())
     return topics
 
+TOPIC_ENGINES = {
+    'lda': topic_modeling_lda,
+    'nmf': topic_modeling_nmf,
+    'tfidf': topic_modeling_tfidf,
+}
+
 def load_word_list(wl_type):
     """Load word list from file given word list type
     
@@ -345,7 +833,40 @@ def load_word_list(wl_type):
     
     return wordlist
 
-def determine_nfr_category(vocabulary):
+def word_list_registry():
+    """Registry of the word lists of every experiment under wordlists/, built on first use
+    """
+    global _registry
+    if _registry is None:
+        _registry = WordListRegistry()
+    return _registry
+
+def category_index(word_list=None, experiment=None):
+    """Compiled index of a word list, built on first use
+    
+    Parameters
+    ----------
+    word_list : dictionary
+        Mapping from category to word list file, WORD_LIST when None
+    
+    experiment : string
+        Name of an experiment of the word list registry (e.g. exp1, exp2, exp3,
+        exp3-txt), used instead of word_list
+    
+    Returns
+    -------
+    index : nfr_index.CategoryIndex
+    """
+    if experiment is not None:
+        return word_list_registry().index(experiment)
+    if word_list is None:
+        word_list = WORD_LIST
+    key = tuple(word_list.items())
+    if key not in _category_indexes:
+        _category_indexes[key] = compile_category_index(word_list)
+    return _category_indexes[key]
+
+def determine_nfr_category(vocabulary, experiment=None):
     """Count number of occurrences of each topic word in each non-functional requirements
     word list and determine the non-functional requirement category.
     
@@ -354,6 +875,9 @@ def determine_nfr_category(vocabulary):
     vocabulary : list
         List of the topic words extracted from issues description 
     
+    experiment : string
+        Word list experiment to use, WORD_LIST when None
+    
     Returns
     -------
     nfr_categories : string
@@ -361,29 +885,21 @@ def determine_nfr_category(vocabulary):
     
     Note: if two nfr category has exact same topic words occurrence, this will return the first encounter
     """
-    nfr_categories = {}
-    for category in WORD_LIST.keys():
-        try:
-            wl = load_word_list(category)
-            cv = CountVectorizer(vocabulary=vocabulary)
-            result_array = cv.fit_transform(wl).toarray()
-            nfr_categories[category] = np.count_nonzero(result_array == 1)
-        except ValueError:
-            print('Error: ', vocabulary)
-    
-    # Find the category with largest words matched
-    category = max(nfr_categories, key=lambda key: nfr_categories[key])
-    
-    # Return None if the requirement is not non-functional
-    return category if nfr_categories[category] > 0 else None
+    return category_index(experiment=experiment).category(vocabulary)
 
-def assign_nfr_category(topics):
+def assign_nfr_category(topics, experiment=None, cache=None):
     """Assign non-functional category for the issues
     
     Parameters
     -----------
     topics : dictionary
         Mapping from issue id to topic words associate with that issue
+    
+    experiment : string
+        Word list experiment to use, WORD_LIST when None
+    
+    cache : result_cache.ResultCache
+        Cache of the categories, keyed by topic words and word list contents
         
     Returns
     -------
@@ -391,19 +907,79 @@ def assign_nfr_category(topics):
         Mapping from issue to its determined nfr category (None if it's not nfr)
     """
     
-    issue_nfr_category ={}
-    for issue_id, topic_words in topics.items():
-        category = determine_nfr_category(topic_words)
-        issue_nfr_category[issue_id] = category
-        
-        print('Id {:>5} \t\t Category: {:>15}'.format(issue_id, category))
+    with metrics.timer('pipeline_stage_seconds', stage='classify'):
+        if cache is None:
+            issue_nfr_category = category_index(experiment=experiment).classify(topics)
+        else:
+            issue_nfr_category = cached_nfr_category(topics, experiment, cache)
+    metrics.inc('pipeline_issues_total', len(topics), stage='classify')
+    for issue_id, category in issue_nfr_category.items():
+        metrics.inc('nfr_category_total', category=category)
+        print('Id {:>5} \t\t Category: {:>15}'.format(issue_id, str(category)))
         
     return issue_nfr_category
         
+def cached_nfr_category(topics, experiment, cache):
+    """Categories of issues from the cache, classifying and storing the missing ones
+    """
+    word_list = WORD_LIST if experiment is None else word_list_registry().word_list(experiment)
+    version = [experiment, word_list_version(word_list)]
+    keys = dict((k, result_key('category', words, version)) for k, words in topics.items())
+    found = cache.get_many(keys.values())
+    
+    missing = dict((k, words) for k, words in topics.items() if keys[k] not in found)
+    computed = category_index(experiment=experiment).classify(missing)
+    cache.put_many((keys[k], category) for k, category in computed.items())
+    print(cache.report())
+    return dict((k, computed[k] if k in computed else found[keys[k]]) for k in topics)
+
+def lexicon(experiment=None):
+    """Compiled word list matcher, built on first use
+    
+    Parameters
+    ----------
+    experiment : string
+        Word list experiment of the registry, WORD_LIST when None
+    
+    Returns
+    -------
+    matcher : lexicon.Lexicon
+    """
+    word_list = WORD_LIST if experiment is None else word_list_registry().word_list(experiment)
+    key = tuple(word_list.items())
+    if key not in _lexicons:
+        _lexicons[key] = Lexicon(word_list)
+    return _lexicons[key]
+
+def lexicon_nfr_category(corpus, experiment=None):
+    """Assign non-functional category for the issues from word list hits in their text,
+    without fitting any topic model
+    
+    Parameters
+    -----------
+    corpus : dictionary
+        Mapping from issue id to its texts, see issues_to_corpus
+    
+    experiment : string
+        Word list experiment to use, WORD_LIST when None
+        
+    Returns
+    -------
+    issue_nfr_category : dictionary-like object
+        Mapping from issue to its determined nfr category (None if it's not nfr),
+        like assign_nfr_category
+    """
+    issue_nfr_category = lexicon(experiment).classify(corpus)
+    for issue_id, category in issue_nfr_category.items():
+        print('Id {:>5} \t\t Category: {:>15}'.format(issue_id, str(category)))
+    
+    return issue_nfr_category
+
 def main():
     issues = filter_issues(xml_to_issues('data/mylyn-enhancement-issues.xml'), commenter_std_dev=3)
     corpus = issues_to_corpus(issues)
-    lda_topics = topic_modeling_lda(corpus=corpus, n_topics=1, n_top_words=2)
+    matrix = build_corpus_matrix(corpus)
+    lda_topics = topic_modeling_lda(corpus=corpus, n_topics=1, n_top_words=2, matrix=matrix)
     # nmf_topics = topic_modeling_nmf(corpus = corpus, n_topics = 2, n_top_words = 5)
     categories = assign_nfr_category(lda_topics)
     
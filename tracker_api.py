@@ -0,0 +1,286 @@
+'''
+Batched scraping backend built on the trackers' REST APIs. Asks for many
+issues per round trip instead of downloading one HTML page per issue id.
+'''
+
+import metrics
+from scraper import (fetch, reject, pop_rejection, log, chunks, DUPLICATED_ISSUES, MINIMUM_COMMENTS, MINIMUM_COMMENTERS,
+                     REJECT_DUPLICATE, REJECT_NOT_ENHANCEMENT, REJECT_FEW_COMMENTS, REJECT_FEW_COMMENTERS,
+                     REJECT_NOT_FOUND, REJECT_HTTP_ERROR)
+from issue import Issue
+
+FIREFOX_API_URL = 'https://bugzilla.mozilla.org/rest'
+MYLYN_API_URL = 'https://bugs.eclipse.org/bugs/rest'
+LUCENE_API_URL = 'https://issues.apache.org/jira/rest/api/2'
+
+BATCH_SIZE = 100 # number of issues requested per round trip
+
+BUG_FIELDS = 'id,summary,status,resolution,severity,type,creator'
+LUCENE_TYPES = ['New Feature', 'Improvement']
+
+def get_json(url, params):
+    """Send a GET request and decode the JSON body
+
+    Returns
+    -------
+    data : dictionary, None if the request failed
+    """
+    try:
+        result = fetch(url, params)
+        if result.status_code != 200:
+            log('Can\'t access url! HTTP {0} - {1}'.format(result.status_code, result.url))
+            return None
+        return result.json()
+    except Exception as err:
+        log('Exception happened! {0} - {1}\n'.format(url, err))
+        return None
+
+def reject_all(ids, reason):
+    for _id in ids:
+        reject(_id, reason)
+
+def reject_missing(ids, found_ids):
+    """Reject the requested ids the tracker didn't return (deleted, private or moved issues)
+    """
+    found_ids = set(str(_id) for _id in found_ids)
+    reject_all([_id for _id in ids if str(_id) not in found_ids], REJECT_NOT_FOUND)
+
+def count_api_commenters(_id, names):
+    """Count number of distinct commenters given the authors of all comments
+
+    Returns
+    -------
+    commenters : dictionary mapping author to number of comments, None if
+        there are fewer commenters than MINIMUM_COMMENTERS
+    """
+    commenters = dict()
+    for name in names:
+        commenters[name] = commenters.get(name, 0) + 1
+
+    if len(commenters) < MINIMUM_COMMENTERS:
+        log('[{0}] Issue has only {1} commenters!\n'.format(_id, len(commenters)))
+        reject(_id, REJECT_FEW_COMMENTERS)
+        return None
+    return commenters
+
+def is_bugzilla_candidate(bug):
+    """Check status and severity of a Bugzilla bug, the same way parse_issue does
+
+    Parameters
+    ----------
+    bug : dictionary
+        A bug returned by /rest/bug
+
+    Returns
+    -------
+    True if the bug is a non-duplicated enhancement
+    """
+    _id = bug['id']
+    status = ' '.join([bug.get('status', ''), bug.get('resolution', '')]).strip()
+    if status in DUPLICATED_ISSUES:
+        log('[{0}] Duplicated issue!'.format(_id))
+        reject(_id, REJECT_DUPLICATE)
+        return False
+
+    # bugzilla.mozilla.org moved enhancements from the severity to the type field
+    importance = ' '.join([bug.get('severity', ''), bug.get('type', '')])
+    if 'enhancement' not in importance:
+        log('[{0}] Not requirement - {1}\n'.format(_id, importance))
+        reject(_id, REJECT_NOT_ENHANCEMENT)
+        return False
+    return True
+
+def bugzilla_to_issue(bug, comments):
+    """Make an Issue from a Bugzilla bug and its comments
+
+    Parameters
+    ----------
+    bug : dictionary
+        A bug returned by /rest/bug
+
+    comments : list of dictionary
+        Comments of the bug returned by /rest/bug/comment, the first one is
+        the bug description
+
+    Returns
+    -------
+    issue : an Issue instance, None if the bug doesn't have an active discussion
+    """
+    _id = bug['id']
+    if len(comments) <= MINIMUM_COMMENTS:
+        log('[{0}] Issue has only {1} comments\n'.format(_id, len(comments)))
+        reject(_id, REJECT_FEW_COMMENTS)
+        return None
+
+    commenters = count_api_commenters(_id, [c.get('creator') for c in comments])
+    if commenters is None:
+        return None
+
+    description = ''
+    # consider the first comment as the description if the reporter wrote it
+    if comments[0].get('creator') == bug.get('creator'):
+        description = ' '.join(comments[0].get('text', '').split())
+
+    return Issue(str(_id), bug.get('summary', ''), description, [], len(comments), len(commenters))
+
+def bugzilla_fetch(api_url, ids):
+    """Fetch a batch of Bugzilla bugs with three requests: bugs, comments and attachments
+
+    Parameters
+    ----------
+    api_url : string
+        Base URL of the Bugzilla REST API, e.g. FIREFOX_API_URL
+
+    ids : list of integer
+        Bug ids
+
+    Returns
+    -------
+    issues : list of Issue, in the same order as ids
+    """
+    data = get_json(api_url + '/bug', {'id': ','.join(str(i) for i in ids), 'include_fields': BUG_FIELDS})
+    if data is None:
+        reject_all(ids, REJECT_HTTP_ERROR)
+        return []
+    reject_missing(ids, [bug['id'] for bug in data.get('bugs', [])])
+
+    bugs = [bug for bug in data.get('bugs', []) if is_bugzilla_candidate(bug)]
+    if not bugs:
+        return []
+    bug_ids = [bug['id'] for bug in bugs]
+
+    data = get_json('{0}/bug/{1}/comment'.format(api_url, bug_ids[0]), {'ids': bug_ids[1:]})
+    if data is None:
+        reject_all(bug_ids, REJECT_HTTP_ERROR)
+        return []
+    comments = data.get('bugs', {})
+
+    issues = []
+    for bug in bugs:
+        issue = bugzilla_to_issue(bug, comments.get(str(bug['id']), {}).get('comments', []))
+        if issue is not None:
+            issues.append(issue)
+    if not issues:
+        return issues
+
+    # Attachments description might reveal some important information about the issue
+    # Include all obsolete attachments
+    data = get_json('{0}/bug/{1}/attachment'.format(api_url, issues[0].get_id()),
+                    {'ids': [issue.get_id() for issue in issues[1:]], 'exclude_fields': 'data'})
+    if data is not None:
+        attachments = data.get('bugs', {})
+        for issue in issues:
+            issue.attachments = [' '.join(a.get('summary', '').split()) for a in attachments.get(issue.get_id(), [])]
+
+    order = dict((str(_id), i) for i, _id in enumerate(ids))
+    issues.sort(key=lambda issue: order.get(issue.get_id(), len(order)))
+    for issue in issues:
+        log('[{0}] Completed!\n'.format(issue.get_id()))
+    return issues
+
+def jira_to_issue(jira_issue):
+    """Make an Issue from a Jira issue returned by /search
+
+    Parameters
+    ----------
+    jira_issue : dictionary
+        Issue with issuetype, summary, description and comment fields
+
+    Returns
+    -------
+    issue : an Issue instance, None if the issue is rejected
+    """
+    _id = jira_issue['key'].split('-')[-1]
+    fields = jira_issue.get('fields', {})
+    status = ' '.join(((fields.get('issuetype') or {}).get('name') or '').split())
+    if status not in LUCENE_TYPES: # not a requirement
+        log('[{0}] Not requirement - {1}\n'.format(_id, status))
+        reject(_id, REJECT_NOT_ENHANCEMENT)
+        return None
+
+    comments = (fields.get('comment') or {}).get('comments', [])
+    if len(comments) < MINIMUM_COMMENTS:
+        log('[{0}] Issue has only {1} comments!\n'.format(_id, len(comments)))
+        reject(_id, REJECT_FEW_COMMENTS)
+        return None
+
+    commenters = count_api_commenters(_id, [(c.get('author') or {}).get('name') for c in comments])
+    if commenters is None:
+        return None
+
+    title = ' '.join((fields.get('summary') or '').split())
+    description = ' '.join((fields.get('description') or '').split())
+    log('[{0}] Completed!\n'.format(_id))
+    return Issue(_id, title, description, [], len(comments), len(commenters))
+
+def jira_fetch(api_url, project, ids):
+    """Fetch a batch of Jira issues with a single search request
+
+    Parameters
+    ----------
+    api_url : string
+        Base URL of the Jira REST API, e.g. LUCENE_API_URL
+
+    project : string
+        Jira project key, e.g. LUCENE
+
+    ids : list of integer
+        Issue numbers inside the project
+
+    Returns
+    -------
+    issues : list of Issue, in the same order as ids
+    """
+    keys = ','.join('{0}-{1}'.format(project, i) for i in ids)
+    params = {
+        'jql': 'key in ({0}) ORDER BY key ASC'.format(keys),
+        'fields': 'issuetype,summary,description,comment',
+        'maxResults': len(ids),
+        'validateQuery': 'warn', # don't fail the whole batch on deleted or moved keys
+    }
+    data = get_json(api_url + '/search', params)
+    if data is None:
+        reject_all(ids, REJECT_HTTP_ERROR)
+        return []
+    reject_missing(ids, [jira_issue['key'].split('-')[-1] for jira_issue in data.get('issues', [])])
+
+    issues = [jira_to_issue(jira_issue) for jira_issue in data.get('issues', [])]
+    order = dict((str(_id), i) for i, _id in enumerate(ids))
+    issues = [issue for issue in issues if issue is not None]
+    issues.sort(key=lambda issue: order.get(issue.get_id(), len(order)))
+    return issues
+
+def api_scrape(system, ids, batch_size=BATCH_SIZE, callback=None):
+    """Scrape a list of issues through the tracker's REST API.
+
+    Args:
+        system (str): Firefox, Mylyn or Lucene
+        ids (list): id range
+        batch_size (int): number of issues requested per round trip
+        callback (function): called with (id, issue) for every id of a batch
+            once the batch is done, issue is None when the id was rejected
+
+    Return:
+        issues: A list of scraped issues
+    """
+    issues = []
+    system = system.upper()
+    for batch in chunks(ids, batch_size):
+        log('Fetching {0} {1} issues: {2} - {3}'.format(len(batch), system, batch[0], batch[-1]))
+        if system == 'FIREFOX':
+            batch_issues = bugzilla_fetch(FIREFOX_API_URL, batch)
+        elif system == 'MYLYN':
+            batch_issues = bugzilla_fetch(MYLYN_API_URL, batch)
+        elif system == 'LUCENE':
+            batch_issues = jira_fetch(LUCENE_API_URL, 'LUCENE', batch)
+        else:
+            raise RuntimeError('System is unsupported: ' + system)
+
+        found = dict((issue.get_id(), issue) for issue in batch_issues)
+        for _id in batch:
+            if callback is not None:
+                callback(_id, found.get(str(_id)))
+            pop_rejection(_id) # the reason is only kept for the callback, forget it once the id is done
+        metrics.inc('scraper_issues_total', len(batch_issues))
+        issues.extend(batch_issues)
+    return issues
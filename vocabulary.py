@@ -0,0 +1,191 @@
+'''
+One-time tokenization of a corpus against a global vocabulary.
+
+Every section (title, description, attachments) of every issue is tokenized
+once into a row of a sparse count matrix. The per-issue document-term matrices
+the topic models need are then sliced out of it, with the same pruning as a
+CountVectorizer fitted on the issue alone, instead of re-tokenizing the text
+for every model and parameter choice.
+'''
+
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+class CorpusMatrix(object):
+    """Token counts of all sections of a corpus
+
+    Parameters
+    ----------
+    ids : list of string
+        Issue ids, in corpus order
+
+    doc_ptr : array of integer
+        Rows doc_ptr[i]:doc_ptr[i+1] of counts are the sections of the i-th issue
+
+    counts : scipy.sparse.csr_matrix
+        Sections x vocabulary token counts
+
+    vocabulary : array of string
+        Terms of the columns, sorted like CountVectorizer sorts its features
+    """
+    def __init__(self, ids, doc_ptr, counts, vocabulary):
+        self.ids = list(ids)
+        self.doc_ptr = np.asarray(doc_ptr, dtype=np.int64)
+        self.counts = counts.tocsr()
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self.index = dict((_id, i) for i, _id in enumerate(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, _id):
+        return _id in self.index
+
+    def issue_rows(self, _id):
+        """Sections of an issue
+
+        Returns
+        -------
+        rows : scipy.sparse.csr_matrix
+        """
+        i = self.index[_id]
+        return self.counts[self.doc_ptr[i]:self.doc_ptr[i+1]]
+
+    def issue_counts(self, _id, min_df=1, max_df=1.0, max_features=None, dtype=None):
+        """Document-term matrix of an issue, as CountVectorizer(min_df, max_df, max_features) fitted on its sections
+
+        Parameters
+        ----------
+        _id : string
+            Issue id
+
+        min_df, max_df : float or integer
+            Document frequency bounds, proportions of the issue's sections when float
+
+        max_features : integer
+            Keep only the most frequent terms of the issue
+
+        dtype : numpy type
+            Type of the counts, like the dtype of CountVectorizer, integers when None
+
+        Returns
+        -------
+        (counts, feature_names) : scipy.sparse.csr_matrix and list of string
+
+        Raises ValueError in the cases CountVectorizer.fit_transform does
+        (no terms left after stop words or pruning)
+        """
+        rows = self.issue_rows(_id)
+        n_doc = rows.shape[0]
+        dfs = np.bincount(rows.indices, minlength=rows.shape[1])
+        mask = dfs > 0 # terms of the issue, the vocabulary of its own CountVectorizer
+        if not mask.any():
+            raise ValueError('empty vocabulary; perhaps the documents only contain stop words')
+
+        max_doc_count = max_df if isinstance(max_df, int) else max_df * n_doc
+        min_doc_count = min_df if isinstance(min_df, int) else min_df * n_doc
+        if max_doc_count < min_doc_count:
+            raise ValueError('max_df corresponds to < documents than min_df')
+        mask &= (dfs <= max_doc_count) & (dfs >= min_doc_count)
+
+        if max_features is not None and mask.sum() > max_features:
+            tfs = np.asarray(rows.sum(axis=0)).ravel()
+            mask_inds = (-tfs[mask]).argsort()[:max_features]
+            new_mask = np.zeros(len(dfs), dtype=bool)
+            new_mask[np.where(mask)[0][mask_inds]] = True
+            mask = new_mask
+
+        kept = np.where(mask)[0]
+        if len(kept) == 0:
+            raise ValueError('After pruning, no terms remain. Try a lower min_df or a higher max_df.')
+        counts = rows[:, kept]
+        if dtype is not None: # astype() would sort the terms of the rows, changing the order of sums over them
+            counts = sparse.csr_matrix((counts.data.astype(dtype), counts.indices, counts.indptr), shape=counts.shape)
+        return counts, list(self.vocabulary[kept])
+
+    def issue_matrix(self):
+        """Token counts of every issue, its sections summed
+
+        Returns
+        -------
+        counts : scipy.sparse.csr_matrix
+            Issues x vocabulary, rows in the order of self.ids
+        """
+        sections = np.arange(self.counts.shape[0])
+        owner = np.repeat(np.arange(len(self.ids)), np.diff(self.doc_ptr))
+        membership = sparse.csr_matrix((np.ones(len(sections), dtype=self.counts.dtype), (owner, sections)),
+                                       shape=(len(self.ids), self.counts.shape[0]))
+        return (membership @ self.counts).tocsr()
+
+    def save(self, path):
+        """Save the matrix to a directory, so later runs skip tokenization
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        sparse.save_npz(os.path.join(path, 'counts.npz'), self.counts)
+        np.save(os.path.join(path, 'doc_ptr.npy'), self.doc_ptr)
+        with open(os.path.join(path, 'vocabulary.json'), 'w') as f:
+            json.dump({'ids': self.ids, 'vocabulary': list(self.vocabulary)}, f)
+
+def load_corpus_matrix(path):
+    """Load a matrix saved with CorpusMatrix.save
+
+    Returns
+    -------
+    matrix : CorpusMatrix
+    """
+    with open(os.path.join(path, 'vocabulary.json')) as f:
+        data = json.load(f)
+    return CorpusMatrix(data['ids'], np.load(os.path.join(path, 'doc_ptr.npy')),
+                        sparse.load_npz(os.path.join(path, 'counts.npz')), data['vocabulary'])
+
+def build_corpus_matrix(corpus, stop_words='english'):
+    """Tokenize every section of a corpus once
+
+    Parameters
+    ----------
+    corpus : a dictionary-like corpus
+        Mapping from issue id to its list of texts, see topic_modeling.issues_to_corpus
+
+    stop_words : string or list
+        Stop words removed by the tokenizer, the same as the per-issue vectorizers
+
+    Returns
+    -------
+    matrix : CorpusMatrix
+    """
+    analyze = CountVectorizer(stop_words=stop_words).build_analyzer()
+    ids = []
+    doc_ptr = [0]
+    terms = {} # term to column, in order of first appearance
+    indices = []
+    values = []
+    indptr = [0]
+    for _id, content in corpus.items():
+        ids.append(_id)
+        # a CountVectorizer fitted on the issue alone stores the terms of a row in order of their
+        # first appearance in the issue, keep that order so sums over a row (the tf-idf norms) match it
+        first_seen = {}
+        for text in content:
+            counter = {}
+            for term in analyze(text):
+                j = terms.setdefault(term, len(terms))
+                counter[j] = counter.get(j, 0) + 1
+                first_seen.setdefault(j, len(first_seen))
+            row = sorted(counter, key=first_seen.get)
+            indices.extend(row)
+            values.extend(counter[j] for j in row)
+            indptr.append(len(indices))
+        doc_ptr.append(len(indptr) - 1)
+
+    # columns sorted like CountVectorizer sorts its features, the order within rows is kept
+    vocabulary = sorted(terms)
+    columns = np.empty(len(terms), dtype=np.int64)
+    columns[[terms[term] for term in vocabulary]] = np.arange(len(vocabulary))
+    counts = sparse.csr_matrix((np.asarray(values, dtype=np.int64), columns[np.asarray(indices, dtype=np.int64)],
+                                np.asarray(indptr, dtype=np.int64)), shape=(len(indptr) - 1, len(vocabulary)))
+    return CorpusMatrix(ids, doc_ptr, counts, vocabulary)
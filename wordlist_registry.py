@@ -0,0 +1,149 @@
+'''
+Registry of the non-functional requirement word lists of every experiment.
+
+Each directory of wordlists/ is an experiment. Its word list files are named
+either wordlist.<category> (experiment <directory>) or <category>.txt
+(experiment <directory>-txt), so wordlists/exp3 holds both exp3 and exp3-txt,
+the lists topic_modeling.WORD_LIST points at.
+
+Every experiment is compiled into a normalized, deduplicated
+nfr_index.CategoryIndex cached as <cache-dir>/<experiment>.npz. The cached index
+is used as long as the size and modification time of its source files did not
+change, and rebuilt otherwise.
+'''
+
+import argparse
+import os
+
+from nfr_index import compile_category_index, save_category_index, load_category_index
+
+WORDLIST_DIR = 'wordlists'
+INDEX_DIR = '.index' # directory of the compiled indexes under the root, skipped by discovery
+WORDLIST_PREFIX = 'wordlist.'
+TXT_SUFFIX = '.txt'
+INDEX_VERSION = 1
+
+def discover_experiments(root=WORDLIST_DIR):
+    """Find the word lists of every experiment directory
+
+    Parameters
+    ----------
+    root : string
+        Directory holding one sub-directory per experiment
+
+    Returns
+    -------
+    experiments : dictionary
+        Mapping from experiment name to its word list, a mapping from category
+        to file sorted by category (the order ties are broken in)
+    """
+    experiments = {}
+    for directory in sorted(os.listdir(root)):
+        path = os.path.join(root, directory)
+        if directory.startswith('.') or not os.path.isdir(path):
+            continue
+        variants = {directory: {}, directory + '-txt': {}}
+        for name in os.listdir(path):
+            f = os.path.join(path, name)
+            if not os.path.isfile(f):
+                continue
+            if name.startswith(WORDLIST_PREFIX):
+                variants[directory][name[len(WORDLIST_PREFIX):].lower()] = f
+            elif name.endswith(TXT_SUFFIX):
+                variants[directory + '-txt'][name[:-len(TXT_SUFFIX)].lower()] = f
+        for experiment, word_list in variants.items():
+            if word_list:
+                experiments[experiment] = dict((category, word_list[category]) for category in sorted(word_list))
+    return experiments
+
+def fingerprint(word_list):
+    """Size and modification time of each file of a word list
+    """
+    sources = {}
+    for category, f in word_list.items():
+        st = os.stat(f)
+        sources[category] = [f, st.st_size, st.st_mtime_ns]
+    return sources
+
+class WordListRegistry(object):
+    """Word lists and compiled indexes of the experiments
+
+    Parameters
+    ----------
+    root : string
+        Directory of the experiment directories
+
+    cache_dir : string
+        Directory of the compiled indexes, <root>/.index when None
+    """
+    def __init__(self, root=WORDLIST_DIR, cache_dir=None):
+        self.root = root
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(root, INDEX_DIR)
+        self.experiments = discover_experiments(root)
+        self.indexes = {}
+
+    def names(self):
+        return sorted(self.experiments)
+
+    def word_list(self, experiment):
+        """Mapping from category to word list file of an experiment
+        """
+        if experiment not in self.experiments:
+            raise RuntimeError('Unknown word list experiment: {0} (known: {1})'.format(experiment, ', '.join(self.names())))
+        return self.experiments[experiment]
+
+    def index_path(self, experiment):
+        return os.path.join(self.cache_dir, experiment + '.npz')
+
+    def index(self, experiment):
+        """Compiled index of an experiment, loaded from the cache or rebuilt when its files changed
+
+        Returns
+        -------
+        index : nfr_index.CategoryIndex
+        """
+        word_list = self.word_list(experiment)
+        sources = fingerprint(word_list)
+        cached = self.indexes.get(experiment)
+        if cached is not None and cached[1] == sources:
+            return cached[0]
+
+        index = None
+        path = self.index_path(experiment)
+        if os.path.exists(path):
+            try:
+                index, meta = load_category_index(path)
+                if meta.get('version') != INDEX_VERSION or meta.get('sources') != sources:
+                    index = None
+            except (IOError, OSError, ValueError, KeyError): # truncated or foreign file, rebuild it
+                index = None
+        if index is None:
+            index = compile_category_index(word_list, normalize=True)
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            save_category_index(index, path, {'version': INDEX_VERSION, 'experiment': experiment, 'sources': sources})
+        self.indexes[experiment] = (index, sources)
+        return index
+
+    def build(self):
+        """Compile the index of every experiment ahead of time
+
+        Returns
+        -------
+        indexes : dictionary
+            Mapping from experiment name to its index
+        """
+        return dict((experiment, self.index(experiment)) for experiment in self.names())
+
+def main():
+    parser = argparse.ArgumentParser('python wordlist_registry.py', description='Compile the word list index of every experiment.')
+    parser.add_argument('--root', type=str, default=WORDLIST_DIR, help='Directory of the experiment directories')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Directory of the compiled indexes')
+    _args = vars(parser.parse_args())
+
+    registry = WordListRegistry(_args['root'], _args['cache_dir'])
+    for experiment, index in sorted(registry.build().items()):
+        print('{0:>8}: {1} terms, categories: {2}'.format(experiment, len(index.terms), ', '.join(index.categories)))
+
+if __name__ == '__main__':
+    main()